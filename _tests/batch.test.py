@@ -0,0 +1,94 @@
+import os
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+
+from thot_cli.commands.utils.utilities import ThotUtilities
+from thot_cli.commands.utils.cmd import Utils
+from thot_cli.commands.utils import batch
+
+
+def write_json( path, data ):
+	os.makedirs( os.path.dirname( path ), exist_ok = True )
+	with open( path, 'w' ) as f:
+		json.dump( data, f )
+
+
+def read_json( path ):
+	with open( path ) as f:
+		return json.load( f )
+
+
+class TestBatch( unittest.TestCase ):
+
+	def setUp( self ):
+		self.root = tempfile.mkdtemp()
+		write_json( os.path.join( self.root, '_container.json' ), { 'name': 'root', 'type': 'root' } )
+		write_json( os.path.join( self.root, '_scripts.json' ), [] )
+		for name in ( 'a', 'b' ):
+			write_json( os.path.join( self.root, name, '_container.json' ), { 'name': name, 'type': 'child' } )
+			write_json( os.path.join( self.root, name, '_scripts.json' ), [] )
+
+
+	def tearDown( self ):
+		shutil.rmtree( self.root )
+
+
+	def scripts( self, name ):
+		return read_json( os.path.join( self.root, name, '_scripts.json' ) )
+
+
+	def test_buffered_writes_flush_on_exit( self ):
+		util = ThotUtilities( self.root )
+		with util.buffered():
+			util.add_scripts( { 'script': 'root:/scripts/one.py' }, { 'type': 'child' } )
+			util.add_scripts( { 'script': 'root:/scripts/two.py' }, { 'type': 'child' } )
+
+			# nothing written until the context exits
+			self.assertEqual( self.scripts( 'a' ), [] )
+
+		for name in ( 'a', 'b' ):
+			self.assertEqual(
+				[ script[ 'script' ] for script in self.scripts( name ) ],
+				[ 'root:/scripts/one.py', 'root:/scripts/two.py' ]
+			)
+
+
+	def test_flush( self ):
+		util = ThotUtilities( self.root )
+		with util.buffered():
+			util.add_scripts( { 'script': 'root:/scripts/one.py' }, { 'type': 'child' } )
+			util.flush()
+			self.assertEqual( len( self.scripts( 'a' ) ), 1 )
+
+
+	def test_run( self ):
+		ops = os.path.join( self.root, 'ops.jsonl' )
+		with open( ops, 'w' ) as f:
+			f.write( json.dumps( {
+				'function': 'add_scripts',
+				'scripts': { 'script': 'root:/scripts/one.py' },
+				'search': { 'type': 'child' }
+			} ) + '\n\n' )
+
+			f.write( json.dumps( { 'function': 'unknown' } ) + '\n' )
+			f.write( json.dumps( { 'function': 'add_scripts', 'root': '/elsewhere' } ) + '\n' )
+
+		cmd = Utils( ArgumentParser() )
+		output = io.StringIO()
+		with redirect_stdout( output ):
+			failed = batch.run( cmd, ThotUtilities( self.root ), ops, root = self.root )
+
+		reports = [ json.loads( line ) for line in output.getvalue().splitlines() ]
+		self.assertEqual( failed, 2 )
+		self.assertEqual( [ report[ 'line' ] for report in reports ], [ 1, 3, 4 ] )
+		self.assertEqual( [ report[ 'status' ] for report in reports ], [ 'ok', 'error', 'error' ] )
+		self.assertEqual( len( self.scripts( 'b' ) ), 1 )
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,96 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from thot_cli.commands.run.conditions import Context, evaluate
+from thot_cli.commands.run import runner
+
+
+def write_json( path, data ):
+	os.makedirs( os.path.dirname( path ), exist_ok = True )
+	with open( path, 'w' ) as f:
+		json.dump( data, f )
+
+
+class TestConditions( unittest.TestCase ):
+
+	def setUp( self ):
+		self.root = tempfile.mkdtemp()
+		write_json( os.path.join( self.root, '_container.json' ), { 'name': 'root', 'type': 'root' } )
+		write_json( os.path.join( self.root, '_scripts.json' ), [] )
+
+		write_json(
+			os.path.join( self.root, 'a', '_container.json' ),
+			{ 'name': 'a', 'type': 'sample', 'tags': [ 'good' ], 'metadata': { 'angle': 30 } }
+		)
+		write_json( os.path.join( self.root, 'a', 'times', '_asset.json' ), { 'type': 'times', 'file': 'times.csv' } )
+
+		write_json( os.path.join( self.root, 'b', '_container.json' ), { 'name': 'b', 'type': 'sample' } )
+		write_json( os.path.join( self.root, 'b', 'c', '_container.json' ), { 'name': 'c', 'type': 'run' } )
+		write_json( os.path.join( self.root, 'b', 'c', 'raw', '_asset.json' ), { 'type': 'raw', 'file': 'raw.csv' } )
+
+
+	def tearDown( self ):
+		shutil.rmtree( self.root )
+
+
+	def holds( self, condition, container ):
+		return evaluate( condition, Context( os.path.join( self.root, container ), self.root ) )
+
+
+	def test_container( self ):
+		self.assertTrue( self.holds( { 'container': { 'tags': 'good', 'metadata.angle': 30 } }, 'a' ) )
+		self.assertFalse( self.holds( { 'container': { 'tags': 'good' } }, 'b' ) )
+		self.assertFalse( self.holds( { 'container': { 'metadata.angle': 30 } }, 'b' ) )
+
+
+	def test_assets( self ):
+		self.assertTrue( self.holds( { 'asset': { 'type': 'times' } }, 'a' ) )
+		self.assertFalse( self.holds( { 'asset': { 'type': 'raw' } }, 'b' ) )
+		self.assertTrue( self.holds( { 'descendant': { 'type': 'raw' } }, 'b' ) )
+
+
+	def test_exists( self ):
+		self.assertTrue( self.holds( { 'exists': 'times' }, 'a' ) )
+		self.assertTrue( self.holds( { 'exists': [ 'root:/b/c', 'c/raw' ] }, 'b' ) )
+		self.assertFalse( self.holds( { 'exists': 'times' }, 'b' ) )
+
+
+	def test_combinators( self ):
+		self.assertTrue( self.holds( { 'any': [ { 'exists': 'missing' }, { 'container': { 'name': 'b' } } ] }, 'b' ) )
+		self.assertFalse( self.holds( { 'all': [ { 'exists': 'missing' }, { 'container': { 'name': 'b' } } ] }, 'b' ) )
+		self.assertTrue( self.holds( { 'not': { 'asset': { 'type': 'times' } } }, 'b' ) )
+		self.assertFalse( self.holds( [ { 'container': { 'name': 'a' } }, { 'exists': 'missing' } ], 'a' ) )
+
+
+	def test_invalid( self ):
+		with self.assertRaises( ValueError ):
+			self.holds( { 'unknown': True }, 'a' )
+
+		with self.assertRaises( ValueError ):
+			self.holds( { 'asset': 'times' }, 'a' )
+
+
+	def test_run( self ):
+		os.makedirs( os.path.join( self.root, 'scripts' ) )
+		with open( os.path.join( self.root, 'scripts', 'mark.py' ), 'w' ) as f:
+			f.write(
+				'import os\n'
+				'open( os.path.join( os.environ[ "THOT_CONTAINER_ID" ], "ran" ), "w" ).close()\n'
+			)
+
+		for name in ( 'a', 'b' ):
+			write_json( os.path.join( self.root, name, '_scripts.json' ), [ {
+				'script': 'root:/scripts/mark.py',
+				'when': { 'asset': { 'type': 'times' } }
+			} ] )
+
+		runner.run( self.root )
+		self.assertTrue( os.path.exists( os.path.join( self.root, 'a', 'ran' ) ) )
+		self.assertFalse( os.path.exists( os.path.join( self.root, 'b', 'ran' ) ) )
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,87 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from thot_cli.commands.utils import gc
+
+
+def write_json( path, data ):
+	os.makedirs( os.path.dirname( path ), exist_ok = True )
+	with open( path, 'w' ) as f:
+		json.dump( data, f )
+
+
+def touch( path ):
+	os.makedirs( os.path.dirname( path ), exist_ok = True )
+	with open( path, 'w' ) as f:
+		f.write( 'data' )
+
+
+class TestGc( unittest.TestCase ):
+
+	def setUp( self ):
+		self.root = tempfile.mkdtemp()
+		write_json( self.path( '_container.json' ), { 'name': 'root' } )
+		write_json( self.path( 'a', '_container.json' ), { 'name': 'a' } )
+		write_json( self.path( 'b', '_container.json' ), { 'name': 'b' } )
+
+		# asset with an unreferenced file, and a file referenced by another asset
+		write_json( self.path( 'a', 'data', '_asset.json' ), { 'type': 'data', 'file': 'data.csv' } )
+		touch( self.path( 'a', 'data', 'data.csv' ) )
+		touch( self.path( 'a', 'data', 'scratch.tmp' ) )
+		touch( self.path( 'a', 'data', 'shared', 'shared.csv' ) )
+		write_json( self.path( 'b', 'linked', '_asset.json' ), { 'type': 'linked', 'file': 'root:/a/data/shared/shared.csv' } )
+
+		# removed asset and empty folder
+		write_json( self.path( 'a', 'old', '_asset_removed.json' ), { 'type': 'old', 'file': 'old.csv' } )
+		touch( self.path( 'a', 'old', 'old.csv' ) )
+		os.makedirs( self.path( 'a', 'empty' ) )
+
+
+	def tearDown( self ):
+		shutil.rmtree( self.root )
+
+
+	def path( self, *parts ):
+		return os.path.join( self.root, *parts )
+
+
+	def garbage( self, root ):
+		return [ ( item[ 'kind' ], item[ 'path' ] ) for item in gc.find( root ) ]
+
+
+	def test_find( self ):
+		self.assertEqual( self.garbage( self.root ), [
+			( 'asset.unreferenced', self.path( 'a', 'data', 'scratch.tmp' ) ),
+			( 'folder.empty', self.path( 'a', 'empty' ) ),
+			( 'removed.asset', self.path( 'a', 'old' ) )
+		] )
+
+
+	def test_references_outside_subtree( self ):
+		# shared file is only referenced by an asset outside the subtree
+		self.assertEqual( self.garbage( self.path( 'a' ) ), self.garbage( self.root ) )
+
+
+	def test_collect( self ):
+		report = gc.gc( self.root, dry_run = True )
+		self.assertEqual( report[ 'deleted' ], 0 )
+		self.assertTrue( os.path.exists( self.path( 'a', 'old' ) ) )
+
+		report = gc.gc( self.root )
+		self.assertEqual( report[ 'deleted' ], 3 )
+		self.assertEqual( report[ 'failed' ], [] )
+		self.assertFalse( os.path.exists( self.path( 'a', 'old' ) ) )
+		self.assertFalse( os.path.exists( self.path( 'a', 'data', 'scratch.tmp' ) ) )
+		self.assertTrue( os.path.exists( self.path( 'a', 'data', 'data.csv' ) ) )
+		self.assertTrue( os.path.exists( self.path( 'a', 'data', 'shared', 'shared.csv' ) ) )
+
+
+	def test_older_than( self ):
+		self.assertEqual( gc.find( self.root, older_than = gc.parse_age( '1d' ) ), [] )
+
+
+if __name__ == '__main__':
+	unittest.main()
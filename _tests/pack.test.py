@@ -0,0 +1,96 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from thot.db.local import LocalDB
+
+from thot_cli.commands.utils import pack
+from thot_cli.commands.utils import walk
+from thot_cli.commands.utils.packdb import PackedDB, load_db, supported
+
+
+def write_json( path, data ):
+	os.makedirs( os.path.dirname( path ), exist_ok = True )
+	with open( path, 'w' ) as f:
+		json.dump( data, f )
+
+
+class TestPack( unittest.TestCase ):
+
+	def setUp( self ):
+		self.root = tempfile.mkdtemp()
+		write_json( os.path.join( self.root, '_container.json' ), { 'name': 'root', 'type': 'root' } )
+		write_json( os.path.join( self.root, '_scripts.json' ), [] )
+		for name in ( 'a', 'b' ):
+			child = os.path.join( self.root, name )
+			write_json( os.path.join( child, '_container.json' ), { 'name': name, 'type': 'child' } )
+			write_json( os.path.join( child, 'data', '_asset.json' ), { 'name': name, 'type': 'data', 'file': 'data.csv' } )
+
+		pack.write( self.root, walk.read_tree( self.root, packed = False ) )
+
+
+	def tearDown( self ):
+		shutil.rmtree( self.root )
+
+
+	def test_round_trip( self ):
+		packed = pack.load( self.root )
+		self.assertIsNotNone( packed )
+		try:
+			folder = os.path.join( self.root, 'a', 'data' )
+			( files, removed, folders ) = packed.folder( folder )
+			with open( os.path.join( folder, '_asset.json' ), 'rb' ) as f:
+				self.assertEqual( bytes( files[ '_asset.json' ] ), f.read() )
+
+			( _, _, folders ) = packed.folder( self.root )
+			self.assertEqual(
+				sorted( folders ),
+				[ os.path.join( self.root, name ) for name in ( 'a', 'b' ) ]
+			)
+
+		finally:
+			packed.close()
+
+
+	def test_load_db( self ):
+		if not supported():
+			self.skipTest( 'Packed objects not supported by this thot-data.' )
+
+		db = load_db( self.root )
+		self.assertIsInstance( db, PackedDB )
+		self.assertEqual(
+			sorted( container.meta[ 'name' ] for container in db.containers.find( { 'type': 'child' } ) ),
+			[ 'a', 'b' ]
+		)
+
+		self.assertEqual(
+			sorted( asset._id for asset in db.assets.find( { 'type': 'data' } ) ),
+			sorted( asset._id for asset in LocalDB( self.root ).assets.find( { 'type': 'data' } ) )
+		)
+
+
+	def test_stale_after_edit( self ):
+		write_json( os.path.join( self.root, 'a', '_container.json' ), { 'name': 'edited', 'type': 'child' } )
+		self.assertIsNone( pack.load( self.root ) )
+		self.assertNotIsInstance( load_db( self.root ), PackedDB )
+
+
+	def test_stale_after_add( self ):
+		write_json( os.path.join( self.root, 'c', '_container.json' ), { 'name': 'c', 'type': 'child' } )
+		self.assertIsNone( pack.load( self.root ) )
+
+
+	def test_unpack( self ):
+		path = os.path.join( self.root, 'b', 'data', '_asset.json' )
+		os.remove( path )
+
+		stats = pack.unpack( self.root )
+		self.assertEqual( stats[ 'written' ], 1 )
+		self.assertTrue( os.path.isfile( path ) )
+		self.assertFalse( os.path.exists( pack.pack_path( self.root ) ) )
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+from thot_cli.commands.run.queue import Queue, level_tasks
+
+
+class TestQueue( unittest.TestCase ):
+
+	def setUp( self ):
+		self.root = tempfile.mkdtemp()
+		with open( os.path.join( self.root, '_container.json' ), 'w' ) as f:
+			json.dump( { 'name': 'root' }, f )
+
+		script = os.path.join( self.root, 'script.py' )
+		levels = [
+			[ ( os.path.join( self.root, 'a' ), script ), ( os.path.join( self.root, 'b' ), script ) ],
+			[ ( self.root, script ) ]
+		]
+
+		self.queue = Queue( self.root )
+		self.queue.create( level_tasks( levels ) )
+
+
+	def tearDown( self ):
+		shutil.rmtree( self.root )
+
+
+	def test_ready_follows_deps( self ):
+		self.assertEqual( self.queue.ready(), [ '0', '1' ] )
+		for task_id in ( '0', '1' ):
+			self.assertTrue( self.queue.claim( task_id ) )
+			self.queue.complete( task_id )
+
+		self.assertEqual( self.queue.ready(), [ '2' ] )
+		self.assertEqual( self.queue.task( '2' ), ( self.root, os.path.join( self.root, 'script.py' ) ) )
+
+
+	def test_claim_once( self ):
+		other = Queue( self.root )
+		other.load()
+		self.assertTrue( self.queue.claim( '0' ) )
+		self.assertFalse( other.claim( '0' ) )
+		self.assertNotIn( '0', other.ready() )
+
+
+	def test_reclaim( self ):
+		self.assertTrue( self.queue.claim( '0' ) )
+		self.assertTrue( self.queue.claim( '1' ) )
+
+		# worker holding task 0 stopped sending heartbeats
+		stale = time.time() - 120
+		os.utime( self.queue._marker( 'claimed', '0' ), ( stale, stale ) )
+
+		self.assertEqual( self.queue.reclaim( timeout = 60 ), [ '0' ] )
+		self.assertEqual( self.queue.ready(), [ '0' ] )
+		self.assertTrue( Queue( self.root ).claim( '0' ) )
+
+
+	def test_fail_propagates( self ):
+		self.assertTrue( self.queue.claim( '0' ) )
+		self.queue.fail( '0', 'error' )
+		self.assertTrue( self.queue.claim( '1' ) )
+		self.queue.complete( '1' )
+
+		self.assertEqual( self.queue.ready(), [] )
+		self.assertEqual( self.queue.status(), { 'pending': 0, 'claimed': 0, 'done': 1, 'failed': 2 } )
+		self.assertTrue( self.queue.finished() )
+
+
+	def test_create_unfinished( self ):
+		with self.assertRaises( RuntimeError ):
+			Queue( self.root ).create( [] )
+
+
+if __name__ == '__main__':
+	unittest.main()
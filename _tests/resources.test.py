@@ -0,0 +1,92 @@
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+from thot_cli.commands.run.resources import Resources, parse_pools, script_resources
+
+
+def run_tasks( resources, tasks ):
+	"""
+	Runs fake tasks under the resources.
+
+	:param tasks: List of ( <pool>, <cpus> ).
+	:returns: Dictionary of peak concurrent tasks, keyed by pool and 'cpus' for cores.
+	"""
+	running = { 'cpus': 0 }
+	peaks = { 'cpus': 0 }
+
+	async def _task( pool, cpus ):
+		await resources.acquire( pool = pool, cpus = cpus )
+		if resources.cpus is not None:
+			# larger requests reserve all cores
+			cpus = min( cpus, resources.cpus )
+
+		try:
+			running[ pool ] = running.get( pool, 0 ) + 1
+			running[ 'cpus' ] += cpus
+			for key in ( pool, 'cpus' ):
+				peaks[ key ] = max( peaks.get( key, 0 ), running[ key ] )
+
+			await asyncio.sleep( 0.01 )
+			running[ pool ] -= 1
+			running[ 'cpus' ] -= cpus
+
+		finally:
+			await resources.release( pool = pool, cpus = cpus )
+
+
+	async def _run():
+		await asyncio.gather( *( _task( pool, cpus ) for ( pool, cpus ) in tasks ) )
+
+
+	asyncio.run( _run() )
+	return peaks
+
+
+class TestResources( unittest.TestCase ):
+
+	def test_parse_pools( self ):
+		self.assertEqual( parse_pools( [ 'gpu=1', ' io = 4' ] ), { 'gpu': 1, 'io': 4 } )
+		for pool in ( 'gpu', '=2', 'gpu=0' ):
+			with self.assertRaises( ValueError ):
+				parse_pools( [ pool ] )
+
+
+	def test_pool_limits( self ):
+		resources = Resources( tasks = 4, pools = { 'gpu': 1 } )
+		peaks = run_tasks( resources, [ ( 'gpu', 1 ) ]* 4 + [ ( None, 1 ) ]* 8 )
+		self.assertEqual( peaks[ 'gpu' ], 1 )
+		self.assertLessEqual( peaks[ None ], 4 )
+
+
+	def test_cpu_packing( self ):
+		resources = Resources( cpus = 4 )
+		peaks = run_tasks( resources, [ ( None, 2 ) ]* 4 + [ ( None, 1 ) ]* 4 + [ ( None, 8 ) ] )
+		self.assertEqual( peaks[ 'cpus' ], 4 )
+
+
+	def test_script_resources( self ):
+		root = tempfile.mkdtemp()
+		try:
+			with open( os.path.join( root, '_scripts.json' ), 'w' ) as f:
+				json.dump( [
+					{ 'script': 'root:/fit.py', 'pool': 'heavy', 'cpus': 4 },
+					{ 'script': 'root:/plot.py' },
+					{ 'script': 'root:/bad.py', 'cpus': 0 }
+				], f )
+
+			self.assertEqual( script_resources( root, os.path.join( root, 'fit.py' ), root ), ( 'heavy', 4 ) )
+			self.assertEqual( script_resources( root, os.path.join( root, 'plot.py' ), root ), ( None, 1 ) )
+			self.assertEqual( script_resources( root, os.path.join( root, 'other.py' ), root ), ( None, 1 ) )
+			with self.assertRaises( ValueError ):
+				script_resources( root, os.path.join( root, 'bad.py' ), root )
+
+		finally:
+			shutil.rmtree( root )
+
+
+if __name__ == '__main__':
+	unittest.main()
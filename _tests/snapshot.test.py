@@ -0,0 +1,75 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from thot_cli.commands.utils import snapshot
+
+
+def write_json( path, data ):
+	os.makedirs( os.path.dirname( path ), exist_ok = True )
+	with open( path, 'w' ) as f:
+		json.dump( data, f )
+
+
+class TestSnapshot( unittest.TestCase ):
+
+	def setUp( self ):
+		self.root = tempfile.mkdtemp()
+		write_json( os.path.join( self.root, '_container.json' ), { 'name': 'root', 'type': 'root' } )
+		for name in ( 'a', 'b' ):
+			write_json( os.path.join( self.root, name, '_container.json' ), { 'name': name, 'type': 'child' } )
+
+		write_json( os.path.join( self.root, 'a', 'data', '_asset.json' ), { 'type': 'data', 'file': 'data.csv' } )
+		with open( os.path.join( self.root, 'a', 'data', 'data.csv' ), 'w' ) as f:
+			f.write( '1,2\n' )
+
+		self.before = snapshot.snapshot( self.root )
+
+
+	def tearDown( self ):
+		shutil.rmtree( self.root )
+
+
+	def changes( self ):
+		return snapshot.diff( self.before, snapshot.snapshot( self.root ) )
+
+
+	def test_unchanged( self ):
+		self.assertEqual( self.changes(), [] )
+
+
+	def test_modified_file( self ):
+		with open( os.path.join( self.root, 'a', 'data', 'data.csv' ), 'w' ) as f:
+			f.write( '1,2\n3,4\n' )
+
+		self.assertEqual( self.changes(), [ ( 'M', 'asset', os.path.join( 'a', 'data' ) ) ] )
+
+
+	def test_modified_container( self ):
+		write_json( os.path.join( self.root, 'b', '_container.json' ), { 'name': 'b', 'type': 'other' } )
+		self.assertEqual( self.changes(), [ ( 'M', 'container', 'b' ) ] )
+
+
+	def test_added_and_removed( self ):
+		shutil.rmtree( os.path.join( self.root, 'b' ) )
+		write_json( os.path.join( self.root, 'c', '_container.json' ), { 'name': 'c' } )
+		write_json( os.path.join( self.root, 'c', 'd', '_container.json' ), { 'name': 'd' } )
+
+		self.assertEqual( self.changes(), [
+			( '-', 'container', 'b' ),
+			( '+', 'container', 'c' ),
+			( '+', 'container', os.path.join( 'c', 'd' ) )
+		] )
+
+
+	def test_save_load( self ):
+		path = snapshot.snapshot_path( self.root, 'saved' )
+		snapshot.save( self.before, path )
+		self.assertEqual( snapshot.load( path ), self.before )
+		self.assertEqual( snapshot.resolve( 'saved', self.root ), self.before )
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# CPU Policy Benchmark
+"""
+Compares the throughput of concurrent NumPy scripts under each CPU policy.
+
+Runs a matrix multiplication script as many times as requested,
+with a limited number running at once, as `thot run --tasks` would.
+Requires NumPy.
+
+Usage: python benchmarks/cpu_policy.py [--runs 64] [--tasks <cores>] [--size 1500]
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+from time import perf_counter
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+from thot_cli.commands.run.cpu import CpuPolicy, POLICIES
+
+
+SCRIPT = '''
+import numpy as np
+a = np.random.rand( {size}, {size} )
+for _ in range( 4 ):
+    a = a @ a
+    a /= np.abs( a ).max()
+'''
+
+
+async def run_policy( policy, script, runs, tasks ):
+    """
+    :param policy: CPU policy.
+    :param script: Path to the script to run.
+    :param runs: Number of times to run the script.
+    :param tasks: Maximum number of concurrent runs.
+    :returns: Wall time in seconds.
+    """
+    cpu = CpuPolicy( policy, tasks = tasks )
+    semaphore = asyncio.Semaphore( tasks )
+
+    async def _run():
+        async with semaphore:
+            ( cpu_env, pinned ) = cpu.acquire()
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, script,
+                    env = { **os.environ, **cpu_env },
+                    preexec_fn = CpuPolicy.pin( pinned )
+                )
+
+                await proc.wait()
+
+            finally:
+                cpu.release( pinned )
+
+    start = perf_counter()
+    await asyncio.gather( *( _run() for _ in range( runs ) ) )
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser( description = 'CPU policy benchmark.' )
+    parser.add_argument( '--runs', type = int, default = 64, help = 'Number of script runs.' )
+    parser.add_argument( '--tasks', type = int, default = os.cpu_count(), help = 'Concurrent runs.' )
+    parser.add_argument( '--size', type = int, default = 1500, help = 'Matrix size.' )
+    args = parser.parse_args()
+
+    try:
+        import numpy
+
+    except ImportError:
+        sys.exit( 'NumPy is required for the benchmark.' )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join( tmp, 'matmul.py' )
+        with open( script, 'w' ) as f:
+            f.write( SCRIPT.format( size = args.size ) )
+
+        print( '{} runs, {} tasks, {} cores'.format( args.runs, args.tasks, os.cpu_count() ) )
+        baseline = None
+        for policy in POLICIES:
+            elapsed = asyncio.run( run_policy( policy, script, args.runs, args.tasks ) )
+            baseline = baseline or elapsed
+            print( '{:>8}: {:8.2f} s  {:6.2f} runs/s  x{:.2f}'.format(
+                policy, elapsed, args.runs / elapsed, baseline / elapsed
+            ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Synthetic Project Generator
+"""
+Generates synthetic local projects for benchmarking.
+
+The tree has `depth` levels below the root, each Container having `fanout` children.
+Every Container has `assets` Assets of `asset_size` bytes,
+and is associated with `scripts` Scripts from the root's `scripts` folder.
+
+Usage: python benchmarks/generate.py <path> [--depth 3] [--fanout 4] [--assets 2] ...
+"""
+
+import os
+import json
+import random
+import argparse
+
+
+CONTAINER_FILE = '_container.json'
+ASSET_FILE     = '_asset.json'
+SCRIPTS_FILE   = '_scripts.json'
+SCRIPTS_FOLDER = 'scripts'
+
+SCRIPT_KINDS = ( 'trivial', 'import' )
+
+SCRIPTS = {
+    # does nothing, measures runner overhead
+    'trivial': '''
+import os
+container = os.environ.get( 'THOT_CONTAINER_ID' )
+''',
+
+    # imports large libraries, as analysis scripts do
+    'import': '''
+import os
+try:
+    import pandas
+
+except ImportError:
+    import asyncio, csv, decimal, email.parser, http.client, json, statistics, xml.dom.minidom
+
+container = os.environ.get( 'THOT_CONTAINER_ID' )
+'''
+}
+
+
+def _write_json( path, data ):
+    with open( path, 'w' ) as f:
+        json.dump( data, f, indent = 4 )
+
+
+def _data( size, rng ):
+    """
+    :param size: Number of bytes.
+    :param rng: Random number generator.
+    :returns: CSV like data of the given size.
+    """
+    line = ','.join( '{:.6f}'.format( rng.random() ) for _ in range( 8 ) ) + '\n'
+    data = line* ( size // len( line ) + 1 )
+    return data[ :size ]
+
+
+def generate(
+    path,
+    depth = 3,
+    fanout = 4,
+    assets = 2,
+    asset_size = 1024,
+    scripts = 1,
+    script_kind = 'trivial',
+    loose = 0,
+    seed = 0
+):
+    """
+    Generates a synthetic project.
+
+    :param path: Path to create the project at. Must not exist.
+    :param depth: Number of levels below the root. [Default: 3]
+    :param fanout: Number of children of each Container. [Default: 4]
+    :param assets: Number of Assets of each Container. [Default: 2]
+    :param asset_size: Size of each Asset's file in bytes. [Default: 1024]
+    :param scripts: Number of Scripts associated with each Container. [Default: 1]
+    :param script_kind: Kind of Script, one of SCRIPT_KINDS. [Default: 'trivial']
+    :param loose: Number of data files in the root not yet converted to Assets,
+        for `data_to_assets`. [Default: 0]
+    :param seed: Random seed. [Default: 0]
+    :returns: Dictionary of counts of the generated objects,
+        with keys [ 'containers', 'assets', 'scripts', 'bytes' ].
+    :raises ValueError: If the script kind is invalid.
+    :raises FileExistsError: If the path exists.
+    """
+    if script_kind not in SCRIPT_KINDS:
+        raise ValueError( 'Invalid script kind {}, must be one of {}.'.format( script_kind, SCRIPT_KINDS ) )
+
+    rng = random.Random( seed )
+    path = os.path.abspath( path )
+    os.makedirs( path )
+
+    # scripts
+    script_dir = os.path.join( path, SCRIPTS_FOLDER )
+    os.mkdir( script_dir )
+    associations = []
+    for index in range( scripts ):
+        name = '{}-{}.py'.format( script_kind, index )
+        with open( os.path.join( script_dir, name ), 'w' ) as f:
+            f.write( SCRIPTS[ script_kind ] )
+
+        associations.append( { 'script': 'root:/{}/{}'.format( SCRIPTS_FOLDER, name ), 'priority': index } )
+
+    counts = { 'containers': 0, 'assets': 0, 'scripts': scripts, 'bytes': 0 }
+    def _container( folder, level, index ):
+        os.makedirs( folder, exist_ok = True )
+        _write_json( os.path.join( folder, CONTAINER_FILE ), {
+            'name': os.path.basename( folder ),
+            'type': 'level-{}'.format( level ),
+            'tags': [ 'synthetic' ],
+            'metadata': { 'level': level, 'index': index }
+        } )
+
+        _write_json( os.path.join( folder, SCRIPTS_FILE ), associations )
+        counts[ 'containers' ] += 1
+
+        for asset_index in range( assets ):
+            asset = os.path.join( folder, 'asset-{}'.format( asset_index ) )
+            os.mkdir( asset )
+            _write_json( os.path.join( asset, ASSET_FILE ), {
+                'name': 'asset-{}'.format( asset_index ),
+                'type': 'data',
+                'file': 'data.csv',
+                'tags': [ 'synthetic' ],
+                'metadata': { 'index': asset_index }
+            } )
+
+            with open( os.path.join( asset, 'data.csv' ), 'w' ) as f:
+                f.write( _data( asset_size, rng ) )
+
+            counts[ 'assets' ] += 1
+            counts[ 'bytes' ] += asset_size
+
+        if level < depth:
+            for child in range( fanout ):
+                _container( os.path.join( folder, 'c{}'.format( child ) ), level + 1, child )
+
+
+    _container( path, 0, 0 )
+
+    for index in range( loose ):
+        with open( os.path.join( path, 'loose-{}.csv'.format( index ) ), 'w' ) as f:
+            f.write( _data( asset_size, rng ) )
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser( description = 'Generate a synthetic Thot project.' )
+    parser.add_argument( 'path', help = 'Path to create the project at.' )
+    parser.add_argument( '--depth', type = int, default = 3, help = 'Levels below the root.' )
+    parser.add_argument( '--fanout', type = int, default = 4, help = 'Children per Container.' )
+    parser.add_argument( '--assets', type = int, default = 2, help = 'Assets per Container.' )
+    parser.add_argument( '--asset-size', type = int, default = 1024, help = 'Bytes per Asset.' )
+    parser.add_argument( '--scripts', type = int, default = 1, help = 'Scripts per Container.' )
+    parser.add_argument( '--script-kind', choices = SCRIPT_KINDS, default = 'trivial', help = 'Kind of Script.' )
+    parser.add_argument( '--loose', type = int, default = 0, help = 'Data files in the root not yet Assets.' )
+    parser.add_argument( '--seed', type = int, default = 0, help = 'Random seed.' )
+    args = parser.parse_args()
+
+    counts = generate( **vars( args ) )
+    print( json.dumps( counts ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark Suite
+"""
+End to end benchmarks of the command line interface on synthetic projects.
+
+Each benchmark runs a `thot` command in a new process, as a user would,
+on a project created by #generate.
+Commands that modify the project run on a fresh copy each repeat,
+and the copy is not timed.
+
+Usage:
+    python benchmarks/suite.py [--preset small] [--repeats 3] [--output results.json]
+    python benchmarks/suite.py --compare baseline.json [--threshold 0.1]
+
+Results are written as JSON. With `--compare` the results are compared
+to a saved baseline by median time, and the process exits with an error
+if any benchmark is slower than the baseline by more than the threshold.
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from time import perf_counter
+from datetime import datetime
+
+from generate import generate
+
+
+# project sizes
+PRESETS = {
+    'small':  { 'depth': 2, 'fanout': 4, 'assets': 2, 'asset_size': 1024 },
+    'medium': { 'depth': 3, 'fanout': 5, 'assets': 3, 'asset_size': 16* 1024 },
+    'large':  { 'depth': 4, 'fanout': 6, 'assets': 4, 'asset_size': 64* 1024 }
+}
+
+# `--tasks` values run
+TASKS = ( 1, 4, 16 )
+
+# number of loose data files for `data_to_assets`
+LOOSE = 50
+
+REPO = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+
+def thot( *args ):
+    """
+    :param *args: Arguments to `thot`.
+    :returns: Command running `thot` from this repository.
+    """
+    return [ sys.executable, '-m', 'thot_cli', *args ]
+
+
+def time_command( cmd, cwd, setup = None, repeats = 3 ):
+    """
+    Times a command.
+
+    :param cmd: Command, or function taking the working directory and returning the command.
+    :param cwd: Project to run the command on.
+    :param setup: Function taking the project and returning the working directory
+        for a repeat, or None to use the project. [Default: None]
+    :param repeats: Number of repeats. [Default: 3]
+    :returns: List of times in seconds.
+    :raises RuntimeError: If the command fails.
+    """
+    env = { **os.environ, 'PYTHONPATH': os.pathsep.join( filter( None, [ REPO, os.environ.get( 'PYTHONPATH' ) ] ) ) }
+
+    times = []
+    for _ in range( repeats ):
+        work = cwd if setup is None else setup( cwd )
+        args = cmd( work ) if callable( cmd ) else cmd
+
+        start = perf_counter()
+        proc = subprocess.run( args, cwd = work, env = env, stdout = subprocess.DEVNULL, stderr = subprocess.PIPE )
+        elapsed = perf_counter() - start
+
+        if proc.returncode:
+            raise RuntimeError( '{} failed:\n{}'.format( ' '.join( args ), proc.stderr.decode() ) )
+
+        times.append( elapsed )
+        if work != cwd:
+            shutil.rmtree( work, ignore_errors = True )
+
+    return times
+
+
+def benchmarks( projects, tmp ):
+    """
+    :param projects: Dictionary of generated projects keyed by script kind.
+    :param tmp: Temporary folder for copies.
+    :returns: List of ( <name>, <command>, <project>, <setup> ), as for #time_command.
+    """
+    def _copy( project ):
+        work = tempfile.mkdtemp( dir = tmp )
+        os.rmdir( work )
+        shutil.copytree( project, work )
+        return work
+
+
+    trivial = projects[ 'trivial' ]
+    cases = [ ( 'startup', thot( '--help' ), trivial, None ) ]
+
+    for kind, project in sorted( projects.items() ):
+        for tasks in TASKS:
+            cases.append( (
+                'run/{}/tasks-{}'.format( kind, tasks ),
+                thot( 'run', '--tasks', str( tasks ) ),
+                project,
+                None
+            ) )
+
+    scripts = json.dumps( [ { 'script': 'root:/scripts/trivial-0.py', 'priority': 10 } ] )
+    assets = json.dumps( { 'bench-asset': { 'type': 'bench', 'file': 'bench.csv' } } )
+    cases += [
+        (
+            'utils/add_scripts',
+            thot( 'utils', 'add_scripts', '--scripts', scripts, '--search', '{}', '-w' ),
+            trivial,
+            _copy
+        ),
+        (
+            'utils/add_assets',
+            thot( 'utils', 'add_assets', '--assets', assets, '--search', '{}' ),
+            trivial,
+            _copy
+        ),
+        (
+            'utils/remove_assets',
+            thot( 'utils', 'remove_assets', '--assets', json.dumps( { 'type': 'data' } ) ),
+            trivial,
+            _copy
+        ),
+        (
+            'utils/data_to_assets',
+            thot( 'utils', 'data_to_assets', '--search', 'loose-*.csv' ),
+            trivial,
+            _copy
+        ),
+        (
+            'utils/print_tree',
+            thot( 'utils', 'print_tree' ),
+            trivial,
+            None
+        )
+    ]
+
+    return cases
+
+
+def run_suite( preset = 'small', repeats = 3, only = None ):
+    """
+    Runs the benchmark suite.
+
+    :param preset: Project size, one of PRESETS. [Default: 'small']
+    :param repeats: Number of repeats of each benchmark. [Default: 3]
+    :param only: Substring of the names of benchmarks to run, or None for all.
+        [Default: None]
+    :returns: Results, with keys [ 'meta', 'results' ].
+    """
+    config = PRESETS[ preset ]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        projects = {}
+        for kind in ( 'trivial', 'import' ):
+            path = os.path.join( tmp, kind )
+            counts = generate( path, script_kind = kind, loose = LOOSE, **config )
+            projects[ kind ] = path
+
+        for ( name, cmd, project, setup ) in benchmarks( projects, tmp ):
+            if ( only is not None ) and ( only not in name ):
+                continue
+
+            times = time_command( cmd, project, setup = setup, repeats = repeats )
+            results[ name ] = {
+                'times':  times,
+                'min':    min( times ),
+                'median': statistics.median( times )
+            }
+
+            print( '{:<28} {:>9.3f} s'.format( name, results[ name ][ 'median' ] ), file = sys.stderr )
+
+    meta = {
+        'date':     datetime.now().isoformat( timespec = 'seconds' ),
+        'python':   platform.python_version(),
+        'platform': platform.platform(),
+        'cpus':     os.cpu_count(),
+        'preset':   preset,
+        'config':   config,
+        'counts':   counts,
+        'repeats':  repeats
+    }
+
+    return { 'meta': meta, 'results': results }
+
+
+def compare( results, baseline, threshold = 0.1 ):
+    """
+    Compares results to a baseline by median time.
+
+    :param results: Results, as returned by #run_suite.
+    :param baseline: Baseline results.
+    :param threshold: Relative change considered significant. [Default: 0.1]
+    :returns: List of ( <name>, <baseline median>, <median>, <ratio>, <status> )
+        for benchmarks in both, where status is one of
+        [ 'regression', 'improvement', 'ok' ].
+    """
+    rows = []
+    for name, result in sorted( results[ 'results' ].items() ):
+        base = baseline[ 'results' ].get( name )
+        if base is None:
+            continue
+
+        ratio = result[ 'median' ] / base[ 'median' ]
+        if ratio > 1 + threshold:
+            status = 'regression'
+
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+
+        else:
+            status = 'ok'
+
+        rows.append( ( name, base[ 'median' ], result[ 'median' ], ratio, status ) )
+
+    return rows
+
+
+def print_comparison( rows ):
+    """
+    Prints a comparison.
+
+    :param rows: Comparison, as returned by #compare.
+    """
+    print( '{:<28} {:>10} {:>10} {:>8}  {}'.format( 'BENCHMARK', 'BASELINE', 'CURRENT', 'RATIO', 'STATUS' ) )
+    for ( name, base, current, ratio, status ) in rows:
+        print( '{:<28} {:>9.3f}s {:>9.3f}s {:>7.2f}x  {}'.format( name, base, current, ratio, status.upper() ) )
+
+
+def main():
+    parser = argparse.ArgumentParser( description = 'Thot CLI benchmark suite.' )
+    parser.add_argument( '--preset', choices = PRESETS, default = 'small', help = 'Size of the generated projects.' )
+    parser.add_argument( '--repeats', type = int, default = 3, help = 'Repeats of each benchmark.' )
+    parser.add_argument( '--only', help = 'Only run benchmarks whose name contains this.' )
+    parser.add_argument( '--output', help = 'File to write results to. Printed if not given.' )
+    parser.add_argument( '--compare', help = 'Baseline results to compare against.' )
+    parser.add_argument( '--threshold', type = float, default = 0.1, help = 'Relative slow down flagged as a regression.' )
+    args = parser.parse_args()
+
+    results = run_suite( preset = args.preset, repeats = args.repeats, only = args.only )
+    if args.output:
+        with open( args.output, 'w' ) as f:
+            json.dump( results, f, indent = 4 )
+
+    elif not args.compare:
+        print( json.dumps( results, indent = 4 ) )
+
+    if args.compare:
+        with open( args.compare ) as f:
+            baseline = json.load( f )
+
+        rows = compare( results, baseline, threshold = args.threshold )
+        print_comparison( rows )
+        if any( row[ 4 ] == 'regression' for row in rows ):
+            sys.exit( 1 )
+
+
+if __name__ == '__main__':
+    main()
@@ -31,7 +31,7 @@ setuptools.setup(
 
     install_requires = [
         'thot-core>=0.4.9',
-        'thot-data>=0.5.0'
+        'thot-data>=0.5.0,<0.6'
     ],
 
     package_data = {
@@ -3,6 +3,7 @@ from argparse import ArgumentParser
 # import commands
 from .commands.run import Run
 from .commands.utils import Utils
+from .commands.sync import Sync
 
 
 def main():
@@ -22,4 +23,7 @@ def _get_cmdline_parser():
     cmd_parser = subparsers.add_parser( 'utils', description = 'Thot utilities.' )
     Utils( cmd_parser )
 
+    cmd_parser = subparsers.add_parser( 'sync', description = 'Thot project syncing.' )
+    Sync( cmd_parser )
+
     return parser
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# --- Common Functionality
+"""
+Helpers shared by commands.
+"""
+
+import os
+import pickle
+from tempfile import NamedTemporaryFile
+
+
+# project folder for state kept by commands, ignored by the database
+STATE_DIR = '.thot'
+
+
+def state_path( root, *parts ):
+    """
+    Gets the path of a file in the project state folder,
+    creating parent folders if needed.
+
+    :param root: Path to the project root.
+    :param *parts: Path components within the state folder.
+    :returns: Path to the state file.
+    """
+    path = os.path.join( root, STATE_DIR, *parts )
+    os.makedirs( os.path.dirname( path ), exist_ok = True )
+
+    return path
+
+
+def load_state( path, default = None ):
+    """
+    Loads a pickled state file.
+
+    :param path: Path of the state file.
+    :param default: Value to return if the file does not exist or is invalid.
+        [Default: None]
+    :returns: Loaded state.
+    """
+    try:
+        with open( path, 'rb' ) as f:
+            return pickle.load( f )
+
+    except ( FileNotFoundError, EOFError, pickle.UnpicklingError ):
+        return default
+
+
+def save_state( path, state ):
+    """
+    Atomically saves a state file.
+
+    :param path: Path of the state file.
+    :param state: State to pickle.
+    """
+    write_atomic( path, pickle.dumps( state, protocol = pickle.HIGHEST_PROTOCOL ) )
+
+
+def write_atomic( path, data ):
+    """
+    Atomically writes a file by writing to a temporary file, then renaming it.
+
+    :param path: Path of the file.
+    :param data: Bytes or string to write.
+    """
+    mode = 'wb' if isinstance( data, bytes ) else 'w'
+    with NamedTemporaryFile(
+        mode = mode,
+        dir = os.path.dirname( path ) or '.',
+        prefix = '.',
+        suffix = '.tmp',
+        delete = False
+    ) as tf:
+        tf.write( data )
+
+    try:
+        # keep permissions of replaced file
+        os.chmod( tf.name, os.stat( path ).st_mode )
+
+    except FileNotFoundError:
+        os.chmod( tf.name, 0o644 )
+
+    os.replace( tf.name, path )
+
+
+def format_bytes( size ):
+    """
+    :param size: Number of bytes.
+    :returns: Human readable size.
+    """
+    for unit in [ 'B', 'K', 'M', 'G', 'T' ]:
+        if abs( size ) < 1024:
+            break
+
+        size /= 1024
+
+    return (
+        '{}{}'.format( size, unit )
+        if unit == 'B' else
+        '{:.1f}{}'.format( size, unit )
+    )
+
+
+def parse_bytes( size ):
+    """
+    Parses a human readable size, as output by #format_bytes.
+
+    :param size: Number of bytes, optionally suffixed by one of [ B, K, M, G, T ].
+    :returns: Number of bytes.
+    :raises ValueError: If the size is invalid.
+    """
+    units = [ 'B', 'K', 'M', 'G', 'T' ]
+    size = str( size ).strip().upper()
+    if size and ( size[ -1 ] in units ):
+        return int( float( size[ :-1 ] )* 1024** units.index( size[ -1 ] ) )
+
+    return int( size )
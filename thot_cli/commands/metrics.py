@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# --- Metrics
+"""
+Counters and histograms of command operations,
+exported in the Prometheus text format for textfile collectors.
+
+Metrics are always recorded, as updating them is cheap,
+but only written if a metrics file is given.
+The metadata files read when loading a database are the exception,
+and only counted while writing, as counting them takes a stat of each file.
+"""
+
+import math
+import threading
+from time import perf_counter
+
+from .common import write_atomic
+
+
+# histogram buckets in seconds
+DURATION_BUCKETS = ( 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600 )
+
+
+def _escape( value ):
+    """
+    :param value: Label value.
+    :returns: Escaped label value.
+    """
+    return str( value ).replace( '\\', '\\\\' ).replace( '"', '\\"' ).replace( '\n', '\\n' )
+
+
+def _labels( names, values, extra = None ):
+    """
+    :param names: Label names.
+    :param values: Label values.
+    :param extra: Additional ( <name>, <value> ), or None. [Default: None]
+    :returns: Formatted labels, or an empty string if there are none.
+    """
+    pairs = list( zip( names, values ) )
+    if extra is not None:
+        pairs.append( extra )
+
+    if not pairs:
+        return ''
+
+    return '{{{}}}'.format( ','.join( '{}="{}"'.format( name, _escape( value ) ) for name, value in pairs ) )
+
+
+def _number( value ):
+    """
+    :param value: Number.
+    :returns: Formatted number.
+    """
+    if value == math.inf:
+        return '+Inf'
+
+    return repr( float( value ) ) if isinstance( value, float ) else str( value )
+
+
+class Metric():
+    """
+    A family of metrics, with a value for each combination of labels.
+    """
+
+    kind = None
+
+    def __init__( self, registry, name, help, labels = () ):
+        """
+        :param registry: Registry the metric belongs to.
+        :param name: Name of the metric.
+        :param help: Description of the metric.
+        :param labels: Label names. [Default: ()]
+        """
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple( labels )
+        self.values = {}
+
+
+    def _key( self, labels ):
+        """
+        :param labels: Label values keyed by name.
+        :returns: Tuple of label values.
+        :raises ValueError: If labels do not match the metric's.
+        """
+        if set( labels ) != set( self.labels ):
+            raise ValueError( 'Metric {} requires labels {}.'.format( self.name, self.labels ) )
+
+        return tuple( labels[ name ] for name in self.labels )
+
+
+    def render( self ):
+        """
+        :returns: List of lines of the metric's samples.
+        """
+        return [
+            '{}{} {}'.format( self.name, _labels( self.labels, key ), _number( value ) )
+            for key, value in sorted( self.values.items() )
+        ]
+
+
+class Counter( Metric ):
+    """
+    A value that only increases.
+    """
+
+    kind = 'counter'
+
+    def inc( self, value = 1, **labels ):
+        """
+        :param value: Amount to increase by. [Default: 1]
+        :param **labels: Label values.
+        """
+        key = self._key( labels )
+        with self.registry.lock:
+            self.values[ key ] = self.values.get( key, 0 ) + value
+
+
+class Gauge( Metric ):
+    """
+    A value that may go up or down.
+    """
+
+    kind = 'gauge'
+
+    def set( self, value, **labels ):
+        """
+        :param value: Value.
+        :param **labels: Label values.
+        """
+        key = self._key( labels )
+        with self.registry.lock:
+            self.values[ key ] = value
+
+
+    def inc( self, value = 1, **labels ):
+        """
+        :param value: Amount to increase by. [Default: 1]
+        :param **labels: Label values.
+        """
+        key = self._key( labels )
+        with self.registry.lock:
+            self.values[ key ] = self.values.get( key, 0 ) + value
+
+
+class Histogram( Metric ):
+    """
+    Distribution of observed values in cumulative buckets.
+    """
+
+    kind = 'histogram'
+
+    def __init__( self, registry, name, help, labels = (), buckets = DURATION_BUCKETS ):
+        """
+        :param buckets: Upper bounds of the buckets. [Default: DURATION_BUCKETS]
+        See Metric for other parameters.
+        """
+        super().__init__( registry, name, help, labels = labels )
+        self.buckets = tuple( sorted( buckets ) ) + ( math.inf, )
+
+
+    def observe( self, value, **labels ):
+        """
+        :param value: Observed value.
+        :param **labels: Label values.
+        """
+        key = self._key( labels )
+        with self.registry.lock:
+            ( counts, total ) = self.values.get( key, ( [ 0 ]* len( self.buckets ), 0 ) )
+            for index, bound in enumerate( self.buckets ):
+                if value <= bound:
+                    counts[ index ] += 1
+
+            self.values[ key ] = ( counts, total + value )
+
+
+    def render( self ):
+        lines = []
+        for key, ( counts, total ) in sorted( self.values.items() ):
+            for bound, count in zip( self.buckets, counts ):
+                lines.append( '{}_bucket{} {}'.format(
+                    self.name,
+                    _labels( self.labels, key, ( 'le', _number( bound ) ) ),
+                    count
+                ) )
+
+            lines.append( '{}_sum{} {}'.format( self.name, _labels( self.labels, key ), _number( total ) ) )
+            lines.append( '{}_count{} {}'.format( self.name, _labels( self.labels, key ), counts[ -1 ] ) )
+
+        return lines
+
+
+class Registry():
+    """
+    Collection of metrics.
+    """
+
+    def __init__( self ):
+        self.lock = threading.RLock()
+        self.metrics = {}
+        self.collectors = []  # functions updating metrics before they are rendered
+        self._writer = None
+        self._stop = None
+
+
+    def _add( self, cls, name, *args, **kwargs ):
+        """
+        Creates a metric, or returns it if it already exists.
+
+        :param cls: Metric class.
+        :param name: Name of the metric.
+        :param *args: Arguments passed to the metric.
+        :param **kwargs: Keyword arguments passed to the metric.
+        :returns: Metric.
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[ name ] = cls( self, name, *args, **kwargs )
+
+            return self.metrics[ name ]
+
+
+    def counter( self, name, help, labels = () ):
+        """
+        :returns: Counter. See Metric for parameters.
+        """
+        return self._add( Counter, name, help, labels = labels )
+
+
+    def gauge( self, name, help, labels = () ):
+        """
+        :returns: Gauge. See Metric for parameters.
+        """
+        return self._add( Gauge, name, help, labels = labels )
+
+
+    def histogram( self, name, help, labels = (), buckets = DURATION_BUCKETS ):
+        """
+        :returns: Histogram. See Histogram for parameters.
+        """
+        return self._add( Histogram, name, help, labels = labels, buckets = buckets )
+
+
+    def render( self ):
+        """
+        :returns: Metrics with samples, in the Prometheus text format.
+        """
+        for collect in self.collectors:
+            collect()
+
+        lines = []
+        with self.lock:
+            for name, metric in sorted( self.metrics.items() ):
+                samples = metric.render()
+                if not samples:
+                    continue
+
+                lines.append( '# HELP {} {}'.format( name, metric.help ) )
+                lines.append( '# TYPE {} {}'.format( name, metric.kind ) )
+                lines += samples
+
+        return '\n'.join( lines ) + '\n'
+
+
+    def write( self, path ):
+        """
+        Atomically writes the metrics to a file.
+
+        :param path: Path of the metrics file.
+        """
+        write_atomic( path, self.render() )
+
+
+    @property
+    def writing( self ):
+        """
+        :returns: If the metrics are being written, see #start.
+        """
+        return self._writer is not None
+
+
+    def start( self, path, interval = 15 ):
+        """
+        Writes the metrics to a file at an interval, in a background thread,
+        until #stop is called.
+
+        :param path: Path of the metrics file.
+        :param interval: Seconds between writes. [Default: 15]
+        """
+        self._stop = threading.Event()
+
+        def _write():
+            while not self._stop.wait( interval ):
+                self.write( path )
+
+
+        self._writer = threading.Thread( target = _write, daemon = True )
+        self._writer.start()
+
+
+    def stop( self, path ):
+        """
+        Stops writing at an interval, and writes the metrics a final time.
+
+        :param path: Path of the metrics file.
+        """
+        if self._writer is not None:
+            self._stop.set()
+            self._writer.join()
+            self._writer = None
+
+        self.write( path )
+
+
+# metrics of the running command
+REGISTRY = Registry()
+
+METADATA_FILES = REGISTRY.counter(
+    'thot_metadata_files_parsed_total',
+    'Metadata files read by the command.'
+)
+
+METADATA_BYTES = REGISTRY.counter(
+    'thot_metadata_bytes_read_total',
+    'Bytes of metadata files read by the command.'
+)
+
+
+def metadata_read( size ):
+    """
+    Counts a metadata file read.
+
+    :param size: Bytes read.
+    """
+    METADATA_FILES.inc()
+    METADATA_BYTES.inc( size )
+
+
+class timer():
+    """
+    Context manager measuring elapsed time.
+    Elapsed seconds are in `elapsed` on exit.
+    """
+
+    def __enter__( self ):
+        self.start = perf_counter()
+        self.elapsed = None
+        return self
+
+
+    def __exit__( self, *exc ):
+        self.elapsed = perf_counter() - self.start
+        return False
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Asset Channel
+"""
+Write-behind channel for the Assets created by scripts during a run.
+
+Each `_asset.json` written by a script is a small synchronous write,
+which dominates runs creating many Assets.
+With a channel the runner listens on a local socket,
+whose path is passed to scripts in the `THOT_ASSET_CHANNEL` environment variable.
+Scripts add Assets with #add_asset, which creates the Asset's folder,
+so its file can be written immediately, and sends its properties to the runner.
+The runner buffers the properties and writes the object files in batches,
+in a worker thread, with atomic renames.
+
+Buffered Assets of a Container are written once each priority group of its scripts completes,
+so later scripts, and those of its parents, find them on disk as usual.
+Writes are therefore mostly batched per Container, not across Containers,
+and the gain is in taking them off the scripts rather than in combining them.
+Assets added during the run can also be found from the runner's index with #find_assets,
+without reading the tree.
+
+Without a channel, #add_asset writes the object file directly,
+so scripts work whether or not they are run with one.
+
+Only Assets added with this module's #add_asset go through the channel.
+Scripts calling `thot.ThotProject.add_asset` still write their object files directly,
+so must import #add_asset from here to benefit from the channel.
+
+e.g.
+    from thot_cli.commands.run.assets import add_asset
+    stats.to_csv( add_asset( { 'type': 'stats', 'file': 'stats.csv' }, 'stats' ) )
+"""
+
+import os
+import json
+import atexit
+import inspect
+import socket
+import asyncio
+import tempfile
+import threading
+from uuid import uuid4 as uuid
+
+from ..common import write_atomic
+from ..utils.walk import ASSET_FILE
+from .conditions import matches
+
+
+CHANNEL_ENV = 'THOT_ASSET_CHANNEL'
+
+# number of buffered Assets written at once
+FLUSH_BATCH = 1000
+
+
+class AssetChannel():
+    """
+    Runner side of the channel.
+    Buffers Asset properties sent by scripts, and writes them in batches.
+    """
+
+    def __init__( self, batch = FLUSH_BATCH ):
+        """
+        :param batch: Number of buffered Assets that triggers a write. [Default: FLUSH_BATCH]
+        """
+        self.batch = batch
+        self.folder = tempfile.mkdtemp( prefix = 'thot-assets-' )
+        self.path = os.path.join( self.folder, 'channel.sock' )
+        self.index = {}  # properties of Assets added during the run keyed by path
+        self.pending = {}  # paths of unwritten Assets keyed by Container
+        self.written = 0
+        self._lock = threading.Lock()
+        self._server = None  # future of the server
+
+
+    @staticmethod
+    def supported():
+        """
+        :returns: If the platform supports the channel.
+        """
+        return hasattr( socket, 'AF_UNIX' )
+
+
+    async def start( self ):
+        """
+        Starts listening for scripts, if not already.
+        Must be called from the running loop before scripts are started.
+        """
+        if self._server is None:
+            self._server = asyncio.ensure_future(
+                asyncio.start_unix_server( self._handle, path = self.path )
+            )
+
+        await self._server
+
+
+    def close( self ):
+        """
+        Writes all buffered Assets, and removes the socket.
+        """
+        if ( self._server is not None ) and self._server.done() and not self._server.exception():
+            self._server.result().close()
+
+        self.flush()
+        try:
+            os.remove( self.path )
+
+        except FileNotFoundError:
+            pass
+
+        os.rmdir( self.folder )
+
+
+    async def _handle( self, reader, writer ):
+        """
+        Handles requests from a script, one JSON object per line.
+        Requests are
+            + { 'op': 'add', 'container': <path>, 'path': <path>, 'properties': <properties> }
+            + { 'op': 'find', 'search': <properties> }, replied to with a list of
+                { '_id': <path>, **properties } of matching Assets added during the run.
+            + { 'op': 'sync' }, replied to once all previous requests are handled.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                request = json.loads( line )
+                if request[ 'op' ] == 'add':
+                    self.add( request[ 'container' ], request[ 'path' ], request[ 'properties' ] )
+                    if len( self.index ) - self.written >= self.batch:
+                        asyncio.get_running_loop().run_in_executor( None, self.flush )
+
+                elif request[ 'op' ] == 'find':
+                    writer.write( ( json.dumps( self.find( request[ 'search' ] ) ) + '\n' ).encode() )
+                    await writer.drain()
+
+                elif request[ 'op' ] == 'sync':
+                    writer.write( b'\n' )
+                    await writer.drain()
+
+        finally:
+            writer.close()
+
+
+    def add( self, container, path, properties ):
+        """
+        Buffers an Asset.
+
+        :param container: Path of the Asset's Container.
+        :param path: Path of the Asset.
+        :param properties: Properties of the Asset.
+        """
+        path = os.path.normpath( path )
+        with self._lock:
+            self.index[ path ] = properties
+            self.pending.setdefault( os.path.normpath( container ), set() ).add( path )
+
+
+    def find( self, search = None ):
+        """
+        :param search: Properties to match, or None for all. [Default: None]
+        :returns: List of { '_id': <path>, **properties } of matching Assets added during the run.
+        """
+        with self._lock:
+            return [
+                { '_id': path, **properties }
+                for path, properties in self.index.items()
+                if ( search is None ) or matches( properties, search )
+            ]
+
+
+    def flush( self, container = None ):
+        """
+        Writes buffered Assets.
+
+        :param container: Path of the Container to write the Assets of,
+            or None for all. [Default: None]
+        """
+        with self._lock:
+            if container is None:
+                paths = [ path for paths in self.pending.values() for path in paths ]
+                self.pending = {}
+
+            else:
+                paths = list( self.pending.pop( os.path.normpath( container ), () ) )
+
+            batch = [ ( path, self.index[ path ] ) for path in paths ]
+
+        for ( path, properties ) in batch:
+            write_atomic( os.path.join( path, ASSET_FILE ), json.dumps( properties, indent = 4 ) )
+
+        with self._lock:
+            self.written += len( batch )
+
+
+# --- client ---
+
+_connection = None
+
+
+def _connect():
+    """
+    Connects to the runner's channel on first use.
+    The connection is synced when the script exits,
+    so the runner has every Asset once the script completes.
+
+    :returns: Socket connected to the runner's channel, or None if there is none.
+    """
+    global _connection
+    if _connection is None:
+        path = os.environ.get( CHANNEL_ENV )
+        if not path:
+            return None
+
+        _connection = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        _connection.connect( path )
+        atexit.register( _request, { 'op': 'sync' } )
+
+    return _connection
+
+
+def _request( request ):
+    """
+    Sends a request to the runner and waits for its reply.
+
+    :param request: Request.
+    :returns: Parsed reply, or None if empty.
+    :raises RuntimeError: If the channel is closed.
+    """
+    _connection.sendall( ( json.dumps( request ) + '\n' ).encode() )
+
+    reply = b''
+    while not reply.endswith( b'\n' ):
+        data = _connection.recv( 65536 )
+        if not data:
+            raise RuntimeError( 'Asset channel closed.' )
+
+        reply += data
+
+    return json.loads( reply ) if reply.strip() else None
+
+
+def add_asset( asset, _id = None, overwrite = True ):
+    """
+    Creates a new Asset in the script's Container.
+    Mirrors LocalProject#add_asset, with the same defaults and creator properties.
+
+    :param asset: Dictionary of information about the Asset.
+    :param _id: Id of new asset, or None to create one.
+        [Default: None]
+    :param overwrite: Allow Asset to be overwritten if it already exists.
+        [Default: True]
+    :returns: Path to Asset file.
+    :raises RuntimeError: If not run by the runner,
+        or if the Asset exists and overwrite is False.
+    """
+    container = os.environ.get( 'THOT_CONTAINER_ID' )
+    if container is None:
+        raise RuntimeError( 'Assets can only be added by scripts run by the runner.' )
+
+    # check file is defined
+    if 'file' not in asset:
+        _id = str( uuid() )
+        asset[ 'file' ] = _id
+
+    if _id is None:
+        _id = str( uuid() )
+
+    # set properties
+    asset[ 'creator_type' ] = 'script'
+    asset[ 'creator' ] = (
+        os.environ[ 'THOT_SCRIPT_ID' ]
+        if 'THOT_SCRIPT_ID' in os.environ else
+        inspect.getframeinfo( inspect.currentframe().f_back ).filename
+    )
+
+    path = os.path.normpath( os.path.join( container, _id ) )
+    if not overwrite and os.path.exists( os.path.join( path, ASSET_FILE ) ):
+        raise RuntimeError( 'Object {} already exists.'.format( path ) )
+
+    os.makedirs( path, exist_ok = True )
+
+    connection = _connect()
+    if connection is None:
+        write_atomic( os.path.join( path, ASSET_FILE ), json.dumps( asset, indent = 4 ) )
+
+    else:
+        request = { 'op': 'add', 'container': container, 'path': path, 'properties': asset }
+        connection.sendall( ( json.dumps( request ) + '\n' ).encode() )
+
+    return os.path.normpath( os.path.join( path, asset[ 'file' ] ) )
+
+
+def find_assets( search = None ):
+    """
+    Finds Assets added by scripts during the run, from the runner's index.
+
+    :param search: Properties to match, or None for all. [Default: None]
+    :returns: List of { '_id': <path>, **properties } of matching Assets.
+        Empty if not run with a channel.
+    """
+    if _connect() is None:
+        return []
+
+    return _request( { 'op': 'find', 'search': search } )
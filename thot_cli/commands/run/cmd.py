@@ -3,7 +3,15 @@ import sys
 import json
 
 from ..command import Command
+from ..common import parse_bytes
 from . import runner
+from . import logs
+from . import history
+from .sample import parse_size
+from .resources import parse_pools
+from .cpu import POLICIES
+from .prefetch import PREFETCH_AHEAD
+from .queue import HEARTBEAT_TIMEOUT
 
 
 py_version = sys.version_info.major + 0.1* sys.version_info.minor
@@ -20,6 +28,25 @@ class Run( Command ):
 
         scripts = json.loads( args.scripts ) if args.scripts else None
 
+        if ( py_version >= 3.7 ) and ( args.logs is not False ):
+            # show logs of the last run, rather than running
+            logs.print_logs( args.root, container = args.logs, scripts = scripts )
+            return
+
+        if ( py_version >= 3.7 ) and ( args.report is not False ):
+            # report timings of a run, rather than running
+            regressions = history.report(
+                args.root,
+                name = args.report,
+                baseline = args.baseline,
+                threshold = args.regression_threshold
+            )
+
+            if regressions:
+                sys.exit( 1 )
+
+            return
+
         if py_version >= 3.7:
             # tasks
             if args.tasks is False:
@@ -33,12 +60,55 @@ class Run( Command ):
                     # default value
                     tasks = 16
 
+            # cpus
+            cpus = (
+                None
+                if args.cpus is False else
+                self.parse_optional_int_arg( args.cpus )
+            )
+
+            if cpus is True:
+                # default value
+                cpus = os.cpu_count() or 1
+
+            # prefetch
+            prefetch = (
+                None
+                if args.prefetch is False else
+                self.parse_optional_int_arg( args.prefetch )
+            )
+
+            if prefetch is True:
+                # default value
+                prefetch = PREFETCH_AHEAD
+
             runner.run(
                 os.path.abspath( args.root ),
-                scripts       = scripts,
-                tasks         = tasks,
-                ignore_errors = args.ignore_errors,
-                verbose       = args.verbose
+                lineage           = args.lineage,
+                downstream_of     = args.downstream_of,
+                stream            = args.stream,
+                pools             = parse_pools( args.pool ),
+                cpus              = cpus,
+                cpu_policy        = args.cpu_policy,
+                profile           = args.profile or bool( args.profile_scripts ),
+                profile_scripts   = json.loads( args.profile_scripts ) if args.profile_scripts else None,
+                prefetch          = prefetch,
+                prefetch_budget   = parse_bytes( args.prefetch_budget ),
+                manifest          = args.asset_manifest,
+                asset_channel     = args.asset_channel,
+                capture_logs      = args.capture_logs,
+                sample            = None if args.sample is None else parse_size( args.sample ),
+                sample_by         = args.sample_by,
+                seed              = args.seed,
+                coordinator       = args.coordinator,
+                worker            = args.worker,
+                heartbeat_timeout = args.heartbeat_timeout,
+                metrics_file      = args.metrics_file,
+                metrics_interval  = args.metrics_interval,
+                scripts           = scripts,
+                tasks             = tasks,
+                ignore_errors     = args.ignore_errors,
+                verbose           = args.verbose
             )
 
         else:
@@ -134,6 +204,175 @@ class Run( Command ):
                 help = 'Limit the number of concurrent tasks. If flag is not provided no limit is used. If flag is provided but no value is given, default values is 16.'
             )
 
+            parser.add_argument(
+                '--pool',
+                action = 'append',
+                default = [],
+                metavar = 'NAME=LIMIT',
+                help = 'Limit the number of concurrent tasks of Scripts in a pool, as declared by the `pool` property of their association. May be repeated.'
+            )
+
+            parser.add_argument(
+                '--cpus',
+                nargs = '?',
+                default = False,
+                action = 'store',
+                help = 'Pack tasks onto this many cores, using the `cpus` property of their association (default 1). If flag is provided but no value is given, the number of cores of the machine is used.'
+            )
+
+            parser.add_argument(
+                '--cpu-policy',
+                choices = POLICIES,
+                help = 'How cores are shared between concurrent tasks. `threads` limits the thread pools of numerical libraries (OpenMP, BLAS, MKL) to each task\'s share of cores, when the share is known from `--tasks` or `--cpus`. `pin` also pins each task to its own cores. `none` runs tasks as is. Exclude to run tasks as is.'
+            )
+
+            parser.add_argument(
+                '--downstream-of',
+                type = str,
+                help = 'Path of a file or Asset, relative to `--root`. Only run the scripts that depend on it, as recorded in the lineage graph by runs with `--lineage`.'
+            )
+
+            parser.add_argument(
+                '--stream',
+                action = 'store_true',
+                help = 'Load Containers as they are reached, rather than loading the whole tree first. Bounds memory use for large projects.'
+            )
+
+            parser.add_argument(
+                '--profile',
+                action = 'store_true',
+                help = 'Profile each script with cProfile. Profiles of each task, and of each script merged across Containers as pstats and collapsed stacks for flamegraphs, are written to `.thot/profiles`.'
+            )
+
+            parser.add_argument(
+                '--profile-scripts',
+                type = str,
+                help = 'List of scripts to profile, implying `--profile`. Other scripts run as usual. Exclude to profile all.'
+            )
+
+            parser.add_argument(
+                '--prefetch',
+                nargs = '?',
+                default = False,
+                action = 'store',
+                help = 'Prefetch the Asset files of this many upcoming Containers into the page cache while scripts run. Containers are loaded as they are reached, as with `--stream`, so they start in the order prefetched. If flag is provided but no value is given, default value is {}.'.format( PREFETCH_AHEAD )
+            )
+
+            parser.add_argument(
+                '--prefetch-budget',
+                type = str,
+                default = '1G',
+                help = 'Maximum size of Asset files prefetched for Containers not yet started, e.g. 512M. [Default: 1G]'
+            )
+
+            parser.add_argument(
+                '--asset-manifest',
+                action = 'store_true',
+                help = 'Pass each script the path of a manifest of its Container\'s descendant Assets in the THOT_ASSET_MANIFEST environment variable. Manifests are built bottom up as Containers complete. Not used with `--downstream-of`.'
+            )
+
+            parser.add_argument(
+                '--asset-channel',
+                action = 'store_true',
+                help = 'Buffer the Assets that scripts add with `thot_cli.commands.run.assets.add_asset` in the runner, writing their metadata in batches rather than one file per call. Pass the channel path to scripts in the THOT_ASSET_CHANNEL environment variable. Scripts must import `add_asset` from `thot_cli.commands.run.assets`; Assets added with `thot.ThotProject.add_asset` are written directly as usual.'
+            )
+
+            parser.add_argument(
+                '--logs',
+                nargs = '?',
+                default = False,
+                action = 'store',
+                metavar = 'CONTAINER',
+                help = 'Show the captured output of the last run\'s tasks on a Container, rather than running. Only runs with `--capture-logs` are recorded. Use with `--scripts` to limit the scripts shown. If flag is provided but no Container is given, lists the tasks of the last run.'
+            )
+
+            parser.add_argument(
+                '--capture-logs',
+                action = 'store_true',
+                help = 'Capture the output of each task to `.thot/logs`, printing a status line and the output of failed tasks.'
+            )
+
+            parser.add_argument(
+                '--report',
+                nargs = '?',
+                default = False,
+                action = 'store',
+                metavar = 'RUN',
+                help = 'Report the task durations of a run by script, its slowest Containers, and its regressions against `--baseline`, rather than running. Exits with an error if any script regressed. If flag is provided but no run is given, reports the last run.'
+            )
+
+            parser.add_argument(
+                '--baseline',
+                type = str,
+                metavar = 'RUN',
+                help = 'Run to compare the reported run to. [Default: the previous run not sampled]'
+            )
+
+            parser.add_argument(
+                '--regression-threshold',
+                type = float,
+                default = history.REGRESSION_THRESHOLD,
+                help = 'Ratio of the median task duration of a script to its baseline beyond which the script has regressed. [Default: {}]'.format( history.REGRESSION_THRESHOLD )
+            )
+
+            parser.add_argument(
+                '--sample',
+                type = str,
+                metavar = 'N|FRACTION',
+                help = 'Run on a random sample of this many leaf Containers, or this fraction of them if less than 1, and their ancestors. Leaves are stratified by `--sample-by`. The time of a full run is projected from the sampled tasks.'
+            )
+
+            parser.add_argument(
+                '--sample-by',
+                type = str,
+                default = 'type',
+                help = 'Container property to stratify the sample by. Nested properties are separated by dots. [Default: type]'
+            )
+
+            parser.add_argument(
+                '--seed',
+                type = int,
+                help = 'Random seed of the sample.'
+            )
+
+            parser.add_argument(
+                '--coordinator',
+                action = 'store_true',
+                help = 'Write the tasks of the run to a queue in `.thot/queue` for workers to run, rather than running them. Tasks run in the same order as a normal run.'
+            )
+
+            parser.add_argument(
+                '--worker',
+                action = 'store_true',
+                help = 'Run tasks from the project\'s queue, as written by a coordinator, until none remain. Any number of workers may run on hosts mounting the project. Uses `--tasks` concurrent tasks, or the number of cores if not provided.'
+            )
+
+            parser.add_argument(
+                '--heartbeat-timeout',
+                type = float,
+                default = HEARTBEAT_TIMEOUT,
+                help = 'Seconds without a heartbeat before a task claimed by a worker is reclaimed. [Default: {}]'.format( HEARTBEAT_TIMEOUT )
+            )
+
+            parser.add_argument(
+                '--metrics-file',
+                type = str,
+                help = 'Write counters and histograms of the run to this file in the Prometheus text format, for the node exporter\'s textfile collector. The file is rewritten atomically at an interval during the run and once it completes.'
+            )
+
+            parser.add_argument(
+                '--metrics-interval',
+                type = float,
+                default = runner.METRICS_INTERVAL,
+                help = 'Seconds between writes of the metrics file. [Default: {}]'.format( runner.METRICS_INTERVAL )
+            )
+
+            parser.add_argument(
+                '--lineage',
+                action = 'store_true',
+                help = 'Record the files read and written by scripts, for use by --downstream-of.'
+            )
+
         return super().init_parser( parser )
         # parser.set_defaults( _fn = self.run )
         # return parser
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Script Conditions
+"""
+Conditions on Script associations, checked before a Script is run.
+
+An association in `_scripts.json` may have a `when` property.
+The Script is only run on the Container if the condition holds.
+A condition is a dictionary whose entries must all hold, or a list of conditions which must all hold.
+Entries are
+    + container: Properties the Container must match.
+    + asset: Properties at least one child Asset must match.
+    + descendant: Properties at least one descendant Asset must match.
+    + exists: Path, or list of paths, of files or folders which must exist.
+        Relative to the Container, or the project root if prefixed by `root:`.
+    + all: List of conditions which must all hold.
+    + any: List of conditions of which at least one must hold.
+    + not: Condition which must not hold.
+
+Properties are matched by equality, or membership if the property is a list, such as tags.
+Nested properties are matched with dotted keys, such as `metadata.angle`.
+
+e.g. `{ "script": "root:scripts/fit.py", "when": { "asset": { "type": "times" } } }`.
+"""
+
+import os
+import json
+
+from ..utils.walk import (
+    CONTAINER_FILE,
+    ASSET_FILE,
+    child_assets,
+    folder_kind,
+    read_tree,
+    resolve_path
+)
+
+
+MISSING = object()
+
+
+def get_property( properties, key ):
+    """
+    :param properties: Dictionary of properties.
+    :param key: Property key, with nested keys separated by dots.
+    :returns: Property value, or MISSING.
+    """
+    value = properties
+    for part in key.split( '.' ):
+        if not isinstance( value, dict ) or ( part not in value ):
+            return MISSING
+
+        value = value[ part ]
+
+    return value
+
+
+def matches( properties, match ):
+    """
+    :param properties: Dictionary of properties.
+    :param match: Dictionary of properties to match.
+    :returns: If all properties match.
+    """
+    for key, expected in match.items():
+        value = get_property( properties, key )
+        if value is MISSING:
+            return False
+
+        if isinstance( value, list ) and not isinstance( expected, list ):
+            if expected not in value:
+                return False
+
+        elif value != expected:
+            return False
+
+    return True
+
+
+class Context():
+    """
+    Container information used to evaluate conditions.
+    Information is loaded when first needed, and shared between conditions.
+    """
+
+    def __init__( self, container, root ):
+        """
+        :param container: Path to the Container.
+        :param root: Project root.
+        """
+        self.container = container
+        self.root = root
+        self._properties = None
+        self._assets = None
+
+
+    @property
+    def properties( self ):
+        """
+        :returns: Properties of the Container.
+        """
+        if self._properties is None:
+            try:
+                with open( os.path.join( self.container, CONTAINER_FILE ) ) as f:
+                    self._properties = json.load( f )
+
+            except ( FileNotFoundError, ValueError ):
+                self._properties = {}
+
+        return self._properties
+
+
+    @property
+    def assets( self ):
+        """
+        :returns: List of properties of the child Assets.
+        """
+        if self._assets is None:
+            self._assets = [ properties for ( _, properties ) in child_assets( self.container, self.root ) ]
+
+        return self._assets
+
+
+    def descendants( self ):
+        """
+        Reads the descendant Assets lazily, so a match stops the search.
+
+        :returns: Generator of properties of the descendant Assets.
+        """
+        # scripts change the tree during runs, so the pack may be stale
+        for ( _, files, _ ) in read_tree( self.container, packed = False ):
+            if folder_kind( files ) != 'asset':
+                continue
+
+            try:
+                yield json.loads( files[ ASSET_FILE ] )
+
+            except ValueError:
+                continue
+
+
+def evaluate( condition, context ):
+    """
+    Evaluates a condition.
+
+    :param condition: Condition.
+    :param context: Context of the Container.
+    :returns: If the condition holds.
+    :raises ValueError: If the condition is invalid.
+    """
+    if isinstance( condition, list ):
+        return all( evaluate( cond, context ) for cond in condition )
+
+    if not isinstance( condition, dict ):
+        raise ValueError( 'Invalid condition {}, must be an object or list.'.format( condition ) )
+
+    for key, value in condition.items():
+        if key in ( 'container', 'asset', 'descendant' ) and not isinstance( value, dict ):
+            raise ValueError( 'Invalid condition {}, must be an object of properties.'.format( key ) )
+
+        if key == 'container':
+            holds = matches( context.properties, value )
+
+        elif key == 'asset':
+            holds = any( matches( asset, value ) for asset in context.assets )
+
+        elif key == 'descendant':
+            holds = any( matches( asset, value ) for asset in context.descendants() )
+
+        elif key == 'exists':
+            paths = value if isinstance( value, list ) else [ value ]
+            holds = all(
+                os.path.exists( resolve_path( path, context.container, context.root ) )
+                for path in paths
+            )
+
+        elif key == 'all':
+            holds = all( evaluate( cond, context ) for cond in value )
+
+        elif key == 'any':
+            holds = any( evaluate( cond, context ) for cond in value )
+
+        elif key == 'not':
+            holds = not evaluate( value, context )
+
+        else:
+            raise ValueError( 'Invalid condition {}.'.format( key ) )
+
+        if not holds:
+            return False
+
+    return True
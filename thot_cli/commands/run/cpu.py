@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# CPU Policy
+"""
+Sharing of the machine's cores between concurrent Scripts.
+
+Numerical libraries start a thread per core by default,
+so concurrent Scripts oversubscribe the machine.
+Each Script is given a share of the cores, and depending on the policy
+    + none: Scripts are run as is.
+    + threads: Thread pools of numerical libraries are limited to the share.
+    + pin: As threads, and each Script is also pinned to
+        a set of cores not used by other running Scripts.
+"""
+
+import os
+
+
+POLICIES = ( 'none', 'threads', 'pin' )
+
+# environment variables limiting the thread pools of numerical libraries
+THREAD_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS'
+)
+
+
+def available_cpus():
+    """
+    :returns: Sorted list of the cores this process may run on.
+    """
+    if hasattr( os, 'sched_getaffinity' ):
+        return sorted( os.sched_getaffinity( 0 ) )
+
+    return list( range( os.cpu_count() or 1 ) )
+
+
+class CpuPolicy():
+    """
+    Assigns cores to Scripts as they start.
+    """
+
+    def __init__( self, policy = 'threads', tasks = None, cpus = None ):
+        """
+        :param policy: One of POLICIES. [Default: 'threads']
+        :param tasks: Maximum number of concurrent tasks,
+            or None for no limit. [Default: None]
+        :param cpus: Number of cores Scripts are packed onto by their declared cores,
+            or None if not packing. [Default: None]
+        :raises ValueError: If the policy is invalid.
+        """
+        if policy not in POLICIES:
+            raise ValueError( 'Invalid CPU policy {}, must be one of {}.'.format( policy, ', '.join( POLICIES ) ) )
+
+        self.policy = policy
+        self.tasks = tasks
+        self.cpus = cpus
+
+        self._free = available_cpus()
+        self._total = len( self._free )
+        if not hasattr( os, 'sched_setaffinity' ):
+            # pinning not supported
+            self.policy = 'threads' if policy == 'pin' else policy
+
+
+    def share( self, cpus = 1 ):
+        """
+        :param cpus: Cores declared by the Script. [Default: 1]
+        :returns: Number of cores a Script may use,
+            or None if the share is not known as concurrency is not limited.
+        """
+        if self.cpus is not None:
+            return min( cpus, self.cpus )
+
+        if self.tasks is not None:
+            return max( 1, self._total // self.tasks )
+
+        return None
+
+
+    def acquire( self, cpus = 1 ):
+        """
+        Assigns cores to a starting Script.
+        Must be paired with #release.
+
+        :param cpus: Cores declared by the Script. [Default: 1]
+        :returns: Tuple of ( <environment>, <cores> ) where
+            environment holds the variables to set for the Script, and
+            cores is the list of cores to pin it to, or None to not pin.
+            Variables already set by the user are not overridden.
+        """
+        share = None if self.policy == 'none' else self.share( cpus )
+        if share is None:
+            return ( {}, None )
+
+        env = {
+            var: str( share )
+            for var in THREAD_VARS
+            if var not in os.environ
+        }
+
+        pinned = None
+        if ( self.policy == 'pin' ) and self._free:
+            # cores run out if more tasks than cores are allowed,
+            # in which case the Script gets fewer or none
+            pinned = self._free[ :share ]
+            self._free = self._free[ share: ]
+
+        return ( env, pinned )
+
+
+    def release( self, pinned ):
+        """
+        Returns the cores of a finished Script.
+
+        :param pinned: Cores returned by #acquire.
+        """
+        if pinned:
+            self._free = sorted( self._free + pinned )
+
+
+    @staticmethod
+    def pin( pinned ):
+        """
+        :param pinned: Cores returned by #acquire.
+        :returns: Function pinning the calling process to the cores,
+            for use as a subprocess preexec_fn, or None.
+        """
+        if not pinned:
+            return None
+
+        def _pin():
+            os.sched_setaffinity( 0, pinned )
+
+        return _pin
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Run History
+"""
+Timing history of runs, and reports comparing runs.
+
+Once a run completes the duration and status of each of its tasks
+are written to `.thot/history/<run>.json`, with paths relative to the project root.
+Runs share their names with their logs, if captured,
+and only the most recent runs are kept.
+
+Reports summarize a run's task durations by Script,
+list its slowest Containers, and compare it to a baseline run,
+by default the previous full run.
+A Script regresses if the median duration of its tasks on the Containers
+both runs ran on grows by more than a threshold.
+"""
+
+import os
+import json
+from datetime import datetime
+
+from ..common import state_path, write_atomic, STATE_DIR
+from ..utils.walk import project_root
+from .lineage import task_key
+
+
+HISTORY_DIR = 'history'
+
+# number of runs whose history is kept
+KEEP_RUNS = 50
+
+# ratio of durations beyond which a Script has regressed
+REGRESSION_THRESHOLD = 1.5
+
+# seconds a duration must grow by to be a regression, so noise in short tasks is ignored
+MIN_REGRESSION = 0.1
+
+# number of Containers and tasks listed in reports
+REPORT_LIMIT = 10
+
+
+def run_id():
+    """
+    :returns: Name for a new run, sortable by time.
+    """
+    return datetime.now().strftime( '%Y%m%d-%H%M%S-%f' )
+
+
+def list_runs( root ):
+    """
+    :param root: Path to a Container of the project.
+    :returns: Sorted list of names of the runs with history, oldest first.
+    """
+    folder = os.path.join( project_root( root ), STATE_DIR, HISTORY_DIR )
+    try:
+        return sorted(
+            os.path.splitext( name )[ 0 ] for name in os.listdir( folder )
+            if name.endswith( '.json' )
+        )
+
+    except FileNotFoundError:
+        return []
+
+
+def record( root, name, durations, failed, elapsed, sampled = False, keep = KEEP_RUNS ):
+    """
+    Writes the history of a run, removing that of old runs.
+
+    :param root: Path to a Container of the project.
+    :param name: Name of the run.
+    :param durations: Dictionary of task durations in seconds keyed by ( <container>, <script> ).
+    :param failed: Collection of ( <container>, <script> ) of failed tasks.
+    :param elapsed: Wall time of the run in seconds.
+    :param sampled: If the run was on a sample of the tree. [Default: False]
+    :param keep: Number of runs whose history is kept. [Default: KEEP_RUNS]
+    :returns: Path of the run's history.
+    """
+    root = project_root( root )
+    relpath = lambda path: os.path.relpath( os.path.abspath( path ), root )
+
+    run = {
+        'run':     name,
+        'elapsed': round( elapsed, 6 ),
+        'sampled': sampled,
+        # [ <container>, <script>, <duration>, <failed> ]
+        'tasks':   [
+            [ relpath( container ), relpath( script ), round( duration, 6 ), ( container, script ) in failed ]
+            for ( container, script ), duration in durations.items()
+        ]
+    }
+
+    path = state_path( root, HISTORY_DIR, name + '.json' )
+    write_atomic( path, json.dumps( run, separators = ( ',', ':' ) ) )
+
+    for old in list_runs( root )[ :-keep ]:
+        try:
+            os.remove( os.path.join( os.path.dirname( path ), old + '.json' ) )
+
+        except FileNotFoundError:
+            continue
+
+    return path
+
+
+def load( root, name ):
+    """
+    :param root: Path to a Container of the project.
+    :param name: Name of the run.
+    :returns: History of the run.
+    :raises RuntimeError: If the run has no history.
+    """
+    path = os.path.join( project_root( root ), STATE_DIR, HISTORY_DIR, name + '.json' )
+    try:
+        with open( path ) as f:
+            return json.load( f )
+
+    except FileNotFoundError:
+        raise RuntimeError( 'No history recorded for run {}.'.format( name ) )
+
+
+def percentile( values, q ):
+    """
+    :param values: Sorted list of values.
+    :param q: Percentile, between 0 and 100.
+    :returns: Nearest rank percentile of the values.
+    """
+    index = max( 0, min( len( values ) - 1, int( -( -q* len( values ) // 100 ) ) - 1 ) )
+    return values[ index ]
+
+
+def script_stats( run ):
+    """
+    :param run: History of a run.
+    :returns: Dictionary of { 'tasks', 'failed', 'total', 'p50', 'p95', 'max' } keyed by Script.
+    """
+    by_script = {}
+    for ( _, script, duration, failed ) in run[ 'tasks' ]:
+        by_script.setdefault( script, [] ).append( ( duration, failed ) )
+
+    stats = {}
+    for script, tasks in by_script.items():
+        durations = sorted( duration for ( duration, _ ) in tasks )
+        stats[ script ] = {
+            'tasks':  len( durations ),
+            'failed': sum( 1 for ( _, failed ) in tasks if failed ),
+            'total':  sum( durations ),
+            'p50':    percentile( durations, 50 ),
+            'p95':    percentile( durations, 95 ),
+            'max':    durations[ -1 ]
+        }
+
+    return stats
+
+
+def slowest_containers( run, limit = REPORT_LIMIT ):
+    """
+    :param run: History of a run.
+    :param limit: Number of Containers. [Default: REPORT_LIMIT]
+    :returns: List of ( <container>, <seconds> ) of the Containers
+        whose tasks took the longest in total, slowest first.
+    """
+    totals = {}
+    for ( container, _, duration, _ ) in run[ 'tasks' ]:
+        totals[ container ] = totals.get( container, 0 ) + duration
+
+    return sorted( totals.items(), key = lambda item: item[ 1 ], reverse = True )[ :limit ]
+
+
+def compare( run, baseline, threshold = REGRESSION_THRESHOLD, limit = REPORT_LIMIT ):
+    """
+    Compares the task durations of a run to a baseline run.
+    Only tasks that completed in both runs are compared.
+
+    :param run: History of the run.
+    :param baseline: History of the baseline run.
+    :param threshold: Ratio of median durations beyond which a Script has regressed.
+        [Default: REGRESSION_THRESHOLD]
+    :param limit: Number of tasks listed. [Default: REPORT_LIMIT]
+    :returns: Dictionary with keys
+        + scripts: Dictionary of { 'tasks', 'baseline', 'current', 'ratio', 'regressed' }
+            of the median durations of each Script's common tasks, keyed by Script.
+        + tasks: List of { 'task', 'baseline', 'current', 'ratio' } of the tasks
+            that slowed the most, by ratio.
+        + regressions: Sorted list of Scripts that regressed.
+    """
+    previous = {
+        ( container, script ): duration
+        for ( container, script, duration, failed ) in baseline[ 'tasks' ]
+        if not failed
+    }
+
+    pairs = {}
+    tasks = []
+    for ( container, script, duration, failed ) in run[ 'tasks' ]:
+        before = previous.get( ( container, script ) )
+        if failed or ( before is None ):
+            continue
+
+        pairs.setdefault( script, ( [], [] ) )
+        pairs[ script ][ 0 ].append( before )
+        pairs[ script ][ 1 ].append( duration )
+        if ( duration - before ) >= MIN_REGRESSION:
+            tasks.append( {
+                'task':     task_key( container, script ),
+                'baseline': before,
+                'current':  duration,
+                'ratio':    ( duration / before ) if before else float( 'inf' )
+            } )
+
+    scripts = {}
+    for script, ( before, after ) in pairs.items():
+        base = percentile( sorted( before ), 50 )
+        current = percentile( sorted( after ), 50 )
+        ratio = ( current / base ) if base else float( 'inf' )
+        scripts[ script ] = {
+            'tasks':     len( before ),
+            'baseline':  base,
+            'current':   current,
+            'ratio':     ratio,
+            'regressed': ( ratio > threshold ) and ( ( current - base ) >= MIN_REGRESSION )
+        }
+
+    tasks.sort( key = lambda task: task[ 'ratio' ], reverse = True )
+    return {
+        'scripts':     scripts,
+        'tasks':       tasks[ :limit ],
+        'regressions': sorted( script for script, stats in scripts.items() if stats[ 'regressed' ] )
+    }
+
+
+def default_baseline( root, name ):
+    """
+    :param root: Path to a Container of the project.
+    :param name: Name of the run.
+    :returns: Name of the latest full run before the run, or None if there is none.
+    """
+    for previous in reversed( list_runs( root ) ):
+        if ( previous < name ) and not load( root, previous ).get( 'sampled' ):
+            return previous
+
+    return None
+
+
+def report( root, name = None, baseline = None, threshold = REGRESSION_THRESHOLD ):
+    """
+    Prints a report of a run's task durations, compared to a baseline run.
+
+    :param root: Path to a Container of the project.
+    :param name: Name of the run, or None for the latest. [Default: None]
+    :param baseline: Name of the baseline run,
+        or None for the latest full run before it. [Default: None]
+    :param threshold: Ratio of median durations beyond which a Script has regressed.
+        [Default: REGRESSION_THRESHOLD]
+    :returns: Sorted list of Scripts that regressed.
+    :raises RuntimeError: If no history is recorded.
+    """
+    runs = list_runs( root )
+    if not runs:
+        raise RuntimeError( 'No run history recorded.' )
+
+    name = name or runs[ -1 ]
+    run = load( root, name )
+    print( 'Run {}{}: {} tasks in {:.3f} s.'.format(
+        name, ' (sampled)' if run.get( 'sampled' ) else '', len( run[ 'tasks' ] ), run[ 'elapsed' ]
+    ) )
+
+    print( '\n{:>6} {:>6} {:>10} {:>10} {:>10} {:>10}  {}'.format(
+        'TASKS', 'FAILED', 'TOTAL', 'P50', 'P95', 'MAX', 'SCRIPT'
+    ) )
+
+    stats = script_stats( run )
+    for script in sorted( stats, key = lambda script: stats[ script ][ 'total' ], reverse = True ):
+        item = stats[ script ]
+        print( '{:>6} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}  {}'.format(
+            item[ 'tasks' ], item[ 'failed' ], item[ 'total' ], item[ 'p50' ], item[ 'p95' ], item[ 'max' ], script
+        ) )
+
+    print( '\nSlowest containers' )
+    for ( container, seconds ) in slowest_containers( run ):
+        print( '{:>10.3f}  {}'.format( seconds, container ) )
+
+    if baseline is None:
+        baseline = default_baseline( root, name )
+        if baseline is None:
+            print( '\nNo earlier full run to compare to.' )
+            return []
+
+    result = compare( run, load( root, baseline ), threshold = threshold )
+    print( '\nCompared to run {}'.format( baseline ) )
+    print( '{:>6} {:>10} {:>10} {:>8}  {}'.format( 'TASKS', 'BASE P50', 'P50', 'RATIO', 'SCRIPT' ) )
+    for script, item in sorted( result[ 'scripts' ].items(), key = lambda item: item[ 1 ][ 'ratio' ], reverse = True ):
+        print( '{:>6} {:>10.3f} {:>10.3f} {:>7.2f}x  {}{}'.format(
+            item[ 'tasks' ], item[ 'baseline' ], item[ 'current' ], item[ 'ratio' ], script,
+            ' [regressed]' if item[ 'regressed' ] else ''
+        ) )
+
+    if result[ 'tasks' ]:
+        print( '\nBiggest task regressions' )
+        for task in result[ 'tasks' ]:
+            print( '{:>10.3f} {:>10.3f} {:>7.2f}x  {}'.format(
+                task[ 'baseline' ], task[ 'current' ], task[ 'ratio' ], task[ 'task' ]
+            ) )
+
+    if result[ 'regressions' ]:
+        print( '\n{} scripts regressed by more than {}x.'.format( len( result[ 'regressions' ] ), threshold ) )
+
+    return result[ 'regressions' ]
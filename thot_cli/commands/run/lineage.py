@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Asset Lineage
+"""
+Lineage graph of a project.
+
+Each task, a Script run on a Container, is recorded with the
+files it read and wrote, as observed by #trace while it ran.
+A task depends on another if it reads a file the other writes.
+"""
+
+import os
+import json
+from datetime import datetime
+
+from ..common import state_path, write_atomic
+from ..utils.walk import (
+    CONTAINER_FILE,
+    ASSET_FILE,
+    SCRIPTS_FILE,
+    REMOVED_SUFFIX,
+    NOTES_FOLDER,
+    project_root,
+    resolve_path
+)
+
+
+LINEAGE_FILE = 'lineage.json'
+
+# path to the tracer, run in place of scripts
+TRACE_SCRIPT = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'trace.py' )
+
+
+def task_key( container, script ):
+    """
+    :param container: Path of the Container, relative to the project root.
+    :param script: Path of the Script, relative to the project root.
+    :returns: Key of the task.
+    """
+    return '{}::{}'.format( container, script )
+
+
+def _is_data( path ):
+    """
+    :param path: Path of an opened file, relative to the project root.
+    :returns: If the file is data, rather than project metadata.
+        Notes are metadata, as they are read when the thot library loads objects.
+    """
+    name = os.path.basename( path )
+    if (
+        ( name in ( CONTAINER_FILE, ASSET_FILE, SCRIPTS_FILE ) ) or
+        name.endswith( REMOVED_SUFFIX )
+    ):
+        return False
+
+    return not any(
+        part.startswith( '.' ) or ( part in ( '__pycache__', NOTES_FOLDER ) )
+        for part in path.split( os.sep )
+    )
+
+
+class Lineage():
+    """
+    Lineage graph of a project.
+    """
+
+    def __init__( self, root ):
+        """
+        Loads the lineage graph of a project.
+
+        :param root: Path to a Container of the project.
+        """
+        self.root = project_root( root )
+        self.path = state_path( self.root, LINEAGE_FILE )
+        self.tasks = self._load()
+        self._recorded = {}
+
+
+    def _load( self ):
+        """
+        :returns: Tasks of the saved lineage graph.
+        """
+        try:
+            with open( self.path ) as f:
+                return json.load( f )[ 'tasks' ]
+
+        except ( FileNotFoundError, ValueError, KeyError ):
+            return {}
+
+
+    def relpath( self, path ):
+        """
+        :param path: Path.
+        :returns: Path relative to the project root.
+        """
+        return os.path.relpath( os.path.abspath( path ), self.root )
+
+
+    def resolve( self, path, base ):
+        """
+        :param path: Path relative to base,
+            or to the project root if prefixed by `root:`.
+        :param base: Folder relative paths are relative to,
+            usually the root Container of the command.
+        :returns: Path relative to the project root.
+        """
+        return self.relpath( resolve_path( path, os.path.abspath( base ), self.root ) )
+
+
+    def record( self, container_id, script_id, opened ):
+        """
+        Records the files opened by a task.
+        Metadata files and the script are ignored.
+
+        :param container_id: Path of the Container.
+        :param script_id: Path of the Script.
+        :param opened: Dictionary with keys 'reads' and 'writes' of opened file paths,
+            as output by #trace.
+        """
+        container = self.relpath( container_id )
+        script = self.relpath( script_id )
+
+        def _files( paths ):
+            paths = { self.relpath( path ) for path in paths }
+            return sorted( path for path in paths if _is_data( path ) and ( path != script ) )
+
+
+        key = task_key( container, script )
+        task = {
+            'container': container,
+            'script':    script,
+            'reads':     _files( opened[ 'reads' ] ),
+            'writes':    _files( opened[ 'writes' ] ),
+            'recorded':  datetime.now().isoformat( timespec = 'seconds' )
+        }
+
+        self.tasks[ key ] = task
+        self._recorded[ key ] = task
+
+
+    def save( self ):
+        """
+        Saves the tasks recorded since loading.
+        The saved graph is reloaded first, so concurrent runs are merged.
+        """
+        if not self._recorded:
+            return
+
+        tasks = self._load()
+        tasks.update( self._recorded )
+        write_atomic( self.path, json.dumps( { 'tasks': tasks }, indent = 1 ) )
+
+        self.tasks = tasks
+        self._recorded = {}
+
+
+    def files( self, target ):
+        """
+        Gets the files in the graph matching a target.
+
+        :param target: Path of a file, or of a folder such as an Asset,
+            relative to the project root.
+        :returns: Set of matching file paths.
+        """
+        target = os.path.normpath( target )
+        folder = os.path.join( target, '' )
+
+        files = set()
+        for task in self.tasks.values():
+            for path in task[ 'reads' ] + task[ 'writes' ]:
+                if ( path == target ) or path.startswith( folder ):
+                    files.add( path )
+
+        return files
+
+
+    def index( self, kind ):
+        """
+        :param kind: 'reads' or 'writes'.
+        :returns: Dictionary keyed by file path with values of sets of task keys.
+        """
+        index = {}
+        for key, task in self.tasks.items():
+            for path in task[ kind ]:
+                index.setdefault( path, set() ).add( key )
+
+        return index
+
+
+    def downstream( self, files ):
+        """
+        Gets the tasks that depend on files, directly or indirectly.
+
+        :param files: Iterable of file paths.
+        :returns: Set of task keys.
+        """
+        readers = self.index( 'reads' )
+        found = set()
+        stack = list( files )
+        seen = set( stack )
+        while stack:
+            path = stack.pop()
+            for key in readers.get( path, () ):
+                if key in found:
+                    continue
+
+                found.add( key )
+                for written in self.tasks[ key ][ 'writes' ]:
+                    if written not in seen:
+                        seen.add( written )
+                        stack.append( written )
+
+        return found
+
+
+    def upstream( self, files ):
+        """
+        Gets the tasks files depend on, directly or indirectly.
+
+        :param files: Iterable of file paths.
+        :returns: Set of task keys.
+        """
+        writers = self.index( 'writes' )
+        found = set()
+        stack = list( files )
+        seen = set( stack )
+        while stack:
+            path = stack.pop()
+            for key in writers.get( path, () ):
+                if key in found:
+                    continue
+
+                found.add( key )
+                for read in self.tasks[ key ][ 'reads' ]:
+                    if read not in seen:
+                        seen.add( read )
+                        stack.append( read )
+
+        return found
+
+
+    def order( self, keys ):
+        """
+        Orders tasks topologically.
+
+        :param keys: Iterable of task keys.
+        :returns: List of levels, each a list of task keys.
+            Tasks in a level only depend on tasks in previous levels,
+            so may run concurrently.
+            Within a level deeper Containers are first, as in a tree run.
+        :raises RuntimeError: If the tasks have a circular dependency.
+        """
+        keys = set( keys )
+        writers = {}
+        for key in keys:
+            for path in self.tasks[ key ][ 'writes' ]:
+                writers.setdefault( path, set() ).add( key )
+
+        depends = {
+            key: {
+                writer
+                for path in self.tasks[ key ][ 'reads' ]
+                for writer in writers.get( path, () )
+                if writer != key
+            }
+            for key in keys
+        }
+
+        def _sort_key( key ):
+            container = self.tasks[ key ][ 'container' ]
+            depth = 0 if ( container == os.curdir ) else ( container.count( os.sep ) + 1 )
+            return ( -depth, key )
+
+
+        levels = []
+        done = set()
+        while len( done ) < len( keys ):
+            level = [ key for key in keys - done if depends[ key ] <= done ]
+            if not level:
+                raise RuntimeError( 'Circular dependency between tasks {}.'.format(
+                    ', '.join( sorted( keys - done ) )
+                ) )
+
+            level.sort( key = _sort_key )
+            levels.append( level )
+            done.update( level )
+
+        return levels
+
+
+def print_lineage( lineage, target, as_json = False ):
+    """
+    Prints the lineage of a file or Asset.
+
+    :param lineage: Lineage.
+    :param target: Path of a file or Asset, relative to the project root.
+    :raises ValueError: If the target is not in the lineage graph.
+    """
+    files = lineage.files( target )
+    if not files:
+        raise ValueError( 'No lineage recorded for {}.'.format( target ) )
+
+    writers = lineage.index( 'writes' )
+    readers = lineage.index( 'reads' )
+    upstream = lineage.order( lineage.upstream( files ) )
+    downstream = lineage.order( lineage.downstream( files ) )
+
+    if as_json:
+        print( json.dumps( {
+            'files':      sorted( files ),
+            'created_by': sorted( { key for path in files for key in writers.get( path, () ) } ),
+            'read_by':    sorted( { key for path in files for key in readers.get( path, () ) } ),
+            'upstream':   [ key for level in upstream for key in level ],
+            'downstream': [ key for level in downstream for key in level ]
+        }, indent = 4 ) )
+
+        return
+
+    def _print_tasks( title, levels ):
+        print( '{}:'.format( title ) )
+        for level in levels:
+            for key in level:
+                task = lineage.tasks[ key ]
+                print( '\t{} on {}'.format( task[ 'script' ], task[ 'container' ] ) )
+                for path in task[ 'writes' ]:
+                    print( '\t\t-> {}'.format( path ) )
+
+
+    print( 'Files:' )
+    for path in sorted( files ):
+        print( '\t{}'.format( path ) )
+
+    _print_tasks( 'Upstream', upstream )
+    _print_tasks( 'Downstream', downstream )
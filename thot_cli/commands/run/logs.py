@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Task Logs
+"""
+Output of the tasks of a run, captured to log files.
+
+The stdout and stderr of each task are read through pipes as they are written,
+and spilled to a temporary file, so output never accumulates in memory.
+Only the tail of each task's output is kept in memory, in a bounded buffer,
+to report errors.
+Once a task completes its output is appended to the run's `output.log` in one piece,
+and its offset and length are recorded in `index.jsonl`,
+so a task's output can be read without scanning the log.
+
+Logs of each run are written to `.thot/logs/<run>`,
+and only the most recent runs are kept.
+"""
+
+import os
+import sys
+import json
+import shutil
+import asyncio
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime
+
+from ..common import state_path, STATE_DIR
+from ..utils.walk import project_root, resolve_path
+from .lineage import task_key
+
+
+LOGS_DIR   = 'logs'
+LOG_FILE   = 'output.log'
+INDEX_FILE = 'index.jsonl'
+
+# bytes of each task's output kept in memory
+TAIL_SIZE = 64* 1024
+
+# bytes read from a pipe at once
+CHUNK_SIZE = 64* 1024
+
+# number of runs whose logs are kept
+KEEP_RUNS = 10
+
+# lines of output printed for each failed task
+TAIL_LINES = 20
+
+
+class RingBuffer():
+    """
+    Bounded buffer keeping the last bytes written to it.
+    """
+
+    def __init__( self, size = TAIL_SIZE ):
+        """
+        :param size: Maximum number of bytes kept. [Default: TAIL_SIZE]
+        """
+        self.size = size
+        self.chunks = deque()
+        self.length = 0
+
+
+    def write( self, data ):
+        """
+        :param data: Bytes to append.
+        """
+        self.chunks.append( data )
+        self.length += len( data )
+        while self.length - len( self.chunks[ 0 ] ) >= self.size:
+            self.length -= len( self.chunks.popleft() )
+
+
+    def getvalue( self ):
+        """
+        :returns: Last bytes written, at most `size`.
+        """
+        return b''.join( self.chunks )[ -self.size: ]
+
+
+class TaskLogs():
+    """
+    Captured output of the tasks of a run.
+    """
+
+    def __init__( self, root, tail = TAIL_SIZE, keep = KEEP_RUNS ):
+        """
+        Creates a folder for the run's logs, removing those of old runs.
+
+        :param root: Path to a Container of the project.
+        :param tail: Bytes of each task's output kept in memory. [Default: TAIL_SIZE]
+        :param keep: Number of runs whose logs are kept. [Default: KEEP_RUNS]
+        """
+        self.root = project_root( root )
+        self.tail = tail
+        stamp = datetime.now().strftime( '%Y%m%d-%H%M%S-%f' )
+        self.path = os.path.dirname( state_path( self.root, LOGS_DIR, stamp, INDEX_FILE ) )
+
+        self.counts = { 'ok': 0, 'failed': 0 }
+        self.failed = []  # ( <task key>, <output tail> ) of failed tasks
+        self._log = open( os.path.join( self.path, LOG_FILE ), 'ab' )
+        self._index = open( os.path.join( self.path, INDEX_FILE ), 'a' )
+        self._lock = threading.Lock()
+
+        runs = list_runs( self.root )
+        for run in runs[ :-keep ]:
+            shutil.rmtree( os.path.join( os.path.dirname( self.path ), run ), ignore_errors = True )
+
+
+    def relpath( self, path ):
+        """
+        :param path: Path.
+        :returns: Path relative to the project root.
+        """
+        return os.path.relpath( os.path.abspath( path ), self.root )
+
+
+    async def capture( self, proc, container_id, script_id, keep_stdout = False ):
+        """
+        Captures the output of a task until its process exits.
+
+        :param proc: asyncio.subprocess.Process of the task, with piped stdout and stderr.
+        :param container_id: Path of the Container.
+        :param script_id: Path of the Script.
+        :param keep_stdout: Return all of stdout, rather than only spilling it. [Default: False]
+        :returns: Tuple of ( <stdout>, <stderr> ),
+            where stdout is empty unless kept and stderr is its tail.
+        """
+        spool = tempfile.TemporaryFile( dir = self.path )
+        output = RingBuffer( self.tail )
+        errors = RingBuffer( self.tail )
+        stdout = []
+
+        async def _read( stream, buffer ):
+            while True:
+                data = await stream.read( CHUNK_SIZE )
+                if not data:
+                    break
+
+                spool.write( data )
+                output.write( data )
+                if buffer is not None:
+                    buffer.write( data )
+
+                if keep_stdout and ( buffer is None ):
+                    stdout.append( data )
+
+
+        try:
+            await asyncio.gather( _read( proc.stdout, None ), _read( proc.stderr, errors ) )
+            await proc.wait()
+
+            # as for the runner, any output to stderr is an error
+            failed = bool( errors.length )
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                self._commit, spool, container_id, script_id, proc.returncode, failed, output.getvalue()
+            )
+
+        finally:
+            spool.close()
+
+        return ( b''.join( stdout ), errors.getvalue() )
+
+
+    def _commit( self, spool, container_id, script_id, returncode, failed, tail ):
+        """
+        Appends a task's output to the run's log, and indexes it.
+
+        :param spool: File the output was spilled to.
+        :param container_id: Path of the Container.
+        :param script_id: Path of the Script.
+        :param returncode: Exit code of the task.
+        :param failed: If the task failed.
+        :param tail: Tail of the task's output.
+        """
+        container = self.relpath( container_id )
+        script = self.relpath( script_id )
+        status = 'failed' if failed else 'ok'
+
+        spool.seek( 0 )
+        with self._lock:
+            offset = self._log.tell()
+            shutil.copyfileobj( spool, self._log )
+            self._log.flush()
+
+            entry = {
+                'container':  container,
+                'script':     script,
+                'offset':     offset,
+                'length':     self._log.tell() - offset,
+                'returncode': returncode,
+                'status':     status
+            }
+
+            self._index.write( json.dumps( entry ) + '\n' )
+            self._index.flush()
+
+            self.counts[ status ] += 1
+            if failed:
+                self.failed.append( ( task_key( container, script ), tail ) )
+
+
+    def close( self ):
+        """
+        Closes the log files.
+        """
+        self._log.close()
+        self._index.close()
+
+
+def list_runs( root ):
+    """
+    :param root: Path to a Container of the project.
+    :returns: Sorted list of names of the runs with logs, oldest first.
+    """
+    folder = os.path.join( project_root( root ), STATE_DIR, LOGS_DIR )
+    try:
+        return sorted(
+            name for name in os.listdir( folder )
+            if os.path.isfile( os.path.join( folder, name, INDEX_FILE ) )
+        )
+
+    except FileNotFoundError:
+        return []
+
+
+def read_index( path ):
+    """
+    :param path: Path to the logs of a run.
+    :returns: List of index entries of the run's tasks.
+    """
+    with open( os.path.join( path, INDEX_FILE ) ) as f:
+        return [ json.loads( line ) for line in f if line.strip() ]
+
+
+def read_output( path, entry ):
+    """
+    :param path: Path to the logs of a run.
+    :param entry: Index entry of a task.
+    :returns: Output of the task.
+    """
+    with open( os.path.join( path, LOG_FILE ), 'rb' ) as f:
+        f.seek( entry[ 'offset' ] )
+        return f.read( entry[ 'length' ] )
+
+
+def _tail( data, lines = TAIL_LINES ):
+    """
+    :param data: Bytes.
+    :param lines: Number of lines. [Default: TAIL_LINES]
+    :returns: Last lines of the data as a string.
+    """
+    return '\n'.join( data.decode( errors = 'replace' ).rstrip().split( '\n' )[ -lines: ] )
+
+
+def print_status( logs, running = 0 ):
+    """
+    Prints a status line of a run, replacing the previous one.
+    Only printed if stderr is a terminal.
+
+    :param logs: TaskLogs of the run.
+    :param running: Number of running tasks. [Default: 0]
+    """
+    if not sys.stderr.isatty():
+        return
+
+    sys.stderr.write( '\r\033[K{} done, {} failed, {} running'.format(
+        logs.counts[ 'ok' ], logs.counts[ 'failed' ], running
+    ) )
+
+    sys.stderr.flush()
+
+
+def print_summary( logs ):
+    """
+    Prints the summary of a run and the output tail of its failed tasks.
+
+    :param logs: TaskLogs of the run.
+    """
+    if sys.stderr.isatty():
+        sys.stderr.write( '\r\033[K' )
+
+    for ( key, tail ) in logs.failed:
+        print( '\n--- {} [failed]'.format( key ) )
+        print( _tail( tail ) )
+
+    print( '{} tasks done, {} failed. Logs written to {}'.format(
+        logs.counts[ 'ok' ], logs.counts[ 'failed' ], logs.path
+    ) )
+
+
+def print_logs( root, container = None, scripts = None, run = None ):
+    """
+    Prints the captured output of tasks.
+
+    :param root: Path to a Container of the project.
+        Container and Script paths are relative to it.
+    :param container: Path of the Container to print the output of its tasks,
+        or None to list the tasks. [Default: None]
+    :param scripts: List of Script paths to limit the tasks to,
+        or None for all. [Default: None]
+    :param run: Name of the run, or None for the latest. [Default: None]
+    :raises RuntimeError: If no logs are recorded, or no task matches.
+    """
+    base = os.path.abspath( root )
+    root = project_root( root )
+    runs = list_runs( root )
+    if not runs:
+        raise RuntimeError( 'No logs recorded.' )
+
+    run = run or runs[ -1 ]
+    path = os.path.join( root, STATE_DIR, LOGS_DIR, run )
+    entries = read_index( path )
+    if scripts is not None:
+        scripts = { os.path.relpath( resolve_path( script, base, root ), root ) for script in scripts }
+        entries = [ entry for entry in entries if entry[ 'script' ] in scripts ]
+
+    if container is not None:
+        container = os.path.relpath( resolve_path( container, base, root ), root )
+        entries = [ entry for entry in entries if entry[ 'container' ] == container ]
+
+    if not entries:
+        raise RuntimeError( 'No matching tasks in run {}.'.format( run ) )
+
+    if container is None:
+        print( '{:<8} {:>10}  {}'.format( 'STATUS', 'BYTES', 'TASK' ) )
+        for entry in entries:
+            print( '{:<8} {:>10}  {}'.format(
+                entry[ 'status' ], entry[ 'length' ], task_key( entry[ 'container' ], entry[ 'script' ] )
+            ) )
+
+        return
+
+    for entry in entries:
+        print( '--- {} [{}]'.format( task_key( entry[ 'container' ], entry[ 'script' ] ), entry[ 'status' ] ) )
+        sys.stdout.flush()
+        sys.stdout.buffer.write( read_output( path, entry ) )
+        sys.stdout.buffer.flush()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Asset Manifests
+"""
+Manifests of the descendant Assets of each Container, built bottom up during a run.
+
+A Container's manifest is written just before its Scripts run,
+from its child Assets and the manifests of its child Containers,
+which are complete as children run before their parents.
+Scripts get the path of the manifest in the `THOT_ASSET_MANIFEST`
+environment variable, so they can find their inputs without scanning the tree.
+
+Manifests are JSON Lines files, one Asset per line with the properties
+in MANIFEST_PROPERTIES and 'container', the path of its parent Container.
+e.g.
+    with open( os.environ[ 'THOT_ASSET_MANIFEST' ] ) as f:
+        assets = [ json.loads( line ) for line in f ]
+
+Files of compressed Assets are decompressed for scripts at their `file`, see `utils.compress`.
+
+Once a Container's Scripts complete its manifest is rewritten,
+to include the Assets they created, for its parent.
+Manifests of children are then removed,
+so only those of Containers waiting on their parents are kept.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+from ..common import state_path
+from ..utils.walk import child_assets, project_root
+from .stream import child_containers
+
+
+MANIFEST_ENV = 'THOT_ASSET_MANIFEST'
+MANIFESTS_DIR = 'manifests'
+
+# asset properties included in manifests
+MANIFEST_PROPERTIES = ( 'type', 'name', 'file', 'tags', 'metadata', 'compression' )
+
+
+class Manifests():
+    """
+    Asset manifests of the Containers of a run.
+    """
+
+    def __init__( self, root, properties = MANIFEST_PROPERTIES ):
+        """
+        Creates a folder for the run's manifests.
+
+        :param root: Path to a Container of the project.
+        :param properties: Asset properties to include. [Default: MANIFEST_PROPERTIES]
+        """
+        self.root = project_root( root )
+        self.properties = properties
+
+        parent = os.path.dirname( state_path( self.root, MANIFESTS_DIR, '' ) )
+        self.path = tempfile.mkdtemp( dir = parent )
+
+
+    def manifest_path( self, container_id ):
+        """
+        :param container_id: Path of the Container.
+        :returns: Path of the Container's manifest.
+        """
+        name = hashlib.sha1( os.path.normpath( container_id ).encode() ).hexdigest()
+        return os.path.join( self.path, name + '.jsonl' )
+
+
+    def _write( self, container_id ):
+        """
+        Writes a Container's manifest.
+
+        :param container_id: Path of the Container.
+        """
+        container_id = os.path.normpath( container_id )
+        path = self.manifest_path( container_id )
+        with open( path + '.tmp', 'w' ) as f:
+            for ( asset, properties ) in child_assets( container_id, self.root ):
+                entry = { '_id': asset, 'container': container_id }
+                for prop in self.properties:
+                    entry[ prop ] = properties.get( prop )
+
+                f.write( json.dumps( entry ) + '\n' )
+
+            for child in child_containers( container_id ):
+                try:
+                    with open( self.manifest_path( child ) ) as cf:
+                        shutil.copyfileobj( cf, f )
+
+                except FileNotFoundError:
+                    # child not run
+                    continue
+
+        os.replace( path + '.tmp', path )
+
+
+    def prepare( self, container_id ):
+        """
+        Writes a Container's manifest before its Scripts run.
+
+        :param container_id: Path of the Container.
+        :returns: Path of the manifest.
+        """
+        self._write( container_id )
+        return self.manifest_path( container_id )
+
+
+    def complete( self, container_id ):
+        """
+        Rewrites a Container's manifest once its Scripts complete,
+        and removes those of its children.
+
+        :param container_id: Path of the Container.
+        """
+        self._write( container_id )
+        for child in child_containers( container_id ):
+            try:
+                os.remove( self.manifest_path( child ) )
+
+            except FileNotFoundError:
+                continue
+
+
+    def close( self ):
+        """
+        Removes all manifests.
+        """
+        shutil.rmtree( self.path, ignore_errors = True )
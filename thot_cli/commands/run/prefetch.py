@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Asset Prefetching
+"""
+Prefetching of Asset files into the page cache ahead of the Containers that use them.
+
+The Containers of a run are visited in a known order.
+While a Container's scripts run, the files of the child Assets
+of the next Containers in the order are read in the background,
+so scripts do not block on the first read of their data.
+
+A Container visited once its prefetch completed is a hit,
+one visited while its prefetch is still in progress is late,
+and one passed over without being visited is unused.
+Where available, `posix_fadvise` is used, which only asks the kernel to read the files,
+so a hit means the reads were requested in time,
+not that their pages are still cached when used.
+Otherwise the files are read, and a hit means they were.
+"""
+
+import os
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ..common import format_bytes
+from ..utils.walk import SCRIPTS_FILE, child_assets, project_root, stored_file
+
+
+# default number of Containers prefetched ahead
+PREFETCH_AHEAD = 8
+
+# default maximum bytes prefetched for Containers not yet started
+PREFETCH_BUDGET = 1024** 3
+
+READ_CHUNK = 1024** 2
+
+
+def asset_files( path, root ):
+    """
+    :param path: Path to a Container.
+    :param root: Project root, used to resolve Asset file paths.
+    :returns: List of ( <path>, <size> ) of the files of the Container's child Assets.
+        Invalid Assets and missing files are ignored.
+    """
+    files = []
+    for ( _, properties ) in child_assets( path, root ):
+        try:
+            file = stored_file( properties )
+            files.append( ( file, os.path.getsize( file ) ) )
+
+        except OSError:
+            continue
+
+    return files
+
+
+def scripted( paths ):
+    """
+    Filters Containers to those with Scripts,
+    as only they are visited when run.
+
+    :param paths: Iterable of Container paths.
+    :returns: Generator of the paths of Containers with Scripts.
+    """
+    for path in paths:
+        try:
+            with open( os.path.join( path, SCRIPTS_FILE ) ) as f:
+                if json.load( f ):
+                    yield path
+
+        except ( OSError, ValueError ):
+            continue
+
+
+def prefetch_file( path, size ):
+    """
+    Brings a file into the page cache.
+    Uses `posix_fadvise` if available, otherwise reads the file.
+
+    :param path: Path to the file.
+    :param size: Size of the file.
+    """
+    fd = os.open( path, os.O_RDONLY )
+    try:
+        if hasattr( os, 'posix_fadvise' ):
+            os.posix_fadvise( fd, 0, size, os.POSIX_FADV_WILLNEED )
+            return
+
+        while os.read( fd, READ_CHUNK ):
+            pass
+
+    finally:
+        os.close( fd )
+
+
+class Prefetcher():
+    """
+    Prefetches the Asset files of upcoming Containers.
+
+    Containers must be visited, with #visit, as they start.
+    Visits are handled in order by a separate thread,
+    so reading the order and issuing prefetches does not block the caller.
+    The budget bounds the bytes prefetched for Containers not yet started.
+    A visited Container releases its bytes from the budget,
+    along with any earlier Containers in the order,
+    which are assumed to have run out of order.
+    """
+
+    def __init__(
+        self,
+        order,
+        root,
+        ahead = PREFETCH_AHEAD,
+        budget = PREFETCH_BUDGET,
+        workers = 4
+    ):
+        """
+        :param order: Iterable of Container paths in the order they are expected to run.
+            Only consumed as needed.
+        :param root: Path to a Container of the project.
+        :param ahead: Number of Containers to prefetch ahead. [Default: PREFETCH_AHEAD]
+        :param budget: Maximum number of bytes prefetched for Containers not yet started.
+            [Default: PREFETCH_BUDGET]
+        :param workers: Number of prefetch threads. [Default: 4]
+        """
+        self.order = iter( order )
+        self.root = project_root( root )
+        self.ahead = ahead
+        self.budget = budget
+        self._executor = ThreadPoolExecutor( max_workers = workers )
+        self._visitor = ThreadPoolExecutor( max_workers = 1 )
+        self._lock = threading.Lock()
+        self._closed = False
+        self._exhausted = False
+
+        self._issued = deque()  # ( <path>, <future> ) of upcoming Containers
+        self._paths = set()  # paths of issued Containers
+        self._reserved = 0  # bytes prefetched for containers not yet started
+
+        self.stats = {
+            'containers': 0,  # containers prefetched
+            'hits':       0,  # visited after their prefetch completed
+            'late':       0,  # visited while still prefetching
+            'unused':     0,  # passed without being visited
+            'files':      0,  # files prefetched
+            'bytes':      0,  # bytes prefetched
+            'skipped':    0   # files not prefetched as over budget
+        }
+
+
+    def _prefetch( self, path ):
+        """
+        Prefetches the Asset files of a Container.
+        Run in a worker thread.
+
+        :param path: Path to the Container.
+        :returns: Bytes prefetched.
+        """
+        if self._closed:
+            return 0
+
+        fetched = 0
+        for ( file, size ) in asset_files( path, self.root ):
+            with self._lock:
+                if self._closed:
+                    break
+
+                if self._reserved + size > self.budget:
+                    self.stats[ 'skipped' ] += 1
+                    continue
+
+                self._reserved += size
+
+            try:
+                prefetch_file( file, size )
+
+            except OSError:
+                with self._lock:
+                    self._reserved -= size
+
+                continue
+
+            fetched += size
+            with self._lock:
+                self.stats[ 'files' ] += 1
+                self.stats[ 'bytes' ] += size
+
+        return fetched
+
+
+    def fill( self ):
+        """
+        Issues prefetches until enough Containers are ahead,
+        or the budget is used.
+        """
+        while (
+            not self._exhausted and
+            ( len( self._issued ) < self.ahead ) and
+            ( self._reserved < self.budget )
+        ):
+            try:
+                path = os.path.normpath( next( self.order ) )
+
+            except StopIteration:
+                self._exhausted = True
+                return
+
+            self._issued.append( ( path, self._executor.submit( self._prefetch, path ) ) )
+            self._paths.add( path )
+            self.stats[ 'containers' ] += 1
+
+
+    def _release( self, future ):
+        """
+        Releases the bytes of a Container from the budget.
+
+        :param future: Prefetch of the Container.
+        """
+        if future.cancel():
+            return
+
+        def _done( future ):
+            if future.exception() is not None:
+                return
+
+            with self._lock:
+                self._reserved -= future.result()
+
+        future.add_done_callback( _done )
+
+
+    def _visit( self, path ):
+        """
+        Marks a Container as started, and prefetches further ahead.
+        Run in the visitor thread.
+
+        :param path: Path to the Container.
+        """
+        if self._closed:
+            return
+
+        path = os.path.normpath( path )
+        if path in self._paths:
+            while self._issued:
+                ( issued, future ) = self._issued.popleft()
+                self._paths.discard( issued )
+                if issued == path:
+                    self.stats[ 'hits' if future.done() else 'late' ] += 1
+                    self._release( future )
+                    break
+
+                self.stats[ 'unused' ] += 1
+                self._release( future )
+
+        self.fill()
+
+
+    def visit( self, path ):
+        """
+        Marks a Container as started, and prefetches further ahead.
+        Returns immediately, the visit is handled by the visitor thread.
+        Visits to Containers not upcoming are ignored.
+
+        :param path: Path to the Container.
+        """
+        try:
+            self._visitor.submit( self._visit, path )
+
+        except RuntimeError:
+            # closed
+            pass
+
+
+    def close( self ):
+        """
+        Stops prefetching.
+        Containers issued but not visited are counted as unused.
+        """
+        # let pending visits complete, so statistics are final
+        self._visitor.shutdown( wait = True )
+        self._closed = True
+        self._executor.shutdown( wait = False )
+
+        self.stats[ 'unused' ] += len( self._issued )
+        self._issued.clear()
+        self._paths.clear()
+
+
+def print_prefetch( stats ):
+    """
+    Prints prefetch statistics.
+
+    :param stats: Prefetcher#stats.
+    """
+    visited = stats[ 'hits' ] + stats[ 'late' ]
+    print(
+        'Prefetched {} files ({}) for {} containers: {} hits, {} late, {} unused. {} files over budget.'.format(
+            stats[ 'files' ],
+            format_bytes( stats[ 'bytes' ] ),
+            stats[ 'containers' ],
+            stats[ 'hits' ],
+            stats[ 'late' ],
+            stats[ 'unused' ],
+            stats[ 'skipped' ]
+        )
+    )
+
+    if visited:
+        print( 'Hit rate {:.1%}'.format( stats[ 'hits' ] / visited ) )
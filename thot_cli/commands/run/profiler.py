@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Script Profiler
+"""
+Runs a script under cProfile.
+Used by the runner to profile tasks.
+
+Usage: python profiler.py <output> <script> [<args>...]
+
+The script is compiled before the profiler starts,
+so the profile only covers the script's own code, including its imports,
+and not the profiler or other wrappers running it.
+The profile is written to the output file in `pstats` format
+once the script exits, even if it raises an error.
+
+This file is run directly so it only depends on the standard library.
+"""
+
+import os
+import sys
+import types
+import builtins
+import cProfile
+
+
+def profile( output, script, *args ):
+    """
+    Runs a script under cProfile.
+
+    :param output: Path to write the profile to.
+    :param script: Path to the script.
+    :param *args: Arguments passed to the script.
+    """
+    # run script as if it were run directly
+    sys.argv = [ script, *args ]
+    sys.path[ 0 ] = os.path.dirname( os.path.abspath( script ) )
+
+    with open( script, 'rb' ) as f:
+        code = compile( f.read(), script, 'exec' )
+
+    main = types.ModuleType( '__main__' )
+    main.__file__ = script
+    main.__builtins__ = builtins
+    sys.modules[ '__main__' ] = main
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        exec( code, main.__dict__ )
+
+    finally:
+        profiler.disable()
+        profiler.dump_stats( output )
+
+
+if __name__ == '__main__':
+    profile( *sys.argv[ 1: ] )
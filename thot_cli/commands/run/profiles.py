@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Run Profiles
+"""
+Profiles of the tasks of a run, and their aggregates.
+
+Each task writes its own `pstats` file, run by #profiler.
+After the run the profiles of each Script are merged across Containers into
+    + <script>.pstats: Aggregated profile, for use with `pstats` or snakeviz.
+    + <script>.collapsed: Collapsed stacks, for use with flamegraph.pl or speedscope.
+If several Scripts ran, all profiles are also merged into `all.pstats` and `all.collapsed`.
+"""
+
+import os
+import json
+import pstats
+import hashlib
+from datetime import datetime
+
+from ..common import state_path
+from ..utils.walk import project_root
+from .lineage import task_key
+
+
+PROFILES_DIR = 'profiles'
+TASKS_FOLDER = 'tasks'
+INDEX_FILE   = 'tasks.json'
+ALL_NAME     = 'all'
+
+# path to the profiler, run in place of scripts
+PROFILE_SCRIPT = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'profiler.py' )
+
+# deepest stack written to collapsed stacks
+MAX_DEPTH = 128
+
+
+def _frame( func ):
+    """
+    :param func: pstats function key of ( <file>, <line>, <name> ).
+    :returns: Frame label for collapsed stacks.
+    """
+    ( path, line, name ) = func
+    label = (
+        name
+        if path == '~' else  # built in
+        '{} ({}:{})'.format( name, os.path.basename( path ), line )
+    )
+
+    # semicolons separate frames
+    return label.replace( ';', ',' )
+
+
+def collapse( stats, roots = None ):
+    """
+    Converts a profile to collapsed stacks.
+
+    cProfile only records caller and callee pairs, not full stacks,
+    so the time of a function called from several places is divided
+    between them by the time spent in each call.
+
+    :param stats: pstats.Stats.
+    :param roots: Collection of paths of Scripts.
+        Stacks start at the module level of these Scripts,
+        excluding frames of the runner's wrappers.
+        If None, or none are found, stacks start at functions without callers.
+        [Default: None]
+    :returns: Dictionary of { <stack>: <microseconds> },
+        where stack is the frames separated by semicolons.
+    """
+    entries = stats.stats
+    callees = {}
+    for func, ( _, _, _, _, callers ) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault( caller, {} )[ func ] = edge[ 3 ]
+
+    starts = []
+    if roots is not None:
+        roots = { os.path.normpath( root ) for root in roots }
+        starts = [
+            func for func in entries
+            if ( func[ 2 ] == '<module>' ) and ( os.path.normpath( func[ 0 ] ) in roots )
+        ]
+
+    if not starts:
+        starts = [ func for func, entry in entries.items() if not entry[ 4 ] ]
+
+    stacks = {}
+    def _walk( func, frames, path, scale ):
+        """
+        :param func: Function.
+        :param frames: Frame labels of the stack, including the function.
+        :param path: Functions of the stack, to stop recursion.
+        :param scale: Fraction of the function's time spent in this stack.
+        """
+        own = int( entries[ func ][ 2 ]* scale* 1e6 )
+        if own > 0:
+            stack = ';'.join( frames )
+            stacks[ stack ] = stacks.get( stack, 0 ) + own
+
+        if len( frames ) >= MAX_DEPTH:
+            return
+
+        for callee, edge_time in callees.get( func, {} ).items():
+            total = entries[ callee ][ 3 ]
+            if ( callee in path ) or ( total <= 0 ):
+                continue
+
+            callee_scale = scale* edge_time / total
+            if callee_scale* total < 1e-6:
+                # less than a microsecond
+                continue
+
+            _walk( callee, frames + [ _frame( callee ) ], path | { callee }, callee_scale )
+
+
+    for func in starts:
+        _walk( func, [ _frame( func ) ], { func }, 1 )
+
+    return stacks
+
+
+def _output_name( script ):
+    """
+    :param script: Path of a Script, relative to the project root.
+    :returns: Name of the aggregate files of the Script.
+    """
+    return script.replace( os.sep, '__' )
+
+
+class Profiles():
+    """
+    Profiles of the tasks of a run.
+    """
+
+    def __init__( self, root, scripts = None ):
+        """
+        Creates a folder for the run's profiles.
+
+        :param root: Path to a Container of the project.
+        :param scripts: List of paths of the Scripts to profile,
+            or None to profile all. [Default: None]
+        """
+        self.root = project_root( root )
+        self.scripts = (
+            None
+            if scripts is None else
+            { self.relpath( script ) for script in scripts }
+        )
+
+        stamp = datetime.now().strftime( '%Y%m%d-%H%M%S-%f' )
+        self.path = os.path.dirname( state_path( self.root, PROFILES_DIR, stamp, INDEX_FILE ) )
+        self.tasks = {}  # task profile file name keyed by task key
+
+
+    def relpath( self, path ):
+        """
+        :param path: Path.
+        :returns: Path relative to the project root.
+        """
+        return os.path.relpath( os.path.abspath( path ), self.root )
+
+
+    def includes( self, script_id ):
+        """
+        :param script_id: Path of a Script.
+        :returns: If the Script is profiled.
+        """
+        return ( self.scripts is None ) or ( self.relpath( script_id ) in self.scripts )
+
+
+    def task_file( self, container_id, script_id ):
+        """
+        Gets the path to write a task's profile to.
+
+        :param container_id: Path of the Container.
+        :param script_id: Path of the Script.
+        :returns: Path of the task's profile.
+        """
+        key = task_key( self.relpath( container_id ), self.relpath( script_id ) )
+        name = hashlib.sha1( key.encode() ).hexdigest()[ :16 ] + '.pstats'
+        self.tasks[ key ] = name
+
+        folder = os.path.join( self.path, TASKS_FOLDER )
+        os.makedirs( folder, exist_ok = True )
+        return os.path.join( folder, name )
+
+
+    def aggregate( self ):
+        """
+        Merges the task profiles of each Script, and of all Scripts.
+        Tasks that did not write a profile are skipped.
+
+        :returns: List of dictionaries with keys
+            [ 'script', 'tasks', 'time', 'pstats', 'collapsed', 'stats' ],
+            with a final entry for all Scripts with script None if several ran.
+            Stats is the merged pstats.Stats.
+        """
+        index = {}
+        scripts = {}
+        for key, name in self.tasks.items():
+            path = os.path.join( self.path, TASKS_FOLDER, name )
+            if not os.path.isfile( path ):
+                continue
+
+            ( container, script ) = key.split( '::', 1 )
+            index[ name ] = { 'container': container, 'script': script }
+            scripts.setdefault( script, [] ).append( path )
+
+        with open( os.path.join( self.path, INDEX_FILE ), 'w' ) as f:
+            json.dump( index, f, indent = 1 )
+
+        groups = [ ( script, files, [ script ] ) for script, files in sorted( scripts.items() ) ]
+        if len( groups ) > 1:
+            groups.append( (
+                None,
+                [ path for ( _, files, _ ) in groups for path in files ],
+                list( scripts )
+            ) )
+
+        results = []
+        for ( script, files, roots ) in groups:
+            name = ALL_NAME if script is None else _output_name( script )
+            stats = pstats.Stats( *files )
+
+            out_stats = os.path.join( self.path, name + '.pstats' )
+            stats.dump_stats( out_stats )
+
+            out_collapsed = os.path.join( self.path, name + '.collapsed' )
+            stacks = collapse( stats, roots = [ os.path.join( self.root, root ) for root in roots ] )
+            with open( out_collapsed, 'w' ) as f:
+                for stack, time in sorted( stacks.items() ):
+                    f.write( '{} {}\n'.format( stack, time ) )
+
+            results.append( {
+                'script':    script,
+                'tasks':     len( files ),
+                'time':      stats.total_tt,
+                'pstats':    out_stats,
+                'collapsed': out_collapsed,
+                'stats':     stats
+            } )
+
+        return results
+
+
+def print_profiles( results, path, top = 5 ):
+    """
+    Prints the aggregated profiles of a run.
+
+    :param results: Aggregated profiles, as returned by Profiles#aggregate.
+    :param path: Path of the profiles folder.
+    :param top: Number of functions to print for each Script,
+        by time spent in the function itself. [Default: 5]
+    """
+    if not results:
+        print( 'No profiles recorded.' )
+        return
+
+    print( 'Profiles written to {}'.format( path ) )
+    for result in results:
+        print( '\n{} [{} tasks, {:.3f} s]'.format(
+            result[ 'script' ] or 'All scripts',
+            result[ 'tasks' ],
+            result[ 'time' ]
+        ) )
+
+        print( '{:>10} {:>10} {:>10}  {}'.format( 'OWN', 'CUMULATIVE', 'CALLS', 'FUNCTION' ) )
+        entries = sorted(
+            result[ 'stats' ].stats.items(),
+            key = lambda item: item[ 1 ][ 2 ],
+            reverse = True
+        )
+
+        for func, ( _, calls, own, cumulative, _ ) in entries[ :top ]:
+            print( '{:>10.3f} {:>10.3f} {:>10}  {}'.format( own, cumulative, calls, _frame( func ) ) )
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Work Queue
+"""
+A task queue in the project folder, shared by workers on any host mounting the project.
+
+The coordinator writes the tasks of a run, and the tasks each depends on,
+to `.thot/queue`. Workers claim tasks whose dependencies are done,
+run them, and mark them done or failed.
+Tasks follow the order of a normal run:
+a Container's Scripts run after those of its descendants,
+and in order of priority.
+
+Each task has a marker file in one of the state folders.
+    + pending: Waiting to be claimed.
+    + claimed: Claimed by a worker. Contains the worker's id.
+    + done: Completed.
+    + failed: Failed, or depends on a failed task. Contains the error.
+
+A task is claimed by exclusively creating its claimed marker,
+so only one worker can hold it.
+Workers touch the markers of their claimed tasks as a heartbeat.
+A claim whose marker has not been touched within the heartbeat timeout
+is returned to pending by renaming it, so only one worker reclaims it.
+Marker times are set by the file server,
+so hosts' clocks should be synchronized to within the timeout.
+
+Paths are stored relative to the project root,
+so hosts may mount the project at different paths.
+"""
+
+import os
+import json
+import time
+import shutil
+import socket
+import tempfile
+
+from ..common import state_path, write_atomic
+from ..utils.walk import project_root
+from .stream import post_order, load_container
+
+
+QUEUE_DIR = 'queue'
+TASKS_FILE = 'tasks.json'
+STATES = ( 'pending', 'claimed', 'done', 'failed' )
+
+# seconds without a heartbeat before a claimed task is reclaimed
+HEARTBEAT_TIMEOUT = 60
+
+# seconds between checks for ready tasks
+POLL_INTERVAL = 1
+
+
+def tree_tasks( root, scripts = None ):
+    """
+    Gets the tasks of a tree.
+
+    :param root: Path to the root Container.
+    :param scripts: List of Script paths to limit the tasks to,
+        or None for all. [Default: None]
+    :returns: List of tasks, each a dictionary with keys
+        [ 'container', 'script', 'deps' ] where deps are the indices of the tasks it depends on.
+        Paths are absolute.
+    """
+    proj_root = project_root( root )
+    tasks = []
+    exits = {}  # tasks completing the subtree of each Container
+    for ( path, children ) in post_order( root ):
+        deps = [ index for child in children for index in exits.pop( child ) ]
+
+        groups = {}
+        for assoc in load_container( path, proj_root ).scripts:
+            if not assoc.autorun:
+                continue
+
+            if ( scripts is not None ) and ( assoc.script not in scripts ):
+                continue
+
+            groups.setdefault( assoc.priority, [] ).append( assoc.script )
+
+        for priority in sorted( groups ):
+            group = []
+            for script in groups[ priority ]:
+                group.append( len( tasks ) )
+                tasks.append( { 'container': path, 'script': script, 'deps': deps } )
+
+            deps = group
+
+        exits[ path ] = deps
+
+    return tasks
+
+
+def level_tasks( levels ):
+    """
+    Gets the tasks of levels, as returned by #runner.downstream_tasks.
+    Each task depends on all tasks of the previous level.
+
+    :param levels: List of levels of ( <container id>, <script id> ).
+    :returns: List of tasks, as for #tree_tasks.
+    """
+    tasks = []
+    deps = []
+    for level in levels:
+        group = []
+        for ( container, script ) in level:
+            group.append( len( tasks ) )
+            tasks.append( { 'container': container, 'script': script, 'deps': deps } )
+
+        deps = group
+
+    return tasks
+
+
+def worker_id():
+    """
+    :returns: Id of this worker process.
+    """
+    return '{}-{}'.format( socket.gethostname(), os.getpid() )
+
+
+class Queue():
+    """
+    Task queue of a project.
+    """
+
+    def __init__( self, root ):
+        """
+        :param root: Path to a Container of the project.
+        """
+        self.root = project_root( root )
+        self.path = state_path( self.root, QUEUE_DIR )
+        self.tasks = None
+        self.worker = worker_id()
+
+
+    def _marker( self, state, task_id ):
+        """
+        :param state: State of the task, one of STATES.
+        :param task_id: Id of the task.
+        :returns: Path of the task's marker in the state folder.
+        """
+        return os.path.join( self.path, state, task_id )
+
+
+    def ids( self, state ):
+        """
+        :param state: State, one of STATES.
+        :returns: Set of ids of tasks in the state.
+        """
+        try:
+            names = os.listdir( os.path.join( self.path, state ) )
+
+        except FileNotFoundError:
+            return set()
+
+        # exclude markers being written
+        return set( name for name in names if not name.startswith( '.' ) )
+
+
+    def create( self, tasks ):
+        """
+        Creates the queue, replacing a finished one.
+        The queue is written to a temporary folder then moved into place,
+        so workers never see a partial queue.
+
+        :param tasks: List of tasks, as returned by #tree_tasks.
+        :raises RuntimeError: If an unfinished queue exists.
+        """
+        if os.path.isdir( self.path ) and not self.finished():
+            raise RuntimeError( 'Queue {} has unfinished tasks.'.format( self.path ) )
+
+        tmp = tempfile.mkdtemp( dir = os.path.dirname( self.path ), prefix = '.queue-' )
+        width = len( str( len( tasks ) ) )
+        ids = [ str( index ).zfill( width ) for index in range( len( tasks ) ) ]
+
+        queued = {}
+        for task_id, task in zip( ids, tasks ):
+            queued[ task_id ] = {
+                'container': os.path.relpath( task[ 'container' ], self.root ),
+                'script':    os.path.relpath( task[ 'script' ], self.root ),
+                'deps':      [ ids[ dep ] for dep in task[ 'deps' ] ]
+            }
+
+        with open( os.path.join( tmp, TASKS_FILE ), 'w' ) as f:
+            json.dump( queued, f )
+
+        for state in STATES:
+            os.mkdir( os.path.join( tmp, state ) )
+
+        for task_id in ids:
+            open( os.path.join( tmp, 'pending', task_id ), 'w' ).close()
+
+        if os.path.isdir( self.path ):
+            old = tempfile.mkdtemp( dir = os.path.dirname( self.path ), prefix = '.queue-' )
+            os.rename( self.path, os.path.join( old, QUEUE_DIR ) )
+            shutil.rmtree( old, ignore_errors = True )
+
+        os.rename( tmp, self.path )
+        self.tasks = queued
+
+
+    def load( self ):
+        """
+        Loads the tasks of the queue.
+
+        :returns: If the queue exists.
+        """
+        try:
+            with open( os.path.join( self.path, TASKS_FILE ) ) as f:
+                self.tasks = json.load( f )
+
+        except FileNotFoundError:
+            return False
+
+        return True
+
+
+    def task( self, task_id ):
+        """
+        :param task_id: Id of the task.
+        :returns: Tuple of ( <container path>, <script path> ) of the task.
+        """
+        task = self.tasks[ task_id ]
+        return tuple(
+            os.path.normpath( os.path.join( self.root, task[ key ] ) )
+            for key in ( 'container', 'script' )
+        )
+
+
+    def ready( self ):
+        """
+        Gets the pending tasks whose dependencies are done.
+        Pending tasks depending on a failed task are failed.
+
+        :returns: Sorted list of ids of ready tasks.
+        """
+        pending = self.ids( 'pending' ) - self.ids( 'claimed' )
+        done = self.ids( 'done' )
+        failed = self.ids( 'failed' )
+
+        ready = []
+        for task_id in sorted( pending ):
+            deps = self.tasks[ task_id ][ 'deps' ]
+            upstream = [ dep for dep in deps if dep in failed ]
+            if upstream:
+                self._move( task_id, 'pending', 'failed', 'Depends on failed task {}.'.format( upstream[ 0 ] ) )
+                failed.add( task_id )
+
+            elif all( dep in done for dep in deps ):
+                ready.append( task_id )
+
+        return ready
+
+
+    def claim( self, task_id ):
+        """
+        Claims a task.
+
+        :param task_id: Id of the task.
+        :returns: If the task was claimed.
+        """
+        marker = self._marker( 'claimed', task_id )
+        try:
+            fd = os.open( marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY )
+
+        except FileExistsError:
+            return False
+
+        with os.fdopen( fd, 'w' ) as f:
+            f.write( self.worker )
+
+        # task completed by another worker since listed
+        if (
+            not os.path.exists( self._marker( 'pending', task_id ) ) or
+            os.path.exists( self._marker( 'done', task_id ) )
+        ):
+            os.remove( marker )
+            return False
+
+        try:
+            os.remove( self._marker( 'pending', task_id ) )
+
+        except FileNotFoundError:
+            pass
+
+        return True
+
+
+    def heartbeat( self, ids ):
+        """
+        Touches the claimed markers of tasks.
+
+        :param ids: Ids of the tasks.
+        """
+        for task_id in ids:
+            try:
+                os.utime( self._marker( 'claimed', task_id ) )
+
+            except FileNotFoundError:
+                # reclaimed
+                continue
+
+
+    def release( self, task_id ):
+        """
+        Returns a claimed task to pending.
+
+        :param task_id: Id of the task.
+        """
+        try:
+            os.rename( self._marker( 'claimed', task_id ), self._marker( 'pending', task_id ) )
+
+        except FileNotFoundError:
+            pass
+
+
+    def reclaim( self, timeout = HEARTBEAT_TIMEOUT ):
+        """
+        Returns claimed tasks without a recent heartbeat to pending.
+
+        :param timeout: Seconds without a heartbeat before a task is reclaimed.
+            [Default: HEARTBEAT_TIMEOUT]
+        :returns: List of ids of reclaimed tasks.
+        """
+        reclaimed = []
+        now = time.time()
+        for task_id in self.ids( 'claimed' ):
+            marker = self._marker( 'claimed', task_id )
+            try:
+                if now - os.stat( marker ).st_mtime < timeout:
+                    continue
+
+                os.rename( marker, self._marker( 'pending', task_id ) )
+
+            except FileNotFoundError:
+                # completed or reclaimed by another worker
+                continue
+
+            reclaimed.append( task_id )
+
+        return reclaimed
+
+
+    def _move( self, task_id, source, state, contents = '' ):
+        """
+        Moves a task to a final state.
+
+        :param task_id: Id of the task.
+        :param source: Current state of the task.
+        :param state: New state of the task.
+        :param contents: Contents of the new marker. [Default: '']
+        """
+        write_atomic( self._marker( state, task_id ), contents )
+        try:
+            os.remove( self._marker( source, task_id ) )
+
+        except FileNotFoundError:
+            pass
+
+
+    def complete( self, task_id ):
+        """
+        Marks a claimed task done.
+
+        :param task_id: Id of the task.
+        """
+        self._move( task_id, 'claimed', 'done', self.worker )
+
+
+    def fail( self, task_id, error ):
+        """
+        Marks a claimed task failed.
+
+        :param task_id: Id of the task.
+        :param error: Error message.
+        """
+        self._move( task_id, 'claimed', 'failed', '{}: {}'.format( self.worker, error ) )
+
+
+    def finished( self ):
+        """
+        :returns: If no tasks are pending or claimed.
+        """
+        return not ( self.ids( 'pending' ) or self.ids( 'claimed' ) )
+
+
+    def status( self ):
+        """
+        :returns: Dictionary of the number of tasks in each state.
+        """
+        return { state: len( self.ids( state ) ) for state in STATES }
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Script Resources
+"""
+Resource aware scheduling of Scripts.
+
+Script associations in `_scripts.json` may declare
+the resources they use with the optional properties
+    + pool: Name of the concurrency class the Script belongs to.
+    + cpus: Number of cores the Script uses. [Default: 1]
+
+e.g. `{ "script": "root:scripts/fit.py", "pool": "heavy", "cpus": 4 }`.
+"""
+
+import asyncio
+
+from ..utils.walk import read_associations
+
+
+def parse_pools( pools ):
+    """
+    Parses pool limits given as `<name>=<limit>`.
+
+    :param pools: List of pool limits.
+    :returns: Dictionary of { <name>: <limit> }.
+    :raises ValueError: If a pool limit is invalid.
+    """
+    limits = {}
+    for pool in pools:
+        ( name, sep, limit ) = pool.partition( '=' )
+        name = name.strip()
+        if not ( sep and name ):
+            raise ValueError( 'Invalid pool {}, must be of the form <name>=<limit>.'.format( pool ) )
+
+        limit = int( limit )
+        if limit < 1:
+            raise ValueError( 'Pool {} must allow at least one task.'.format( name ) )
+
+        limits[ name ] = limit
+
+    return limits
+
+
+def script_resources( container, script, root ):
+    """
+    Gets the resources declared by a Script's association.
+
+    :param container: Path to the Container.
+    :param script: Path to the Script.
+    :param root: Project root, used to resolve script paths.
+    :returns: Tuple of ( <pool>, <cpus> ).
+        Pool is None if not declared.
+    :raises ValueError: If the declared resources are invalid.
+    """
+    assoc = read_associations( container, root ).get( script )
+    if assoc is None:
+        return ( None, 1 )
+
+    pool = assoc.get( 'pool' )
+    cpus = assoc.get( 'cpus', 1 )
+    if (
+        isinstance( cpus, bool ) or
+        not isinstance( cpus, int ) or
+        ( cpus < 1 )
+    ):
+        raise ValueError( 'Invalid cpus for {} in {}, must be a positive integer.'.format( script, container ) )
+
+    return ( pool, cpus )
+
+
+class Resources():
+    """
+    Limits the Scripts run at once by
+    total tasks, tasks per pool, and cores used.
+
+    Waiting Scripts are started as soon as their resources are available,
+    so Scripts using fewer cores fill in around larger ones.
+    """
+
+    def __init__( self, tasks = None, pools = None, cpus = None ):
+        """
+        :param tasks: Maximum number of concurrent tasks,
+            or None for no limit. [Default: None]
+        :param pools: Dictionary of { <pool>: <limit> }.
+            Pools without a limit are not limited. [Default: None]
+        :param cpus: Number of cores to pack Scripts onto,
+            or None to ignore core counts. [Default: None]
+        """
+        self.tasks = tasks
+        self.pools = pools or {}
+        self.cpus = cpus
+
+        self._running = 0
+        self._pools_running = {}
+        self._cpus_used = 0
+        self._condition = None  # created in the running loop
+
+
+    @property
+    def limited( self ):
+        """
+        :returns: If any limit is set.
+        """
+        return (
+            ( self.tasks is not None ) or
+            bool( self.pools ) or
+            ( self.cpus is not None )
+        )
+
+
+    def _cores( self, cpus ):
+        """
+        :param cpus: Cores requested.
+        :returns: Cores reserved.
+            Requests larger than the available cores reserve all of them,
+            so they run alone rather than never running.
+        """
+        return 0 if self.cpus is None else min( cpus, self.cpus )
+
+
+    def _available( self, pool, cpus ):
+        """
+        :param pool: Pool of the Script, or None.
+        :param cpus: Cores reserved by the Script.
+        :returns: If the Script can start.
+        """
+        if ( self.tasks is not None ) and ( self._running >= self.tasks ):
+            return False
+
+        if (
+            ( pool in self.pools ) and
+            ( self._pools_running.get( pool, 0 ) >= self.pools[ pool ] )
+        ):
+            return False
+
+        return (
+            ( self.cpus is None ) or
+            ( self._cpus_used + cpus <= self.cpus )
+        )
+
+
+    async def acquire( self, pool = None, cpus = 1 ):
+        """
+        Waits for, then reserves, resources for a Script.
+        Must be paired with #release.
+
+        :param pool: Pool of the Script, or None. [Default: None]
+        :param cpus: Cores used by the Script. [Default: 1]
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        cpus = self._cores( cpus )
+        async with self._condition:
+            await self._condition.wait_for( lambda: self._available( pool, cpus ) )
+
+            self._running += 1
+            self._cpus_used += cpus
+            if pool is not None:
+                self._pools_running[ pool ] = self._pools_running.get( pool, 0 ) + 1
+
+
+    async def release( self, pool = None, cpus = 1 ):
+        """
+        Releases the resources reserved for a Script.
+
+        :param pool: Pool of the Script, or None. [Default: None]
+        :param cpus: Cores used by the Script. [Default: 1]
+        """
+        cpus = self._cores( cpus )
+        async with self._condition:
+            self._running -= 1
+            self._cpus_used -= cpus
+            if pool is not None:
+                self._pools_running[ pool ] -= 1
+
+            self._condition.notify_all()
@@ -5,34 +5,742 @@
 
 import os
 import sys
+import json
+import time
+import asyncio
 import logging
+import tempfile
+import threading
+import subprocess
+from functools import partial
+from time import perf_counter
 
 from thot_core import Runner
+from thot_core.runners import common
 from thot_core.runners.runner_multithread import Runner as RunnerMultithread
+from thot_core.classes.script import ScriptAssociation
 
 from thot.db.local import LocalDB
 
+from ..utils.walk import project_root, read_associations, resolve_path
+from ..utils import pack
+from ..utils.packdb import load_db
+from ..utils.compress import Mounts, has_compressed
+from ..metrics import REGISTRY
+from .lineage import Lineage, TRACE_SCRIPT
+from .resources import Resources, script_resources
+from .cpu import CpuPolicy
+from .profiles import Profiles, PROFILE_SCRIPT, print_profiles
+from .manifest import Manifests, MANIFEST_ENV
+from .prefetch import Prefetcher, PREFETCH_BUDGET, scripted, print_prefetch
+from .assets import AssetChannel, CHANNEL_ENV
+from .logs import TaskLogs, print_status, print_summary
+from . import sample as sampling
+from . import history
+from .queue import Queue, tree_tasks, level_tasks, HEARTBEAT_TIMEOUT, POLL_INTERVAL
+from . import stream
+from . import conditions
+from .stream import post_order
+
+
+# default number of Containers loaded at once when streaming
+STREAM_WINDOW = 16
+
+# default seconds between writes of the metrics file
+METRICS_INTERVAL = 15
+
+TASKS_STARTED = REGISTRY.counter(
+    'thot_tasks_started_total',
+    'Tasks started, by script.',
+    labels = ( 'script', )
+)
+
+TASKS_SUCCEEDED = REGISTRY.counter(
+    'thot_tasks_succeeded_total',
+    'Tasks completed without error, by script.',
+    labels = ( 'script', )
+)
+
+TASKS_FAILED = REGISTRY.counter(
+    'thot_tasks_failed_total',
+    'Tasks that raised an error, by script.',
+    labels = ( 'script', )
+)
+
+TASK_DURATION = REGISTRY.histogram(
+    'thot_task_duration_seconds',
+    'Time a task\'s script ran for, by script.',
+    labels = ( 'script', )
+)
+
+TASK_QUEUE_WAIT = REGISTRY.histogram(
+    'thot_task_queue_wait_seconds',
+    'Time a task waited for a task slot or resources before starting.'
+)
+
+WORKERS_BUSY = REGISTRY.gauge(
+    'thot_workers_busy_ratio',
+    'Fraction of the available task slots running scripts since the run started.'
+)
+
+TREE_LOAD = REGISTRY.counter(
+    'thot_tree_load_seconds_total',
+    'Seconds spent loading Containers, from disk or the metadata pack.'
+)
+
 
 class LocalRunner( Runner ):
     """
     Local project runner.
     """
 
-    def __init__( self, db ):
+    def __init__(
+        self,
+        db,
+        lineage = None,
+        resources = None,
+        cpu_policy = None,
+        profiles = None,
+        prefetcher = None,
+        manifests = None,
+        channel = None,
+        mounts = None,
+        logs = None
+    ):
         """
         Creates a new Local Runner.
         Registers built in hooks.
 
-        :param db: Database to use.
+        :param db: Database to use, or root path to create one.
+            If a path the database is loaded on first use,
+            so streaming runs never load it.
+        :param lineage: Lineage to record the files read and written by scripts to,
+            or None to not record. [Default: None]
+        :param resources: Resources limiting the Scripts run at once,
+            or None to only use the task limit. [Default: None]
+        :param cpu_policy: CpuPolicy sharing cores between scripts,
+            or None to run scripts as is. [Default: None]
+        :param profiles: Profiles to write the profile of each script to,
+            or None to not profile. [Default: None]
+        :param prefetcher: Prefetcher to notify as Containers start,
+            or None to not prefetch. [Default: None]
+        :param manifests: Manifests to write the descendant Assets of each Container to,
+            for its scripts, or None to not write. [Default: None]
+        :param channel: AssetChannel buffering the Assets added by scripts,
+            or None for scripts to write them directly. [Default: None]
+        :param mounts: Mounts copying the decompressed copies of compressed Asset files
+            into place for scripts, or None to not decompress. [Default: None]
+        :param logs: TaskLogs to capture the output of each script to,
+            or None to hold it in memory. [Default: None]
         """
         super().__init__()
-        self.db = db
+        if isinstance( db, LocalDB ):
+            self.__root = db.root
+            self.__db = db
+
+        else:
+            self.__root = os.path.normpath( os.path.abspath( db ) )
+            self.__db = None
+
+        self.lineage = lineage
+        self.resources = resources
+        self.cpu_policy = cpu_policy
+        self.profiles = profiles
+        self.prefetcher = prefetcher
+        self.manifests = manifests
+        self.channel = channel
+        self.mounts = mounts
+        self.logs = logs
+        self.skipped = 0  # tasks whose conditions did not hold
+        self.durations = {}  # task durations keyed by ( <container>, <script> )
+        self.failures = set()  # ( <container>, <script> ) of failed tasks
+        self.__project_root = None
+
+        # metrics
+        self.__queued = {}  # time tasks were queued keyed by ( <container>, <script> )
+        self.__running = 0
+        self.__peak = 0
+        self.__busy = 0  # task seconds
+        self.__start = perf_counter()
 
         # register runner hooks
         self.register( 'get_container', self.get_container() )
         self.register( 'get_script_info', self.script_info() )
 
 
+    @property
+    def root( self ):
+        """
+        :returns: Path to the root Container.
+        """
+        return self.__root
+
+
+    @property
+    def project_root( self ):
+        """
+        :returns: Path to the project root.
+        """
+        if self.__project_root is None:
+            self.__project_root = project_root( self.root )
+
+        return self.__project_root
+
+
+    @property
+    def db( self ):
+        """
+        :returns: Database, loading it if needed.
+        """
+        if self.__db is None:
+            self.__db = load_db( self.root )
+
+        return self.__db
+
+
+    async def eval_tree_stream(
+        self,
+        root,
+        tasks = None,
+        window = None,
+        include = None,
+        **eval_args
+    ):
+        """
+        Runs scripts on the Container tree, loading Containers as they are reached.
+        Containers are visited in the same order as #eval_tree, children first.
+
+        At most `window` Containers are loaded at once,
+        either running their scripts or waiting on their children.
+        A Container is released once its scripts complete,
+        so memory is bounded by the tree depth and window,
+        rather than the size of the tree.
+
+        :param root: Path to the root Container.
+        :param tasks: Maximum number of concurrent tasks.
+            If None, no limit. [Default: None]
+        :param window: Maximum number of Containers loaded at once.
+            If None, uses tasks, or STREAM_WINDOW if tasks is None.
+            [Default: None]
+        :param include: Collection of paths of the Containers to evaluate,
+            including all their ancestors, or None for all. [Default: None]
+        :param **eval_args: Arguments passed to #eval_container.
+        """
+        self._check_hooks()
+        if threading.current_thread() is threading.main_thread():
+            self._register_signal_handlers()
+
+        if ( tasks is not None ) and ( self.semaphore is None ):
+            self.set_semaphore( tasks )
+
+        window = window or tasks or STREAM_WINDOW
+        slots = asyncio.Semaphore( window )
+        proj_root = project_root( root )
+        packed = pack.load( proj_root )
+        pending = {}  # evaluating Containers keyed by path
+        failed = []
+
+        async def _eval( path, children ):
+            """
+            Evaluates a Container once its children complete.
+            """
+            try:
+                # children are always started before their parent,
+                # so any not pending are complete
+                waits = [ pending[ child ] for child in children if child in pending ]
+                if waits:
+                    await asyncio.gather( *waits )
+
+                start = perf_counter()
+                container = stream.load_container( path, proj_root, packed )
+                TREE_LOAD.inc( perf_counter() - start )
+
+                await self.eval_container( container, **eval_args )
+                if self.hooks[ 'complete' ]:
+                    self.hooks[ 'complete' ]()
+
+            finally:
+                slots.release()
+
+
+        def _done( path, task ):
+            del pending[ path ]
+            if not task.cancelled() and ( task.exception() is not None ):
+                failed.append( task.exception() )
+
+
+        try:
+            for ( path, children ) in stream.post_order( root, packed ):
+                if ( include is not None ) and ( path not in include ):
+                    continue
+
+                await slots.acquire()
+                if failed:
+                    break
+
+                task = asyncio.create_task( _eval( path, children ) )
+                task.add_done_callback( partial( _done, path ) )
+                pending[ path ] = task
+
+            if not failed:
+                await asyncio.gather( *pending.values(), return_exceptions = True )
+
+        except asyncio.CancelledError:
+            return
+
+        finally:
+            for task in pending.values():
+                task.cancel()
+
+        if failed:
+            raise failed[ 0 ]
+
+
+    def eval_tree_stream_sync( self, root, **eval_args ):
+        """
+        Evaluate tree streaming.
+        Convenience method so caller does not have to
+        invoke asyncio themselves.
+
+        See #eval_tree_stream for description.
+        """
+        asyncio.run( self.eval_tree_stream( root, **eval_args ) )
+
+
+    async def eval_container( self, container, **eval_args ):
+        """
+        Evaluates Scripts on a Container.
+        If writing manifests, the Container's manifest is written
+        before its scripts run and once they complete.
+
+        :param container: Container to evaluate.
+        :param **eval_args: Arguments passed to Runner#eval_container.
+        """
+        if self.manifests is None:
+            await super().eval_container( container, **eval_args )
+            return
+
+        loop = asyncio.get_running_loop()
+        if container.scripts:
+            await loop.run_in_executor( None, self.manifests.prepare, container._id )
+
+        await super().eval_container( container, **eval_args )
+        await loop.run_in_executor( None, self.manifests.complete, container._id )
+
+
+    def check_conditions( self, container, associations ):
+        """
+        Filters ScriptAssociations by their conditions.
+        See #conditions.
+
+        :param container: Container.
+        :param associations: ScriptAssociations.
+        :returns: List of ScriptAssociations whose conditions hold.
+        :raises ValueError: If a condition is invalid.
+        """
+        assocs = read_associations( container._id, self.project_root )
+        context = conditions.Context( container._id, self.project_root )
+
+        run = []
+        for association in associations:
+            ( script_id, _ ) = self.hooks[ 'get_script_info' ]( association.script )
+            condition = assocs.get( script_id, {} ).get( 'when' )
+            if ( condition is not None ) and not conditions.evaluate( condition, context ):
+                logging.getLogger( __name__ ).info(
+                    f'Skipping script {script_id} on container {container._id}, condition does not hold'
+                )
+
+                self.skipped += 1
+                continue
+
+            run.append( association )
+
+        return run
+
+
+    async def run_scripts( self, container, associations, **run_args ):
+        """
+        Runs the Scripts whose conditions hold on a Container.
+        Conditions are checked in a worker thread.
+        If decompressing, the compressed files of the Container's descendant Assets
+        are linked at their Assets' `file` first.
+
+        :param container: Container.
+        :param associations: ScriptAssociations to run.
+        :param **run_args: Arguments passed to Runner#run_scripts.
+        """
+        loop = asyncio.get_running_loop()
+        associations = await loop.run_in_executor(
+            None, self.check_conditions, container, list( associations )
+        )
+
+        if ( self.mounts is not None ) and associations:
+            await loop.run_in_executor( None, self.mounts.mount, container._id )
+
+        queued = perf_counter()
+        for association in associations:
+            ( script_id, _ ) = self.hooks[ 'get_script_info' ]( association.script )
+            self.__queued[ ( str( container._id ), str( script_id ) ) ] = queued
+
+        await super().run_scripts( container, associations, **run_args )
+        if self.channel is not None:
+            # later scripts and parents read the Container's Assets from disk
+            await loop.run_in_executor( None, self.channel.flush, container._id )
+
+
+    async def run_script( self, script_id, script_path, container_id ):
+        """
+        Runs the given program on the given Container asynchronously.
+        If limiting resources, waits for those declared by the Script's association.
+
+        :param script_id: Id of the script.
+        :param script_path: Path to the script.
+        :param container: Id of the container to run from.
+        :returns: Script output.
+        """
+        if ( self.resources is None ) or not self.resources.limited:
+            return await self._exec_script( script_id, script_path, container_id )
+
+        ( pool, cpus ) = script_resources( container_id, script_id, self.project_root )
+        await self.resources.acquire( pool, cpus )
+        try:
+            return await self._exec_script( script_id, script_path, container_id, cpus = cpus )
+
+        finally:
+            await self.resources.release( pool, cpus )
+
+
+    def script_label( self, script_id ):
+        """
+        :param script_id: Id of the script.
+        :returns: Path of the script relative to the project root, used to label metrics.
+        """
+        return os.path.relpath( script_id, self.project_root )
+
+
+    def busy_ratio( self, slots = None ):
+        """
+        :param slots: Number of task slots, or None to use the most tasks run at once.
+            [Default: None]
+        :returns: Fraction of the task slots running scripts since the runner was created.
+        """
+        slots = slots or self.__peak
+        elapsed = perf_counter() - self.__start
+        if not ( slots and elapsed ):
+            return 0
+
+        return self.__busy / ( slots* elapsed )
+
+
+    async def _exec_script( self, script_id, script_path, container_id, cpus = 1 ):
+        """
+        Runs the given program on the given Container.
+        If recording lineage the script is run by the tracer.
+        If using a CPU policy the script's threads or cores are limited.
+        If profiling the script, it is run by the profiler within the tracer,
+        so the profile only covers the script's code.
+        If prefetching, Assets of upcoming Containers are prefetched.
+        If writing manifests, the path of the Container's manifest is passed to the script.
+        If buffering Assets, the path of the channel is passed to the script.
+        If capturing logs, the script's output is captured to the run's logs,
+        and only the tail of stderr is kept for errors.
+
+        :param script_id: Id of the script.
+        :param script_path: Path to the script.
+        :param container: Id of the container to run from.
+        :param cpus: Cores declared by the script. [Default: 1]
+        :returns: Script output.
+        """
+        start = perf_counter()
+        queued = self.__queued.pop( ( container_id, script_id ), None )
+        if queued is not None:
+            TASK_QUEUE_WAIT.observe( start - queued )
+
+        label = self.script_label( script_id )
+        TASKS_STARTED.inc( script = label )
+        self.__running += 1
+        self.__peak = max( self.__peak, self.__running )
+        try:
+            stdout = await self.__exec_script( script_id, script_path, container_id, cpus = cpus )
+
+        except Exception:
+            TASKS_FAILED.inc( script = label )
+            self.failures.add( ( container_id, script_id ) )
+            raise
+
+        else:
+            TASKS_SUCCEEDED.inc( script = label )
+
+        finally:
+            elapsed = perf_counter() - start
+            self.durations[ ( container_id, script_id ) ] = elapsed
+            TASK_DURATION.observe( elapsed, script = label )
+            self.__running -= 1
+            self.__busy += elapsed
+            if self.logs is not None:
+                print_status( self.logs, running = self.__running )
+
+        return stdout
+
+
+    async def __exec_script( self, script_id, script_path, container_id, cpus = 1 ):
+        """
+        Runs a script on a Container. See #_exec_script.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.visit( container_id )
+
+        env = self.create_thot_env( container_id, script_id )
+        if self.channel is not None:
+            await self.channel.start()
+            env[ CHANNEL_ENV ] = self.channel.path
+
+        if self.manifests is not None:
+            env[ MANIFEST_ENV ] = self.manifests.manifest_path( container_id )
+
+        pinned = None
+        if self.cpu_policy is not None:
+            ( cpu_env, pinned ) = self.cpu_policy.acquire( cpus )
+            env.update( cpu_env )
+
+        args = [ script_path ]
+        if ( self.profiles is not None ) and self.profiles.includes( script_id ):
+            args = [ PROFILE_SCRIPT, self.profiles.task_file( container_id, script_id ) ] + args
+
+        trace_file = None
+        if self.lineage is not None:
+            ( fd, trace_file ) = tempfile.mkstemp( prefix = 'thot-trace-', suffix = '.json' )
+            os.close( fd )
+
+            args = [ TRACE_SCRIPT, trace_file, self.lineage.root ] + args
+
+        cmd = 'python {}'.format( ' '.join( common.escape_path( arg ) for arg in args ) )
+
+        try:
+            proc = await asyncio.create_subprocess_shell(
+                cmd,
+                env = env,
+                stdout = asyncio.subprocess.PIPE,
+                stderr = asyncio.subprocess.PIPE,
+                preexec_fn = CpuPolicy.pin( pinned )
+            )
+
+            self._procs[ proc.pid ] = proc
+            try:
+                if self.logs is None:
+                    stdout, stderr = await proc.communicate()
+
+                else:
+                    # stdout is only needed to collect added assets
+                    ( stdout, stderr ) = await self.logs.capture(
+                        proc,
+                        container_id,
+                        script_id,
+                        keep_stdout = bool( self.hooks[ 'assets_added' ] )
+                    )
+
+                await proc.wait()
+
+            finally:
+                del self._procs[ proc.pid ]
+
+            if stderr:
+                raise subprocess.CalledProcessError(
+                    proc.returncode,
+                    f'[{ container_id }] { cmd }',
+                    stderr = stderr
+                )
+
+            if trace_file is not None:
+                # only record successful runs
+                with open( trace_file ) as f:
+                    self.lineage.record( container_id, script_id, json.load( f ) )
+
+        finally:
+            if trace_file is not None:
+                os.remove( trace_file )
+
+            if pinned is not None:
+                self.cpu_policy.release( pinned )
+
+        return stdout
+
+
+    async def eval_tasks(
+        self,
+        levels,
+        tasks = None,
+        ignore_errors = False,
+        verbose = False
+    ):
+        """
+        Runs individual Scripts on Containers.
+
+        :param levels: List of levels of tasks, each a list of
+            ( <container id>, <script id> ).
+            All tasks of a level complete before the next level starts.
+        :param tasks: Maximum number of concurrent tasks.
+            If None, no limit. [Default: None]
+        :param ignore_errors: Continue running if an error is encountered. [Default: False]
+        :param verbose: Log evaluation information. [Default: False]
+        """
+        self._check_hooks()
+        if threading.current_thread() is threading.main_thread():
+            self._register_signal_handlers()
+
+        if ( tasks is not None ) and ( self.semaphore is None ):
+            self.set_semaphore( tasks )
+
+        for level in levels:
+            # group scripts by container
+            containers = {}
+            for ( container_id, script_id ) in level:
+                containers.setdefault( container_id, [] ).append(
+                    ScriptAssociation( script = script_id )
+                )
+
+            runs = [
+                self.run_scripts(
+                    self.hooks[ 'get_container' ]( container_id ),
+                    assocs,
+                    ignore_errors = ignore_errors,
+                    verbose = verbose
+                )
+                for container_id, assocs in containers.items()
+            ]
+
+            try:
+                await asyncio.gather( *runs )
+
+            except asyncio.CancelledError:
+                return
+
+
+    def eval_tasks_sync( self, levels, **eval_args ):
+        """
+        Evaluate tasks.
+        Convenience method so caller does not have to
+        invoke asyncio themselves.
+
+        See #eval_tasks for description.
+        """
+        asyncio.run( self.eval_tasks( levels, **eval_args ) )
+
+
+    async def eval_queue(
+        self,
+        queue,
+        tasks = None,
+        timeout = HEARTBEAT_TIMEOUT,
+        poll = POLL_INTERVAL,
+        ignore_errors = False,
+        verbose = False
+    ):
+        """
+        Runs tasks from a shared queue as a worker, until no tasks are pending or claimed.
+        Waits for the queue to be created if it does not exist.
+        A task that raises an error is marked failed, and the tasks depending on it fail,
+        but the worker continues with other tasks.
+
+        :param queue: Queue to run tasks from.
+        :param tasks: Maximum number of concurrent tasks.
+            If None, the number of cores. [Default: None]
+        :param timeout: Seconds without a heartbeat before a claimed task is reclaimed.
+            [Default: HEARTBEAT_TIMEOUT]
+        :param poll: Seconds between checks for ready tasks. [Default: POLL_INTERVAL]
+        :param ignore_errors: Continue running if an error is encountered,
+            marking the task done. [Default: False]
+        :param verbose: Log evaluation information. [Default: False]
+        :returns: Dictionary of the number of tasks run by the worker,
+            with keys [ 'done', 'failed' ].
+        """
+        self._check_hooks()
+        if threading.current_thread() is threading.main_thread():
+            self._register_signal_handlers()
+
+        logger = logging.getLogger( __name__ )
+        slots = tasks or os.cpu_count() or 1
+        running = {}  # task keyed by id
+        counts = { 'done': 0, 'failed': 0 }
+
+        async def _run( task_id ):
+            ( container_id, script_id ) = queue.task( task_id )
+            container = stream.load_container( container_id, self.project_root )
+            assocs = [ assoc for assoc in container.scripts if assoc.script == script_id ]
+            if not assocs:
+                raise RuntimeError( 'Script {} is not associated with {}.'.format( script_id, container_id ) )
+
+            await self.run_scripts( container, assocs, ignore_errors = ignore_errors, verbose = verbose )
+
+
+        while not queue.load():
+            await asyncio.sleep( poll )
+
+        beat = 0
+        try:
+            while True:
+                if time.monotonic() - beat > timeout / 3:
+                    queue.heartbeat( running )
+                    for task_id in queue.reclaim( timeout ):
+                        logger.info( f'Reclaimed task {task_id}' )
+
+                    beat = time.monotonic()
+
+                for task_id in queue.ready():
+                    if len( running ) >= slots:
+                        break
+
+                    if ( task_id not in running ) and queue.claim( task_id ):
+                        running[ task_id ] = asyncio.create_task( _run( task_id ) )
+
+                if not running:
+                    if queue.finished():
+                        break
+
+                    await asyncio.sleep( poll )
+                    continue
+
+                ( done, _ ) = await asyncio.wait( running.values(), timeout = poll )
+                for task_id, task in list( running.items() ):
+                    if task not in done:
+                        continue
+
+                    del running[ task_id ]
+                    if task.cancelled():
+                        queue.release( task_id )
+
+                    elif task.exception() is None:
+                        queue.complete( task_id )
+                        counts[ 'done' ] += 1
+
+                    else:
+                        err = task.exception()
+                        logger.error( f'Task {task_id} failed: {err}' )
+                        queue.fail( task_id, err )
+                        counts[ 'failed' ] += 1
+
+        except asyncio.CancelledError:
+            pass
+
+        finally:
+            for task_id, task in running.items():
+                task.cancel()
+                queue.release( task_id )
+
+        return counts
+
+
+    def eval_queue_sync( self, queue, **eval_args ):
+        """
+        Evaluate queue.
+        Convenience method so caller does not have to
+        invoke asyncio themselves.
+
+        See #eval_queue for description.
+        """
+        return asyncio.run( self.eval_queue( queue, **eval_args ) )
+
+
     def script_info( self ):
         """
         Creates a function to return a Script's id and path.
@@ -52,7 +760,7 @@ class LocalRunner( Runner ):
             """
             # local project script paths are prefixed by path id
             script_id = os.path.normpath(  # path to script
-                os.path.join( self.db.root, script_id )
+                os.path.join( self.root, script_id )
             )
 
             # script id and path are the same
@@ -77,8 +785,10 @@ class LocalRunner( Runner ):
             :returns: Container.
             :raises: Error if Container is not found.
             """
+            start = perf_counter()
             _id = os.path.normpath( _id )
             root = self.db.containers.find_one( { '_id': _id } )
+            TREE_LOAD.inc( perf_counter() - start )
 
             if root is None:
                 raise RuntimeError( 'Could not find Container at {}.'.format( _id ) )
@@ -163,34 +873,338 @@ class LocalRunnerMultithread( RunnerMultithread ):
         return _get_container
 
 
-def run( root, **kwargs ):
+def downstream_tasks( lineage, target, root, scripts = None ):
+    """
+    Gets the tasks depending on a file or Asset.
+
+    :param lineage: Lineage.
+    :param target: Path of a file or Asset, see Lineage#resolve.
+    :param root: Path of the root Container, that target is relative to.
+    :param scripts: List of Script paths to limit the tasks to,
+        or None for all. [Default: None]
+    :returns: List of levels of ( <container id>, <script id> ),
+        as used by LocalRunner#eval_tasks.
+        Tasks whose Container or Script no longer exist are excluded.
+    :raises ValueError: If no lineage is recorded for the target.
+    :raises RuntimeError: If no existing task depends on the target.
+    """
+    files = lineage.files( lineage.resolve( target, root ) )
+    if not files:
+        raise ValueError( 'No lineage recorded for {}.'.format( target ) )
+
+    levels = []
+    for level in lineage.order( lineage.downstream( files ) ):
+        level_tasks = []
+        for key in level:
+            task = lineage.tasks[ key ]
+            container = os.path.normpath( os.path.join( lineage.root, task[ 'container' ] ) )
+            script = os.path.normpath( os.path.join( lineage.root, task[ 'script' ] ) )
+            if (
+                not os.path.isdir( container ) or
+                not os.path.isfile( script ) or
+                ( ( scripts is not None ) and ( script not in scripts ) )
+            ):
+                continue
+
+            level_tasks.append( ( container, script ) )
+
+        if level_tasks:
+            levels.append( level_tasks )
+
+    if not levels:
+        raise RuntimeError( 'No tasks downstream of {}.'.format( target ) )
+
+    return levels
+
+
+def run(
+    root,
+    lineage = False,
+    downstream_of = None,
+    stream = False,
+    pools = None,
+    cpus = None,
+    cpu_policy = None,
+    profile = False,
+    profile_scripts = None,
+    prefetch = None,
+    prefetch_budget = PREFETCH_BUDGET,
+    manifest = False,
+    asset_channel = False,
+    capture_logs = False,
+    sample = None,
+    sample_by = 'type',
+    seed = None,
+    coordinator = False,
+    worker = False,
+    heartbeat_timeout = HEARTBEAT_TIMEOUT,
+    metrics_file = None,
+    metrics_interval = METRICS_INTERVAL,
+    **kwargs
+):
     """
     Runs programs bottom up for local projects.
+    The duration of each task is recorded in the project's run history, see #history.
 
     :param root: Path to root.
+    :param lineage: Record the files read and written by each Script,
+        by running each Script under a tracer.
+        Only used for Python 3.7 and above. [Default: False]
+    :param downstream_of: Path of a file or Asset, relative to root.
+        If provided only the Scripts that depend on it are run,
+        as recorded in the lineage graph by runs with lineage. [Default: None]
+    :param stream: Load Containers as they are reached,
+        rather than loading the whole tree up front.
+        The tree is read from the project's metadata pack if it is fresh.
+        Only used for Python 3.7 and above. [Default: False]
+    :param pools: Dictionary of { <pool>: <limit> } limiting
+        the Scripts of each pool run at once.
+        Only used for Python 3.7 and above. [Default: None]
+    :param cpus: Number of cores to pack Scripts onto by their declared cores,
+        or None to ignore core counts.
+        Only used for Python 3.7 and above. [Default: None]
+    :param cpu_policy: How cores are shared between Scripts,
+        one of 'none', 'threads', or 'pin', or None to run Scripts as is. See #cpu.
+        Only used for Python 3.7 and above. [Default: None]
+    :param profile: Profile each Script with cProfile,
+        printing the aggregated profiles once complete.
+        Only used for Python 3.7 and above. [Default: False]
+    :param profile_scripts: List of paths of the Scripts to profile,
+        or None to profile all the Scripts run.
+        Only used when profiling. [Default: None]
+    :param prefetch: Number of Containers ahead to prefetch the Asset files of,
+        or None to not prefetch.
+        The Containers are loaded as they are reached, as when streaming,
+        so they start in the order prefetched.
+        Only used for Python 3.7 and above. [Default: None]
+    :param prefetch_budget: Maximum bytes prefetched for Containers not yet started.
+        [Default: PREFETCH_BUDGET]
+    :param manifest: Pass each Script a manifest of its Container's descendant Assets.
+        Not used when running downstream of a file.
+        Only used for Python 3.7 and above. [Default: False]
+    :param asset_channel: Buffer the Assets added by Scripts with #assets.add_asset
+        in the runner, writing them in batches. See #assets.
+        Only used for Python 3.7 and above. [Default: False]
+    :param capture_logs: Capture the output of each Script to the run's logs,
+        printing a status line and the output of failed Scripts. See #logs.
+        Only used for Python 3.7 and above. [Default: False]
+    :param sample: Number of leaf Containers, or fraction of leaves if less than 1,
+        to run on with their ancestors, or None to run on all. See #sample.
+        The Containers are loaded as they are reached, as when streaming.
+        Only used for Python 3.7 and above. [Default: None]
+    :param sample_by: Property to stratify the sample by. [Default: 'type']
+    :param seed: Random seed of the sample, or None for a random sample. [Default: None]
+    :param coordinator: Write the tasks of the run to the project's queue, see #queue,
+        for workers to run, rather than running them.
+        Only used for Python 3.7 and above. [Default: False]
+    :param worker: Run tasks from the project's queue until none remain,
+        rather than running the tree.
+        Streaming, prefetching, and manifests are not used.
+        Only used for Python 3.7 and above. [Default: False]
+    :param heartbeat_timeout: Seconds without a heartbeat before a worker's
+        claimed task is reclaimed. [Default: HEARTBEAT_TIMEOUT]
+    :param metrics_file: Path to write metrics of the run to, in the Prometheus text format,
+        or None to not write. The file is rewritten atomically every `metrics_interval` seconds,
+        and once the run completes.
+        Only used for Python 3.7 and above. [Default: None]
+    :param metrics_interval: Seconds between writes of the metrics file. [Default: METRICS_INTERVAL]
     :param kwargs: Arguments passed to #eval_tree
     """
     py_version = sys.version_info.major + 0.1* sys.version_info.minor
 
-    db = LocalDB( root )
-    runner = (
-        LocalRunner( db )
-        if py_version >= 3.7 else
-        LocalRunnerMultithread( db )
-    )
-
     if ( 'verbose' in kwargs ) and kwargs[ 'verbose' ]:
         logging.basicConfig( level = logging.INFO )
 
+    if py_version < 3.7:
+        db = LocalDB( root )
+        runner = LocalRunnerMultithread( db )
+
+        # parse scripts if present
+        if (
+            ( 'scripts' in kwargs ) and
+            ( kwargs[ 'scripts' ] is not None )
+        ):
+            kwargs[ 'scripts' ] = [ db.parse_path( path ) for path in kwargs[ 'scripts' ] ]
+
+        runner.eval_tree( root, **kwargs )
+        return
+
+    if coordinator and worker:
+        raise ValueError( 'A run can not be both a coordinator and a worker.' )
+
+    if ( sample is not None ) and ( coordinator or worker or ( downstream_of is not None ) ):
+        raise ValueError( 'Sampled runs can not be queued or run downstream of a file.' )
+
+    tasks = kwargs.get( 'tasks' )
+    resources = None
+    if pools or ( cpus is not None ):
+        # task limit is applied with the other resources,
+        # so tasks waiting on a pool do not hold a task slot
+        kwargs.pop( 'tasks', None )
+        resources = Resources( tasks = tasks, pools = pools, cpus = cpus )
+        if stream:
+            kwargs.setdefault( 'window', tasks )
+
+    # database is only loaded if needed
+    runner = LocalRunner(
+        root,
+        lineage = Lineage( root ) if lineage else None,
+        resources = resources,
+        cpu_policy = None if cpu_policy is None else CpuPolicy( cpu_policy, tasks = tasks, cpus = cpus ),
+        profiles = (
+            Profiles(
+                root,
+                scripts = None if profile_scripts is None else [
+                    resolve_path( path, root, project_root( root ) ) for path in profile_scripts
+                ]
+            )
+            if profile else
+            None
+        )
+    )
+
     # parse scripts if present
     if (
         ( 'scripts' in kwargs ) and
         ( kwargs[ 'scripts' ] is not None )
     ):
-        kwargs[ 'scripts' ] = [ db.parse_path( path ) for path in kwargs[ 'scripts' ] ]
+        proj_root = project_root( root )
+        kwargs[ 'scripts' ] = [ resolve_path( path, root, proj_root ) for path in kwargs[ 'scripts' ] ]
 
-    if isinstance( runner, LocalRunner ):
-        runner.eval_tree_sync( root, **kwargs )
+    levels = None
+    if downstream_of is not None:
+        levels = downstream_tasks(
+            runner.lineage or Lineage( root ),
+            downstream_of,
+            root,
+            scripts = kwargs.pop( 'scripts', None )
+        )
 
-    else:
-        runner.eval_tree( root, **kwargs )
+    if coordinator:
+        queue = Queue( root )
+        queue.create(
+            tree_tasks( root, scripts = kwargs.get( 'scripts' ) )
+            if levels is None else
+            level_tasks( levels )
+        )
+
+        print( 'Queued {} tasks in {}.'.format( len( queue.tasks ), queue.path ) )
+        return
+
+    selection = None
+    if sample is not None:
+        selection = sampling.sample( root, sample, key = sample_by, seed = seed )
+        kwargs[ 'include' ] = selection[ 'containers' ]
+        stream = True
+
+    if capture_logs:
+        runner.logs = TaskLogs( root )
+
+    if asset_channel and AssetChannel.supported():
+        runner.channel = AssetChannel()
+
+    if manifest and ( levels is None ) and not worker:
+        runner.manifests = Manifests( root )
+
+    if has_compressed( root ):
+        runner.mounts = Mounts( root )
+
+    if prefetch and not worker and ( levels is None ):
+        # streamed Containers start in a known order,
+        # loaded trees start theirs as the event loop schedules them
+        stream = True
+
+    if prefetch and not worker:
+        # containers in the order they are expected to start
+        order = (
+            scripted(
+                path for ( path, _ ) in post_order( root )
+                if ( selection is None ) or ( path in selection[ 'containers' ] )
+            )
+            if levels is None else
+            list( dict.fromkeys( container for level in levels for ( container, _ ) in level ) )
+        )
+
+        runner.prefetcher = Prefetcher( order, root, ahead = prefetch, budget = prefetch_budget )
+        runner.prefetcher.fill()
+
+    if metrics_file is not None:
+        REGISTRY.collectors.append( lambda: WORKERS_BUSY.set( runner.busy_ratio( tasks ) ) )
+        REGISTRY.start( metrics_file, interval = metrics_interval )
+
+    start = perf_counter()
+    try:
+        if worker:
+            queue = Queue( root )
+            counts = runner.eval_queue_sync(
+                queue,
+                tasks = tasks,
+                timeout = heartbeat_timeout,
+                ignore_errors = kwargs.get( 'ignore_errors', False ),
+                verbose = kwargs.get( 'verbose', False )
+            )
+
+        elif levels is not None:
+            runner.eval_tasks_sync( levels, **kwargs )
+
+        elif stream:
+            runner.eval_tree_stream_sync( root, **kwargs )
+
+        else:
+            runner.eval_tree_sync( root, **kwargs )
+
+    finally:
+        if runner.lineage is not None:
+            runner.lineage.save()
+
+        if runner.profiles is not None:
+            print_profiles( runner.profiles.aggregate(), runner.profiles.path )
+
+        if runner.prefetcher is not None:
+            runner.prefetcher.close()
+            print_prefetch( runner.prefetcher.stats )
+
+        if runner.channel is not None:
+            runner.channel.close()
+
+        if runner.mounts is not None:
+            runner.mounts.close()
+
+        if runner.logs is not None:
+            runner.logs.close()
+            print_summary( runner.logs )
+
+        if runner.manifests is not None:
+            runner.manifests.close()
+
+        if runner.skipped:
+            print( 'Skipped {} tasks whose conditions did not hold.'.format( runner.skipped ) )
+
+        if runner.durations:
+            history.record(
+                root,
+                history.run_id() if runner.logs is None else os.path.basename( runner.logs.path ),
+                runner.durations,
+                runner.failures,
+                perf_counter() - start,
+                sampled = selection is not None
+            )
+
+        if metrics_file is not None:
+            REGISTRY.stop( metrics_file )
+
+    if selection is not None:
+        sampling.print_projection(
+            sampling.project( selection, runner.durations, root, scripts = kwargs.get( 'scripts' ) ),
+            perf_counter() - start,
+            selection
+        )
+
+    if worker:
+        failed = queue.status()[ 'failed' ]
+        print( 'Ran {} tasks, {} failed. {} tasks of the queue failed.'.format(
+            counts[ 'done' ] + counts[ 'failed' ], counts[ 'failed' ], failed
+        ) )
+
+        if failed:
+            raise RuntimeError( '{} tasks of the queue failed, see {}.'.format( failed, queue.path ) )
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Sampled Runs
+"""
+Runs on a representative subset of a tree, for fast iteration on scripts.
+
+Leaf Containers are sampled at random, stratified by a property such as `type`,
+so each kind of leaf is represented in proportion to the tree.
+Scripts are run on the sampled leaves and their ancestors,
+in the same order as a full run.
+The time of a full run is projected from the durations of the sampled tasks.
+"""
+
+import os
+import json
+import random
+
+from ..utils.walk import CONTAINER_FILE
+from .conditions import MISSING, get_property
+from .queue import tree_tasks
+from .stream import post_order
+
+
+def parse_size( size ):
+    """
+    :param size: Number of leaves as an integer, or fraction of leaves as a float less than 1.
+    :returns: Number of leaves as an int, or fraction as a float.
+    :raises ValueError: If the size is invalid.
+    """
+    value = float( size )
+    if value <= 0:
+        raise ValueError( 'Invalid sample size {}, must be positive.'.format( size ) )
+
+    if value < 1:
+        return value
+
+    if not value.is_integer():
+        raise ValueError( 'Invalid sample size {}, must be an integer or a fraction.'.format( size ) )
+
+    return int( value )
+
+
+def strata( root, key ):
+    """
+    Groups the leaf Containers of a tree by a property.
+
+    :param root: Path to the root Container.
+    :param key: Property to group by, with nested keys separated by dots.
+    :returns: Tuple of ( <strata>, <parents> ), where strata is a dictionary of lists of
+        leaf paths keyed by the JSON of the property value, or None if missing,
+        and parents is a dictionary of the parent path keyed by path.
+    """
+    groups = {}
+    parents = {}
+    for ( path, children ) in post_order( root ):
+        for child in children:
+            parents[ child ] = path
+
+        if children:
+            continue
+
+        try:
+            with open( os.path.join( path, CONTAINER_FILE ) ) as f:
+                value = get_property( json.load( f ), key )
+
+        except ValueError:
+            value = MISSING
+
+        stratum = None if value is MISSING else json.dumps( value, sort_keys = True )
+        groups.setdefault( stratum, [] ).append( path )
+
+    return ( groups, parents )
+
+
+def allocate( sizes, size ):
+    """
+    Allocates a sample between strata in proportion to their sizes,
+    by largest remainder. Each stratum gets at least one leaf if the sample allows.
+
+    :param sizes: Dictionary of stratum sizes.
+    :param size: Total sample size.
+    :returns: Dictionary of the number of leaves sampled from each stratum.
+    """
+    total = sum( sizes.values() )
+    size = min( size, total )
+    if not total:
+        return { stratum: 0 for stratum in sizes }
+
+    shares = { stratum: size* count / total for stratum, count in sizes.items() }
+    counts = { stratum: int( share ) for stratum, share in shares.items() }
+    if size >= len( sizes ):
+        for stratum in counts:
+            counts[ stratum ] = max( counts[ stratum ], 1 )
+
+    order = sorted( sizes, key = lambda stratum: shares[ stratum ] - int( shares[ stratum ] ), reverse = True )
+    index = 0
+    while sum( counts.values() ) < size:
+        stratum = order[ index % len( order ) ]
+        if counts[ stratum ] < sizes[ stratum ]:
+            counts[ stratum ] += 1
+
+        index += 1
+
+    while sum( counts.values() ) > size:
+        # minimums exceeded the sample, take from the largest
+        stratum = max( counts, key = lambda stratum: counts[ stratum ] )
+        counts[ stratum ] -= 1
+
+    return counts
+
+
+def sample( root, size, key = 'type', seed = None ):
+    """
+    Samples the leaf Containers of a tree, stratified by a property.
+
+    :param root: Path to the root Container.
+    :param size: Number of leaves, or fraction of leaves if less than 1.
+    :param key: Property to stratify by. [Default: 'type']
+    :param seed: Random seed, or None for a random sample. [Default: None]
+    :returns: Dictionary with keys
+        + containers: Set of paths of the sampled leaves and their ancestors.
+        + sampled: List of paths of the sampled leaves.
+        + leaves: Dictionary of the stratum of each leaf keyed by path.
+        + strata: Dictionary of the number of leaves of each stratum.
+    """
+    ( groups, parents ) = strata( root, key )
+    sizes = { stratum: len( leaves ) for stratum, leaves in groups.items() }
+    if isinstance( size, float ):
+        size = max( 1, round( size* sum( sizes.values() ) ) )
+
+    rng = random.Random( seed )
+    sampled = []
+    for stratum, count in sorted( allocate( sizes, size ).items(), key = lambda item: str( item[ 0 ] ) ):
+        sampled += rng.sample( sorted( groups[ stratum ] ), count )
+
+    containers = set()
+    for leaf in sampled:
+        path = leaf
+        while ( path is not None ) and ( path not in containers ):
+            containers.add( path )
+            path = parents.get( path )
+
+    leaves = { leaf: stratum for stratum, paths in groups.items() for leaf in paths }
+    return { 'containers': containers, 'sampled': sampled, 'leaves': leaves, 'strata': sizes }
+
+
+def project( selection, durations, root, scripts = None ):
+    """
+    Projects the time of a full run from a sampled run.
+    Each task of the full run is estimated by the mean duration of the sampled tasks
+    of its Script on leaves of the same stratum, or on ancestors for inner Containers,
+    falling back to the mean of its Script, then of all tasks.
+
+    :param selection: Sample, as returned by #sample.
+    :param durations: Dictionary of task durations in seconds keyed by ( <container>, <script> ).
+    :param root: Path to the root Container.
+    :param scripts: List of Script paths run, or None for all. [Default: None]
+    :returns: Dictionary with keys
+        + tasks: Number of tasks of the full run.
+        + sampled: Number of sampled tasks.
+        + time: Total time of the sampled tasks.
+        + projected: Projected total time of the tasks of the full run.
+    """
+    leaves = selection[ 'leaves' ]
+
+    def _group( container ):
+        """
+        :returns: Group of tasks estimated together.
+        """
+        return ( 'leaf', leaves[ container ] ) if container in leaves else ( 'inner', None )
+
+
+    by_group = {}
+    by_script = {}
+    for ( container, script ), duration in durations.items():
+        by_group.setdefault( ( script, _group( container ) ), [] ).append( duration )
+        by_script.setdefault( script, [] ).append( duration )
+
+    mean = lambda values: sum( values ) / len( values )
+    overall = mean( list( durations.values() ) ) if durations else 0
+
+    projected = 0
+    tasks = tree_tasks( root, scripts = scripts )
+    for task in tasks:
+        values = (
+            by_group.get( ( task[ 'script' ], _group( task[ 'container' ] ) ) ) or
+            by_script.get( task[ 'script' ] )
+        )
+
+        projected += mean( values ) if values else overall
+
+    return {
+        'tasks':     len( tasks ),
+        'sampled':   len( durations ),
+        'time':      sum( durations.values() ),
+        'projected': projected
+    }
+
+
+def print_projection( result, elapsed, selection ):
+    """
+    Prints the projected time of a full run.
+
+    :param result: Projection, as returned by #project.
+    :param elapsed: Wall time of the sampled run in seconds.
+    :param selection: Sample, as returned by #sample.
+    """
+    scale = ( result[ 'projected' ] / result[ 'time' ] ) if result[ 'time' ] else 0
+    print( 'Sampled {} of {} leaves in {} strata, {} of {} tasks.'.format(
+        len( selection[ 'sampled' ] ),
+        len( selection[ 'leaves' ] ),
+        len( selection[ 'strata' ] ),
+        result[ 'sampled' ],
+        result[ 'tasks' ]
+    ) )
+
+    print( 'Task time: {:.3f} s sampled, {:.3f} s projected.'.format( result[ 'time' ], result[ 'projected' ] ) )
+    print( 'Run time: {:.3f} s sampled, {:.3f} s projected at the same concurrency.'.format(
+        elapsed, elapsed* scale
+    ) )
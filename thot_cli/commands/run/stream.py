@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming Traversal
+"""
+Lazy traversal of a local project tree for streaming runs.
+
+Containers are read from disk only when they are about to be evaluated,
+and only the information needed to run their scripts is loaded.
+The traversal itself only holds the path of each Container
+on the current branch and the child paths of those Containers.
+Containers are read from the project's metadata pack if it is fresh, see utils#pack.
+"""
+
+import os
+import json
+
+from thot_core.classes.container import Container
+
+from ..utils.walk import CONTAINER_FILE, SCRIPTS_FILE, project_root, resolve_path
+from ..utils import pack
+from ..metrics import metadata_read
+
+
+def child_containers( path, packed = None ):
+    """
+    :param path: Path to a Container.
+    :param packed: pack.Pack to read from, or None to read the folder. [Default: None]
+    :returns: Sorted list of paths of the child Containers.
+    """
+    if ( packed is not None ) and ( path in packed ):
+        return sorted(
+            folder for folder in packed.folder( path )[ 2 ]
+            if CONTAINER_FILE in packed.folder( folder )[ 0 ]
+        )
+
+    children = []
+    with os.scandir( path ) as entries:
+        for entry in entries:
+            if (
+                entry.is_dir() and
+                not entry.name.startswith( '.' ) and
+                os.path.isfile( os.path.join( entry.path, CONTAINER_FILE ) )
+            ):
+                children.append( entry.path )
+
+    children.sort()
+    return children
+
+
+def post_order( root, packed = None ):
+    """
+    Traverses a tree depth first, children before parents.
+    Child Containers are only listed when their parent is entered.
+
+    :param root: Path to the root Container.
+    :param packed: pack.Pack to read from,
+        or None to load the project's pack if it is fresh. [Default: None]
+    :returns: Generator of ( <path>, <child paths> ) for each Container.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    if packed is None:
+        packed = pack.load( project_root( root ) )
+
+    stack = [ ( root, child_containers( root, packed ), 0 ) ]
+    while stack:
+        ( path, children, index ) = stack[ -1 ]
+        if index < len( children ):
+            child = children[ index ]
+            stack[ -1 ] = ( path, children, index + 1 )
+            stack.append( ( child, child_containers( child, packed ), 0 ) )
+
+        else:
+            stack.pop()
+            yield ( path, children )
+
+
+def load_container( path, root, packed = None ):
+    """
+    Loads a Container with only its scripts.
+
+    :param path: Path to the Container.
+    :param root: Project root, used to resolve script paths.
+    :param packed: pack.Pack to read from, or None to read the folder. [Default: None]
+    :returns: Container.
+    :raises RuntimeError: If the scripts file is invalid.
+    """
+    try:
+        if ( packed is not None ) and ( path in packed ):
+            data = packed.folder( path )[ 0 ].get( SCRIPTS_FILE, b'[]' )
+
+        else:
+            with open( os.path.join( path, SCRIPTS_FILE ), 'rb' ) as f:
+                data = f.read()
+
+            metadata_read( len( data ) )
+
+        scripts = json.loads( data )
+
+    except FileNotFoundError:
+        scripts = []
+
+    except ValueError as err:
+        raise RuntimeError( 'Invalid scripts file in {}: {}'.format( path, err ) )
+
+    for assoc in scripts:
+        assoc[ 'script' ] = resolve_path( assoc[ 'script' ], path, root )
+
+    return Container( _id = path, scripts = scripts )
+
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Script Tracer
+"""
+Runs a script, recording the files it opens.
+Used by the runner to record lineage.
+
+Usage: python trace.py <output> <root> <script> [<args>...]
+
+Files opened through Python's `open` and `os.open` are recorded
+using an audit hook, and written to the output file as JSON
+with keys 'reads' and 'writes' once the script exits.
+Only files within the root are recorded,
+excluding the project state folder, where the runner writes its own files.
+The script may be another wrapper, such as the profiler,
+in which case its arguments are passed to it.
+
+This file is run directly so it only depends on the standard library.
+"""
+
+import os
+import sys
+import json
+import runpy
+
+
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+# project state folder, see common#STATE_DIR
+STATE_DIR = '.thot'
+
+
+def trace( output, root, script, *args ):
+    """
+    Runs a script, recording the files it opens.
+
+    :param output: Path to write the opened files to.
+    :param root: Path of the project root.
+        Only files within it, but outside its state folder, are recorded.
+    :param script: Path to the script.
+    :param *args: Arguments passed to the script.
+    """
+    prefix = os.path.join( os.path.abspath( root ), '' )
+    state = os.path.join( prefix, STATE_DIR, '' )
+    reads = set()
+    writes = set()
+
+    def _hook( event, args ):
+        if event != 'open':
+            return
+
+        ( path, mode, flags ) = args
+        if not isinstance( path, ( str, bytes, os.PathLike ) ):
+            # file descriptor
+            return
+
+        path = os.path.abspath( os.fsdecode( path ) )
+        if ( not path.startswith( prefix ) ) or path.startswith( state ):
+            return
+
+        if mode is not None:
+            write = any( char in mode for char in 'wax+' )
+
+        else:
+            write = bool( flags & WRITE_FLAGS )
+
+        ( writes if write else reads ).add( path )
+
+
+    # run script as if it were run directly
+    sys.argv = [ script, *args ]
+    sys.path[ 0 ] = os.path.dirname( os.path.abspath( script ) )
+    sys.addaudithook( _hook )
+
+    try:
+        runpy.run_path( script, run_name = '__main__' )
+
+    finally:
+        # collect before opening the output, so it is not recorded
+        opened = { 'reads': sorted( reads - writes ), 'writes': sorted( writes ) }
+        with open( output, 'w' ) as f:
+            json.dump( opened, f )
+
+
+if __name__ == '__main__':
+    trace( *sys.argv[ 1: ] )
@@ -0,0 +1 @@
+from .cmd import Sync
@@ -0,0 +1,149 @@
+import os
+import sys
+
+from ..command import Command
+from .trees import LocalTree, RemoteTree
+from . import sync
+from . import server
+
+
+# environment variable holding the token of the sync server
+TOKEN_ENV = 'THOT_SYNC_TOKEN'
+
+
+class Sync( Command ):
+    """
+    Thot sync commands.
+    """
+
+    def run( self, args ):
+        """
+        """
+        root = os.path.abspath( args.root )
+
+        if args.action == 'serve':
+            httpd = server.make_server(
+                root,
+                host    = args.host,
+                port    = args.port,
+                token   = args.token,
+                verbose = args.verbose
+            )
+
+            ( host, port ) = httpd.server_address[ :2 ]
+            print( 'Serving {} at http://{}:{}'.format( root, host, port ) )
+            if not args.token:
+                print( 'Token: {}'.format( httpd.token ) )
+
+            try:
+                httpd.serve_forever()
+
+            except KeyboardInterrupt:
+                pass
+
+            finally:
+                httpd.server_close()
+
+            return
+
+        if not args.remote:
+            raise ValueError( 'A remote is required to {}.'.format( args.action ) )
+
+        local = LocalTree( root )
+        remote = RemoteTree( args.remote, token = args.token )
+        ( source, dest ) = ( local, remote ) if ( args.action == 'push' ) else ( remote, local )
+
+        try:
+            stats = sync.sync(
+                source,
+                dest,
+                workers = args.workers,
+                full    = args.full,
+                dry_run = args.dry_run,
+                verbose = args.verbose
+            )
+
+        except ( RuntimeError, ConnectionError ) as err:
+            print( err, file = sys.stderr )
+            sys.exit( 1 )
+
+        sync.print_stats( stats, as_json = args.json )
+
+
+    def init_parser( self, parser ):
+        """
+        Initializes an ArgumentParser for the `sync` command.
+
+        :returns: Sync parser.
+        """
+        parser.add_argument(
+            'action',
+            choices = [ 'push', 'pull', 'serve' ],
+            help = 'Push the local tree to the remote, pull the remote tree, or serve the local tree.'
+        )
+
+        parser.add_argument(
+            '-r', '--root',
+            type = str,
+            default = '.',
+            help = 'Path of the root Container.'
+        )
+
+        parser.add_argument(
+            '--remote',
+            type = str,
+            help = 'URL of the remote tree.'
+        )
+
+        parser.add_argument(
+            '-w', '--workers',
+            type = int,
+            help = 'Number of concurrent transfers.'
+        )
+
+        parser.add_argument(
+            '--full',
+            action = 'store_true',
+            help = 'Compare the files of all objects, including scripts and notes of unchanged Containers.'
+        )
+
+        parser.add_argument(
+            '-n', '--dry-run',
+            action = 'store_true',
+            help = 'Only print the objects that would be transferred or removed.'
+        )
+
+        parser.add_argument(
+            '--host',
+            type = str,
+            default = 'localhost',
+            help = 'Host to serve on. Serving on other hosts exposes the tree to anyone holding the token, which is sent in the clear.'
+        )
+
+        parser.add_argument(
+            '-p', '--port',
+            type = int,
+            default = 8765,
+            help = 'Port to serve on.'
+        )
+
+        parser.add_argument(
+            '--token',
+            type = str,
+            default = os.environ.get( TOKEN_ENV ),
+            help = 'Token of the sync server. Generated and printed when serving if not given. [Default: ${}]'.format( TOKEN_ENV )
+        )
+
+        parser.add_argument(
+            '--json',
+            action = 'store_true',
+            help = 'Output statistics as JSON.'
+        )
+
+        parser.add_argument(
+            '--verbose',
+            action = 'store_true',
+            help = 'Print transferred files, or log requests when serving.'
+        )
+
+        return super().init_parser( parser )
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Sync Server
+"""
+Minimal HTTP server exposing a local tree for syncing.
+Stand-in for a remote, used for testing and for syncing between machines
+on a trusted network.
+
+Requests must carry the server's token as a bearer token,
+as the server can write and remove any object of the tree.
+The token is only a shared secret, sent in the clear over HTTP,
+so the server must not be exposed beyond a trusted network.
+"""
+
+import hmac
+import json
+import secrets
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from .trees import LocalTree, CHUNK_SIZE
+
+
+class SyncRequestHandler( BaseHTTPRequestHandler ):
+    """
+    Handles requests of a #RemoteTree.
+    """
+
+    # keep connections alive
+    protocol_version = 'HTTP/1.1'
+
+
+    def _send( self, status, body = b'', content_type = 'application/octet-stream' ):
+        """
+        Sends a response.
+
+        :param status: HTTP status code.
+        :param body: Response body. [Default: b'']
+        :param content_type: Content type. [Default: 'application/octet-stream']
+        """
+        self.send_response( status )
+        self.send_header( 'Content-Type', content_type )
+        self.send_header( 'Content-Length', str( len( body ) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+
+    def _json( self, data ):
+        """
+        Sends a JSON response, or not found if data is None.
+
+        :param data: Data to send.
+        """
+        if data is None:
+            self._send( 404 )
+            return
+
+        self._send( 200, json.dumps( data ).encode(), 'application/json' )
+
+
+    def _handle( self, method ):
+        """
+        Routes a request to the server's tree.
+
+        :param method: HTTP method.
+        """
+        authorization = self.headers.get( 'Authorization', '' )
+        expected = 'Bearer {}'.format( self.server.token )
+        if not hmac.compare_digest( authorization.encode(), expected.encode() ):
+            self.rfile.read( int( self.headers.get( 'Content-Length', 0 ) ) )
+            self._send( 401, b'Invalid token.', 'text/plain' )
+            return
+
+        url = urlsplit( self.path )
+        route = url.path.rstrip( '/' ).rsplit( '/', 1 )[ -1 ]
+        params = { key: values[ 0 ] for key, values in parse_qs( url.query ).items() }
+
+        length = int( self.headers.get( 'Content-Length', 0 ) )
+        body = self.rfile.read( length ) if length else b''
+
+        tree = self.server.tree
+        chunk_size = int( params.get( 'chunk_size', CHUNK_SIZE ) )
+        try:
+            if ( method, route ) == ( 'GET', 'snapshot' ):
+                self._json( tree.snapshot() )
+
+            elif ( method, route ) == ( 'GET', 'files' ):
+                self._json( tree.files( params[ 'key' ], params[ 'kind' ] ) )
+
+            elif ( method, route ) == ( 'GET', 'chunks' ):
+                self._json( tree.chunks( params[ 'path' ], chunk_size = chunk_size ) )
+
+            elif ( method, route ) == ( 'GET', 'read' ):
+                data = tree.read(
+                    params[ 'path' ],
+                    int( params[ 'offset' ] ),
+                    int( params[ 'length' ] )
+                )
+
+                self._send( 200, data )
+
+            elif ( method, route ) == ( 'POST', 'begin' ):
+                tree.begin( params[ 'path' ] )
+                self._send( 204 )
+
+            elif ( method, route ) == ( 'PUT', 'write' ):
+                tree.write( params[ 'path' ], int( params[ 'offset' ] ), body )
+                self._send( 204 )
+
+            elif ( method, route ) == ( 'POST', 'commit' ):
+                tree.commit(
+                    params[ 'path' ],
+                    int( params[ 'size' ] ),
+                    json.loads( body ),
+                    chunk_size = chunk_size
+                )
+
+                self._send( 204 )
+
+            elif ( method, route ) == ( 'POST', 'remove' ):
+                tree.remove( params[ 'path' ] )
+                self._send( 204 )
+
+            else:
+                self._send( 404 )
+
+        except FileNotFoundError:
+            self._send( 404 )
+
+        except ( KeyError, ValueError, RuntimeError ) as err:
+            self._send( 400, str( err ).encode(), 'text/plain' )
+
+
+    def do_GET( self ):
+        self._handle( 'GET' )
+
+
+    def do_POST( self ):
+        self._handle( 'POST' )
+
+
+    def do_PUT( self ):
+        self._handle( 'PUT' )
+
+
+    def log_message( self, format, *args ):
+        if self.server.verbose:
+            super().log_message( format, *args )
+
+
+def make_server( root, host = 'localhost', port = 0, token = None, verbose = False ):
+    """
+    Creates a sync server.
+
+    :param root: Path to the root of the served tree.
+    :param host: Host to bind to. [Default: 'localhost']
+    :param port: Port to bind to, or 0 for any free port. [Default: 0]
+    :param token: Token clients must send, or None to generate one. [Default: None]
+    :param verbose: Log requests. [Default: False]
+    :returns: ThreadingHTTPServer.
+        The bound address is available as `server.server_address`,
+        and the token as `server.token`.
+    """
+    server = ThreadingHTTPServer( ( host, port ), SyncRequestHandler )
+    server.daemon_threads = True
+    server.tree = LocalTree( root )
+    server.token = token or secrets.token_urlsafe( 32 )
+    server.verbose = verbose
+
+    return server
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Tree Syncing
+"""
+Delta syncing of project trees.
+
+The snapshots of both trees are compared so only subtrees whose
+hashes differ are considered.
+Files of changed objects are compared chunk by chunk,
+and only differing chunks are transferred.
+Chunks are read from the source and written to the destination in a thread pool,
+so reads and writes of different chunks and files overlap.
+"""
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from ..common import format_bytes
+from ..utils import snapshot
+from .trees import LocalTree, CHUNK_SIZE
+
+
+def _empty( snap ):
+    """
+    :param snap: Snapshot to match the algorithm of.
+    :returns: Snapshot of an empty tree.
+    """
+    return {
+        'algorithm': snap[ 'algorithm' ],
+        'nodes': {
+            os.curdir: { 'hash': None, 'meta': None, 'assets': {}, 'children': [] }
+        }
+    }
+
+
+def plan( source, dest ):
+    """
+    Plans a sync.
+
+    :param source: Source snapshot.
+    :param dest: Destination snapshot, or None if the destination is empty.
+    :returns: Tuple of ( <objects>, <removed> ),
+        where objects is a list of ( <kind>, <path> ) of objects to transfer,
+        and removed a list of object paths to remove from the destination.
+    """
+    changes = snapshot.diff( dest or _empty( source ), source )
+
+    objects = []
+    removed = []
+    for ( change, kind, path ) in changes:
+        if change == '-':
+            # removing a folder removes its descendants
+            if not any( path.startswith( os.path.join( parent, '' ) ) for parent in removed ):
+                removed.append( path )
+
+            continue
+
+        objects.append( ( kind, path ) )
+        if ( change == '+' ) and ( kind == 'container' ):
+            # added containers are listed without their assets
+            for name in source[ 'nodes' ][ path ][ 'assets' ]:
+                objects.append( ( 'asset', os.path.normpath( os.path.join( path, name ) ) ) )
+
+    return ( objects, removed )
+
+
+def sync( source, dest, workers = None, full = False, dry_run = False, verbose = False ):
+    """
+    Syncs a destination tree to match a source tree.
+    Script and note files are only compared if their Container changed,
+    use `full` to compare all files.
+
+    :param source: Source tree.
+    :param dest: Destination tree.
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :param full: Compare the files of all objects,
+        not only of those whose hashes differ. [Default: False]
+    :param dry_run: Only report changes. [Default: False]
+    :param verbose: Print transferred files. [Default: False]
+    :returns: Statistics dictionary with keys
+        'objects', 'removed', 'files', 'chunks', 'sent_bytes', and 'skipped_bytes'.
+    :raises RuntimeError: If the source is not a Container.
+    """
+    src_snap = source.snapshot()
+    if src_snap is None:
+        raise RuntimeError( 'Source is not a Container.' )
+
+    ( objects, removed ) = plan( src_snap, dest.snapshot() )
+    if full:
+        # unchanged files are still skipped by comparing chunks
+        ( objects, _ ) = plan( src_snap, None )
+
+    stats = {
+        'objects':       len( objects ),
+        'removed':       len( removed ),
+        'files':         0,
+        'chunks':        0,
+        'sent_bytes':    0,
+        'skipped_bytes': 0
+    }
+
+    if dry_run:
+        for path in removed:
+            print( '- {}'.format( path ) )
+
+        for ( kind, path ) in objects:
+            print( '+ {}{}'.format( path, os.sep if ( kind == 'container' ) else '' ) )
+
+        return stats
+
+    for path in removed:
+        dest.remove( path )
+
+    def _files( item ):
+        """
+        :returns: Tuple of ( <source files>, <destination files> ) of an object.
+        """
+        ( kind, path ) = item
+        return ( source.files( path, kind ), dest.files( path, kind ) )
+
+
+    def _copy_chunk( rel, index ):
+        """
+        Copies a chunk from the source to the destination.
+        """
+        offset = index* CHUNK_SIZE
+        data = source.read( rel, offset, CHUNK_SIZE )
+        dest.write( rel, offset, data )
+        return len( data )
+
+
+    def _transfer( rel ):
+        """
+        Transfers the differing chunks of a file.
+
+        :returns: Tuple of ( <chunk hashes>, <futures of the chunk copies> ),
+            or None if the file is unchanged.
+        """
+        src_hashes = source.chunks( rel )
+        dst_hashes = dest.chunks( rel )
+        if src_hashes == dst_hashes:
+            return None
+
+        dst_hashes = dst_hashes or []
+        dest.begin( rel )
+        futures = [
+            chunk_pool.submit( _copy_chunk, rel, index )
+            for index, digest in enumerate( src_hashes )
+            if ( index >= len( dst_hashes ) ) or ( dst_hashes[ index ] != digest )
+        ]
+
+        return ( src_hashes, futures )
+
+
+    total = 0
+    with ThreadPoolExecutor( max_workers = workers ) as file_pool, \
+            ThreadPoolExecutor( max_workers = workers ) as chunk_pool:
+        deletes = []
+        transfers = []
+        seen = set()
+        for ( ( kind, path ), ( src_files, dst_files ) ) in zip( objects, file_pool.map( _files, objects ) ):
+            deletes += [
+                rel for rel in dst_files
+                if ( rel not in src_files ) and LocalTree.owns( path, kind, rel )
+            ]
+
+            for rel, size in src_files.items():
+                if rel in seen:
+                    continue
+
+                seen.add( rel )
+                total += size
+                transfers.append( ( rel, size, file_pool.submit( _transfer, rel ) ) )
+
+        for ( rel, size, future ) in transfers:
+            result = future.result()
+            if result is None:
+                continue
+
+            ( hashes, futures ) = result
+            for chunk in futures:
+                stats[ 'sent_bytes' ] += chunk.result()
+                stats[ 'chunks' ] += 1
+
+            dest.commit( rel, size, hashes )
+            stats[ 'files' ] += 1
+            if verbose:
+                print( rel )
+
+        for rel in deletes:
+            dest.remove( rel )
+
+    stats[ 'skipped_bytes' ] = total - stats[ 'sent_bytes' ]
+    return stats
+
+
+def print_stats( stats, as_json = False ):
+    """
+    Prints sync statistics.
+
+    :param stats: Statistics, as returned by #sync.
+    :param as_json: Print as JSON. [Default: False]
+    """
+    if as_json:
+        print( json.dumps( stats, indent = 4 ) )
+        return
+
+    print( '{} objects changed, {} removed: sent {} chunks of {} files ({}), {} unchanged.'.format(
+        stats[ 'objects' ],
+        stats[ 'removed' ],
+        stats[ 'chunks' ],
+        stats[ 'files' ],
+        format_bytes( stats[ 'sent_bytes' ] ),
+        format_bytes( stats[ 'skipped_bytes' ] )
+    ) )
@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Sync Trees
+"""
+Local and remote project trees used for syncing.
+Both implement the same interface so a tree can be synced in either direction.
+Paths are relative to the tree's root.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode, quote
+
+from ..utils import snapshot
+from ..utils.walk import (
+    CONTAINER_FILE,
+    ASSET_FILE,
+    SCRIPTS_FILE,
+    NOTES_FOLDER,
+    project_root,
+    resolve_path,
+    stored_file
+)
+
+
+# size of transferred chunks
+CHUNK_SIZE = 1 << 22
+
+
+def chunk_hashes( path, chunk_size = CHUNK_SIZE ):
+    """
+    :param path: Path to a file.
+    :param chunk_size: Size of chunks. [Default: CHUNK_SIZE]
+    :returns: List of hex digests of each chunk of the file.
+    """
+    hashes = []
+    with open( path, 'rb' ) as f:
+        while True:
+            chunk = f.read( chunk_size )
+            if not chunk:
+                break
+
+            hashes.append( hashlib.sha256( chunk ).hexdigest() )
+
+    return hashes
+
+
+class LocalTree():
+    """
+    A project tree on the local file system.
+    """
+
+    def __init__( self, root ):
+        """
+        :param root: Path to the root Container.
+        """
+        self.root = os.path.normpath( os.path.abspath( root ) )
+
+
+    def path( self, rel ):
+        """
+        :param rel: Path relative to the root.
+        :returns: Absolute path.
+        :raises ValueError: If the path is outside of the root.
+        """
+        path = os.path.normpath( os.path.join( self.root, rel ) )
+        if os.path.commonpath( [ self.root, path ] ) != self.root:
+            raise ValueError( 'Path {} is outside of the tree.'.format( rel ) )
+
+        return path
+
+
+    def snapshot( self ):
+        """
+        :returns: Snapshot of the tree, or None if the root is not a Container.
+        """
+        if not os.path.isfile( os.path.join( self.root, CONTAINER_FILE ) ):
+            return None
+
+        return snapshot.snapshot( self.root )
+
+
+    def _add_file( self, files, path ):
+        """
+        Adds a file to a files dictionary if it exists in the tree.
+
+        :param files: Dictionary keyed by file path with values of file size.
+        :param path: Absolute path of the file.
+        """
+        if os.path.isfile( path ) and ( os.path.commonpath( [ self.root, path ] ) == self.root ):
+            files[ os.path.relpath( path, self.root ) ] = os.path.getsize( path )
+
+
+    def _add_folder( self, files, path ):
+        """
+        Adds all files of a folder, excluding hidden files.
+
+        :param files: Dictionary keyed by file path with values of file size.
+        :param path: Absolute path of the folder.
+        """
+        for ( dirpath, dirnames, filenames ) in os.walk( path ):
+            dirnames[:] = [ name for name in dirnames if not name.startswith( '.' ) ]
+            for name in filenames:
+                if not name.startswith( '.' ):
+                    self._add_file( files, os.path.join( dirpath, name ) )
+
+
+    def files( self, key, kind ):
+        """
+        Gets the files of an object.
+        For Containers these are its metadata files, notes,
+        and the scripts it is associated with.
+        For Assets these are all files in the Asset's folder,
+        and its Asset file if it is elsewhere in the tree.
+
+        :param key: Path of the object.
+        :param kind: Kind of the object.
+            Values: [ 'container', 'asset' ]
+        :returns: Dictionary keyed by file path with values of file size.
+        """
+        path = self.path( key )
+        files = {}
+        if kind == 'container':
+            for name in ( CONTAINER_FILE, SCRIPTS_FILE ):
+                self._add_file( files, os.path.join( path, name ) )
+
+            self._add_folder( files, os.path.join( path, NOTES_FOLDER ) )
+            try:
+                with open( os.path.join( path, SCRIPTS_FILE ) ) as f:
+                    assocs = json.load( f )
+
+                for assoc in assocs:
+                    script = resolve_path( assoc[ 'script' ], path, project_root( path ) )
+                    self._add_file( files, script )
+
+            except ( FileNotFoundError, ValueError, TypeError, KeyError ):
+                pass
+
+            return files
+
+        self._add_folder( files, path )
+        try:
+            with open( os.path.join( path, ASSET_FILE ) ) as f:
+                properties = json.load( f )
+
+            file = resolve_path( properties[ 'file' ], path, project_root( path ) )
+            self._add_file( files, stored_file( { **properties, 'file': file } ) )
+
+        except ( FileNotFoundError, ValueError, TypeError, KeyError ):
+            pass
+
+        return files
+
+
+    @staticmethod
+    def owns( key, kind, rel ):
+        """
+        :param key: Path of the object.
+        :param kind: Kind of the object.
+        :param rel: Path of one of the object's files, as returned by #files.
+        :returns: If the file belongs only to the object.
+            Scripts and files referenced by Assets from elsewhere may be shared.
+        """
+        folder = '' if ( key == os.curdir ) else os.path.join( key, '' )
+        if not rel.startswith( folder ):
+            return False
+
+        if kind == 'asset':
+            return True
+
+        rel = rel[ len( folder ): ]
+        return (
+            ( rel in ( CONTAINER_FILE, SCRIPTS_FILE ) ) or
+            rel.startswith( os.path.join( NOTES_FOLDER, '' ) )
+        )
+
+
+    def chunks( self, rel, chunk_size = CHUNK_SIZE ):
+        """
+        :param rel: Path of the file.
+        :param chunk_size: Size of chunks. [Default: CHUNK_SIZE]
+        :returns: List of chunk hashes, or None if the file does not exist.
+        """
+        try:
+            return chunk_hashes( self.path( rel ), chunk_size = chunk_size )
+
+        except FileNotFoundError:
+            return None
+
+
+    def read( self, rel, offset, length ):
+        """
+        :param rel: Path of the file.
+        :param offset: Offset to read from.
+        :param length: Number of bytes to read.
+        :returns: Bytes read.
+        """
+        with open( self.path( rel ), 'rb' ) as f:
+            f.seek( offset )
+            return f.read( length )
+
+
+    def _staging( self, rel ):
+        """
+        :param rel: Path of the file.
+        :returns: Path of the file's staging file.
+        """
+        ( head, tail ) = os.path.split( self.path( rel ) )
+        return os.path.join( head, '.{}.sync'.format( tail ) )
+
+
+    def begin( self, rel ):
+        """
+        Begins writing a file.
+        Writes go to a staging file, starting as a copy of the current file,
+        until committed.
+
+        :param rel: Path of the file.
+        """
+        path = self.path( rel )
+        staging = self._staging( rel )
+        os.makedirs( os.path.dirname( path ), exist_ok = True )
+
+        if os.path.isfile( path ):
+            shutil.copyfile( path, staging )
+
+        else:
+            open( staging, 'wb' ).close()
+
+
+    def write( self, rel, offset, data ):
+        """
+        Writes to a file's staging file.
+
+        :param rel: Path of the file.
+        :param offset: Offset to write at.
+        :param data: Bytes to write.
+        """
+        with open( self._staging( rel ), 'r+b' ) as f:
+            f.seek( offset )
+            f.write( data )
+
+
+    def commit( self, rel, size, hashes, chunk_size = CHUNK_SIZE ):
+        """
+        Verifies a file's staging file and moves it into place.
+
+        :param rel: Path of the file.
+        :param size: Size of the file.
+        :param hashes: Expected chunk hashes.
+        :param chunk_size: Size of chunks. [Default: CHUNK_SIZE]
+        :raises RuntimeError: If the staging file does not match the hashes.
+        """
+        staging = self._staging( rel )
+        with open( staging, 'r+b' ) as f:
+            f.truncate( size )
+            f.flush()
+            os.fsync( f.fileno() )
+
+        if chunk_hashes( staging, chunk_size = chunk_size ) != hashes:
+            os.remove( staging )
+            raise RuntimeError( 'Transfer of {} failed verification.'.format( rel ) )
+
+        os.replace( staging, self.path( rel ) )
+
+
+    def remove( self, rel ):
+        """
+        Removes a file or folder.
+
+        :param rel: Path of the file or folder.
+        """
+        path = self.path( rel )
+        if os.path.isdir( path ):
+            shutil.rmtree( path )
+
+        elif os.path.exists( path ):
+            os.remove( path )
+
+
+class RemoteTree():
+    """
+    A project tree served over HTTP by #server.
+    Each thread uses its own persistent connection.
+    """
+
+    def __init__( self, url, token = None ):
+        """
+        :param url: Base URL of the remote tree.
+        :param token: Token of the server, see server#make_server. [Default: None]
+        :raises ValueError: If the URL is not HTTP.
+        """
+        parts = urlsplit( url )
+        if parts.scheme not in ( 'http', 'https' ):
+            raise ValueError( 'Remote must be an HTTP URL.' )
+
+        self.url = url
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip( '/' )
+        self._headers = {} if token is None else { 'Authorization': 'Bearer {}'.format( token ) }
+        self._local = threading.local()
+
+
+    def _connection( self ):
+        """
+        :returns: HTTP connection of the current thread.
+        """
+        conn = getattr( self._local, 'conn', None )
+        if conn is None:
+            klass = (
+                http.client.HTTPSConnection
+                if self._scheme == 'https' else
+                http.client.HTTPConnection
+            )
+
+            conn = klass( self._netloc )
+            self._local.conn = conn
+
+        return conn
+
+
+    def _request( self, method, route, params = None, body = None ):
+        """
+        Makes a request, retrying once if the connection was closed.
+
+        :param method: HTTP method.
+        :param route: Route name.
+        :param params: Dictionary of query parameters. [Default: None]
+        :param body: Request body. [Default: None]
+        :returns: Tuple of ( <status>, <response body> ).
+        :raises RuntimeError: If the server returns an error.
+        """
+        url = '{}/{}'.format( self._prefix, route )
+        if params:
+            url += '?' + urlencode( params, quote_via = quote )
+
+        for attempt in range( 2 ):
+            conn = self._connection()
+            try:
+                conn.request( method, url, body = body, headers = self._headers )
+                response = conn.getresponse()
+                data = response.read()
+                break
+
+            except ( http.client.HTTPException, ConnectionError ):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+        if response.status >= 400 and response.status != 404:
+            raise RuntimeError( 'Remote error {}: {}'.format( response.status, data.decode() ) )
+
+        return ( response.status, data )
+
+
+    def _json( self, method, route, params = None, body = None ):
+        """
+        :returns: Parsed JSON response, or None if not found.
+        """
+        ( status, data ) = self._request( method, route, params = params, body = body )
+        return None if ( status == 404 ) else json.loads( data )
+
+
+    def snapshot( self ):
+        return self._json( 'GET', 'snapshot' )
+
+
+    def files( self, key, kind ):
+        return self._json( 'GET', 'files', { 'key': key, 'kind': kind } ) or {}
+
+
+    def chunks( self, rel, chunk_size = CHUNK_SIZE ):
+        return self._json( 'GET', 'chunks', { 'path': rel, 'chunk_size': chunk_size } )
+
+
+    def read( self, rel, offset, length ):
+        params = { 'path': rel, 'offset': offset, 'length': length }
+        return self._request( 'GET', 'read', params )[ 1 ]
+
+
+    def begin( self, rel ):
+        self._request( 'POST', 'begin', { 'path': rel } )
+
+
+    def write( self, rel, offset, data ):
+        self._request( 'PUT', 'write', { 'path': rel, 'offset': offset }, body = data )
+
+
+    def commit( self, rel, size, hashes, chunk_size = CHUNK_SIZE ):
+        params = { 'path': rel, 'size': size, 'chunk_size': chunk_size }
+        self._request( 'POST', 'commit', params, body = json.dumps( hashes ).encode() )
+
+
+    def remove( self, rel ):
+        self._request( 'POST', 'remove', { 'path': rel } )
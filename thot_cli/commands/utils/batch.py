@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Batch Utilities
+"""
+Runs many utility operations against a single loaded project tree.
+"""
+
+import os
+import io
+import sys
+import json
+from argparse import Namespace
+from contextlib import redirect_stdout
+from time import perf_counter
+
+
+# argument names of an operation and their defaults
+operation_args = {
+    'function':    None,
+    'root':        None,
+    'search':      None,
+    'scripts':     None,
+    'assets':      None,
+    'containers':  None,
+    'overwrite':   False,
+    'fix':         False,
+    'fix_missing': False,
+    'json':        False,
+    'paths':       [],
+    'kwargs':      None
+}
+
+# arguments passed to functions as JSON strings
+json_args = [ 'search', 'scripts', 'assets', 'containers' ]
+
+# functions whose root is not the root of the tree, and may differ between operations
+own_root = [ 'data_to_assets' ]
+
+
+def _to_json( obj ):
+    """
+    Converts objects JSON can not serialize.
+
+    :param obj: Object.
+    :returns: JSON serializable representation of the object.
+    """
+    if hasattr( obj, '__json__' ):
+        return obj.__json__()
+
+    return str( obj )
+
+
+def parse_operation( op, root = '.' ):
+    """
+    Converts an operation into arguments as parsed from the command line.
+    Argument values may be given as JSON strings, as on the command line,
+    or as JSON values.
+    Operations act on the batch's tree, so may only give a different root
+    if it is not that of the tree, as for data_to_assets.
+
+    :param op: Dictionary describing the operation.
+    :param root: Default root. [Default: '.']
+    :returns: Namespace of arguments.
+    :raises ValueError: If the operation is invalid.
+    """
+    if not isinstance( op, dict ):
+        raise ValueError( 'Operation must be a JSON object.' )
+
+    invalid = [ key for key in op if key not in operation_args ]
+    if invalid:
+        raise ValueError( 'Invalid operation arguments {}.'.format( invalid ) )
+
+    if not op.get( 'function' ):
+        raise ValueError( 'Operation function is required.' )
+
+    if (
+        ( op.get( 'root' ) is not None ) and
+        ( op[ 'function' ] not in own_root ) and
+        ( os.path.abspath( op[ 'root' ] ) != os.path.abspath( root ) )
+    ):
+        raise ValueError( 'Operation root must be the batch root {}.'.format( root ) )
+
+    args = { **operation_args, 'root': root, **op }
+    for key in json_args:
+        if ( args[ key ] is not None ) and ( not isinstance( args[ key ], str ) ):
+            args[ key ] = json.dumps( args[ key ] )
+
+    if isinstance( args[ 'kwargs' ], str ):
+        args[ 'kwargs' ] = json.loads( args[ 'kwargs' ] )
+
+    return Namespace( **args )
+
+
+def read_operations( source ):
+    """
+    Reads operations from a JSON lines file.
+    Blank lines are ignored.
+
+    :param source: Path to the file, or '-' for stdin.
+    :returns: Generator of tuples of ( <line number>, <line> ).
+    """
+    f = sys.stdin if ( source == '-' ) else open( source )
+    try:
+        for index, line in enumerate( f ):
+            line = line.strip()
+            if line:
+                yield ( index + 1, line )
+
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def run( cmd, util, source, root = '.' ):
+    """
+    Runs utility operations from a JSON lines file.
+    Operations run in order against the same tree,
+    with metadata writes coalesced and flushed once all have run.
+    A JSON report is printed for each operation.
+    Output printed by an operation is captured into its report,
+    as its result if it returns none, otherwise in 'output'.
+
+    :param cmd: Utils command used to call each function.
+    :param util: ThotUtilities to run the operations on.
+    :param source: Path to the operations file, or '-' for stdin.
+    :param root: Default root for operations. [Default: '.']
+    :returns: Number of failed operations.
+    """
+    failed = 0
+    with util.buffered():
+        for ( line_num, line ) in read_operations( source ):
+            report = { 'line': line_num, 'function': None }
+            start = perf_counter()
+
+            try:
+                args = parse_operation( json.loads( line ), root = root )
+                report[ 'function' ] = args.function
+                if args.function == 'batch':
+                    raise ValueError( 'Batches can not be nested.' )
+
+                util.refresh()
+                output = io.StringIO()
+                with redirect_stdout( output ):
+                    result = cmd.call( util, args )
+
+            except Exception as err:
+                failed += 1
+                report[ 'status' ] = 'error'
+                report[ 'error' ] = '{}: {}'.format( type( err ).__name__, err )
+
+            else:
+                report[ 'status' ] = 'ok'
+                if isinstance( result, list ):
+                    result = [ getattr( obj, '_id', obj ) for obj in result ]
+
+                output = output.getvalue()
+                if result is None:
+                    result = output or None
+
+                elif output:
+                    report[ 'output' ] = output
+
+                report[ 'result' ] = result
+
+            report[ 'time' ] = perf_counter() - start
+            print( json.dumps( report, default = _to_json ) )
+
+    return failed
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Asset Checksums
+"""
+Checksums of Asset files and duplicate detection.
+
+Files are hashed in a thread pool.
+hashlib releases the GIL while hashing,
+so hashing runs in parallel across cores.
+"""
+
+import os
+import json
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from ..common import state_path, write_atomic, format_bytes
+from .walk import load_assets, stored_file
+
+
+MANIFEST_FILE = 'checksums.json'
+
+# files larger than this are memory mapped
+MMAP_THRESHOLD = 1 << 20
+
+# bytes hashed at a time
+CHUNK_SIZE = 1 << 23
+
+
+def hash_file( path, algorithm = 'sha256' ):
+    """
+    Hashes a file.
+    Large files are memory mapped and hashed in chunks.
+
+    :param path: Path to the file.
+    :param algorithm: hashlib algorithm. [Default: 'sha256']
+    :returns: Hex digest of the file.
+    """
+    h = hashlib.new( algorithm )
+    with open( path, 'rb' ) as f:
+        size = os.fstat( f.fileno() ).st_size
+        if size < MMAP_THRESHOLD:
+            h.update( f.read() )
+            return h.hexdigest()
+
+        with mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ ) as mm:
+            if hasattr( mm, 'madvise' ):
+                mm.madvise( mmap.MADV_SEQUENTIAL )
+
+            with memoryview( mm ) as view:
+                for start in range( 0, size, CHUNK_SIZE ):
+                    h.update( view[ start : start + CHUNK_SIZE ] )
+
+    return h.hexdigest()
+
+
+def load_manifest( root ):
+    """
+    :param root: Path to the project root.
+    :returns: Checksum manifest of the project,
+        or an empty manifest if it does not exist.
+    """
+    try:
+        with open( state_path( root, MANIFEST_FILE ) ) as f:
+            return json.load( f )
+
+    except ( FileNotFoundError, ValueError ):
+        return { 'algorithm': None, 'files': {} }
+
+
+def save_manifest( root, manifest ):
+    """
+    :param root: Path to the project root.
+    :param manifest: Checksum manifest.
+    """
+    write_atomic( state_path( root, MANIFEST_FILE ), json.dumps( manifest ) )
+
+
+def checksums( root, algorithm = 'sha256', workers = None, refresh = False ):
+    """
+    Computes the checksums of all Asset files of a tree.
+    Checksums are stored in a manifest in the project keyed by
+    path, size, and modification time,
+    so only new or modified files are hashed.
+    A file referenced by several Assets is hashed once.
+
+    :param root: Path to the root Container.
+    :param algorithm: hashlib algorithm. [Default: 'sha256']
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :param refresh: Rehash all files. [Default: False]
+    :returns: Tuple of ( <files>, <stats> ).
+        files is a dictionary keyed by Asset file path, relative to the root,
+        with values of dictionaries with keys 'assets', 'size', 'mtime', and 'hash',
+        where assets is a sorted list of the paths of the Assets referencing the file.
+        stats is a dictionary with keys 'hashed', 'hashed_bytes', 'cached', and 'missing'.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    manifest = load_manifest( root )
+    cached = (
+        manifest[ 'files' ]
+        if ( not refresh ) and ( manifest[ 'algorithm' ] == algorithm ) else
+        {}
+    )
+
+    stats = { 'hashed': 0, 'hashed_bytes': 0, 'cached': 0, 'missing': 0 }
+    files = {}
+    to_hash = []
+    for ( asset, properties ) in load_assets( root, workers = workers ):
+        path = stored_file( properties )
+        key = os.path.relpath( path, root )
+        if key in files:
+            # referenced by another asset
+            files[ key ][ 'assets' ].append( os.path.relpath( asset, root ) )
+            continue
+
+        try:
+            st = os.stat( path )
+
+        except FileNotFoundError:
+            stats[ 'missing' ] += 1
+            continue
+
+        entry = {
+            'assets': [ os.path.relpath( asset, root ) ],
+            'size':   st.st_size,
+            'mtime':  st.st_mtime_ns,
+            'hash':   None
+        }
+
+        prev = cached.get( key )
+        if (
+            ( prev is not None ) and
+            ( prev[ 'size' ] == entry[ 'size' ] ) and
+            ( prev[ 'mtime' ] == entry[ 'mtime' ] )
+        ):
+            entry[ 'hash' ] = prev[ 'hash' ]
+            stats[ 'cached' ] += 1
+
+        else:
+            to_hash.append( ( key, path ) )
+
+        files[ key ] = entry
+
+    for entry in files.values():
+        entry[ 'assets' ].sort()
+
+    with ThreadPoolExecutor( max_workers = workers ) as executor:
+        hashes = executor.map(
+            lambda item: hash_file( item[ 1 ], algorithm = algorithm ),
+            to_hash
+        )
+
+        for ( ( key, _ ), digest ) in zip( to_hash, hashes ):
+            files[ key ][ 'hash' ] = digest
+            stats[ 'hashed' ] += 1
+            stats[ 'hashed_bytes' ] += files[ key ][ 'size' ]
+
+    save_manifest( root, { 'algorithm': algorithm, 'files': files } )
+
+    return ( files, stats )
+
+
+def duplicates( root, files ):
+    """
+    Finds duplicate files.
+
+    :param root: Path to the root Container.
+    :param files: Files, as returned by #checksums.
+    :returns: List of groups of duplicate files, largest reclaimable size first.
+        Each group is a dictionary with keys
+        'hash', 'size', 'files', and 'reclaimable'.
+        Files which are already hard links of each other are not reclaimable.
+    """
+    groups = {}
+    for key, entry in files.items():
+        groups.setdefault( ( entry[ 'hash' ], entry[ 'size' ] ), [] ).append( key )
+
+    dups = []
+    for ( ( digest, size ), keys ) in groups.items():
+        if len( keys ) < 2:
+            continue
+
+        keys.sort()
+        group = {
+            'hash':  digest,
+            'size':  size,
+            'files': keys
+        }
+
+        group[ 'reclaimable' ] = reclaimable( root, group )
+        dups.append( group )
+
+    dups.sort( key = lambda group: group[ 'reclaimable' ], reverse = True )
+    return dups
+
+
+def link_duplicates( root, files, dups ):
+    """
+    Replaces duplicate files with hard links to the first file of their group.
+    Files are only linked if they are unchanged since they were hashed
+    and are on the same device.
+
+    Hard linked files share their contents,
+    so writing to one in place modifies all of them.
+
+    :param root: Path to the root Container.
+    :param files: Files, as returned by #checksums.
+    :param dups: Duplicate groups, as returned by #duplicates.
+    :returns: Number of bytes reclaimed.
+        Files removed since they were hashed are skipped.
+    """
+    def _unchanged( key, st ):
+        """
+        :returns: If the file is unchanged since it was hashed.
+        """
+        return (
+            ( st.st_size == files[ key ][ 'size' ] ) and
+            ( st.st_mtime_ns == files[ key ][ 'mtime' ] )
+        )
+
+
+    root = os.path.normpath( os.path.abspath( root ) )
+    reclaimed = 0
+    for group in dups:
+        ( source_key, *target_keys ) = group[ 'files' ]
+        source = os.path.join( root, source_key )
+        try:
+            src_stat = os.stat( source )
+
+        except FileNotFoundError:
+            continue
+
+        if not _unchanged( source_key, src_stat ):
+            continue
+
+        for target_key in target_keys:
+            target = os.path.join( root, target_key )
+            try:
+                tgt_stat = os.stat( target )
+
+            except FileNotFoundError:
+                continue
+
+            if (
+                ( tgt_stat.st_dev != src_stat.st_dev ) or
+                ( tgt_stat.st_ino == src_stat.st_ino ) or
+                not _unchanged( target_key, tgt_stat )
+            ):
+                # different device, already linked, or modified
+                continue
+
+            tmp_path = os.path.join(
+                os.path.dirname( target ),
+                '.{}.link'.format( os.path.basename( target ) )
+            )
+
+            try:
+                os.link( source, tmp_path )
+                os.replace( tmp_path, target )
+
+            except FileNotFoundError:
+                # removed while linking
+                if os.path.lexists( tmp_path ):
+                    os.remove( tmp_path )
+
+                continue
+
+            reclaimed += group[ 'size' ]
+
+    return reclaimed
+
+
+def reclaimable( root, group ):
+    """
+    :param root: Path to the root Container.
+    :param group: Duplicate group, as returned by #duplicates.
+    :returns: Number of bytes that would be reclaimed by linking the group.
+    """
+    inodes = set()
+    for key in group[ 'files' ]:
+        try:
+            st = os.stat( os.path.join( root, key ) )
+
+        except FileNotFoundError:
+            continue
+
+        inodes.add( ( st.st_dev, st.st_ino ) )
+
+    return group[ 'size' ]* max( len( inodes ) - 1, 0 )
+
+
+def print_checksums( files, stats, as_json = False ):
+    """
+    Prints checksums.
+
+    :param files: Files, as returned by #checksums.
+    :param stats: Statistics, as returned by #checksums.
+    :param as_json: Print as JSON. [Default: False]
+    """
+    if as_json:
+        print( json.dumps( { 'files': files, 'stats': stats }, indent = 4 ) )
+        return
+
+    for key in sorted( files ):
+        print( '{}  {}'.format( files[ key ][ 'hash' ], key ) )
+
+    print( 'Hashed {} files ({}), {} cached, {} missing.'.format(
+        stats[ 'hashed' ],
+        format_bytes( stats[ 'hashed_bytes' ] ),
+        stats[ 'cached' ],
+        stats[ 'missing' ]
+    ) )
+
+
+def print_duplicates( dups, reclaimed = None, as_json = False ):
+    """
+    Prints duplicate groups.
+
+    :param dups: Duplicate groups, as returned by #duplicates.
+    :param reclaimed: Bytes reclaimed by linking, or None if not linked. [Default: None]
+    :param as_json: Print as JSON. [Default: False]
+    """
+    total = sum( group[ 'reclaimable' ] for group in dups )
+
+    if as_json:
+        print( json.dumps( {
+            'duplicates':  dups,
+            'reclaimable': total,
+            'reclaimed':   reclaimed
+        }, indent = 4 ) )
+
+        return
+
+    for group in dups:
+        print( '{} x {} ({} reclaimable) {}'.format(
+            len( group[ 'files' ] ),
+            format_bytes( group[ 'size' ] ),
+            format_bytes( group[ 'reclaimable' ] ),
+            group[ 'hash' ]
+        ) )
+
+        for key in group[ 'files' ]:
+            print( '\t{}'.format( key ) )
+
+    print( '{} duplicate groups, {} reclaimable.'.format( len( dups ), format_bytes( total ) ) )
+    if reclaimed is not None:
+        print( '{} reclaimed.'.format( format_bytes( reclaimed ) ) )
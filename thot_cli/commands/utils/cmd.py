@@ -1,8 +1,51 @@
 import os
+import sys
 import json
+from time import perf_counter
+from datetime import datetime
 
 from ..command import Command
+from ..common import format_bytes
+from ..metrics import REGISTRY
 from .utilities import ThotUtilities
+from . import batch
+from . import du
+from . import fsck
+from . import compress
+from . import pack
+from . import walk
+from . import gc
+from . import checksum
+from . import snapshot
+from ..run import lineage
+
+
+# default seconds between writes of the metrics file
+METRICS_INTERVAL = 15
+
+OPERATIONS = REGISTRY.counter(
+    'thot_utils_operations_total',
+    'Utility operations run, by function.',
+    labels = ( 'function', )
+)
+
+OPERATIONS_FAILED = REGISTRY.counter(
+    'thot_utils_operations_failed_total',
+    'Utility operations that raised an error, by function.',
+    labels = ( 'function', )
+)
+
+OPERATION_DURATION = REGISTRY.histogram(
+    'thot_utils_operation_duration_seconds',
+    'Time utility operations ran for, by function.',
+    labels = ( 'function', )
+)
+
+OBJECTS_MODIFIED = REGISTRY.counter(
+    'thot_utils_objects_modified_total',
+    'Objects modified by utility operations, by function.',
+    labels = ( 'function', )
+)
 
 
 class Utils( Command ):
@@ -10,9 +53,107 @@ class Utils( Command ):
     Thot utilities commands.
     """
 
+    # functions returning modified objects
+    modifying_functions = (
+        'add_scripts',
+        'remove_scripts',
+        'set_scripts',
+        'add_assets',
+        'remove_assets',
+        'add_containers',
+        'remove_containers'
+    )
+
+
     def run( self, args ):
         """
         """
+        if args.metrics_file is None:
+            self.run_function( args )
+            return
+
+        REGISTRY.start( args.metrics_file, interval = args.metrics_interval )
+        try:
+            self.run_function( args )
+
+        finally:
+            REGISTRY.stop( args.metrics_file )
+
+
+    def run_function( self, args ):
+        """
+        Runs the utility function, printing its results.
+
+        :param args: Parsed arguments.
+        """
+        # TODO [0]: Fix parse errors for Windows machines
+        util = ThotUtilities( os.path.abspath( args.root ) )
+        fcn  = args.function
+
+        if fcn == 'batch':
+            source = args.paths[ 0 ] if args.paths else '-'
+            failed = batch.run( self, util, source, root = args.root )
+            if failed:
+                sys.exit( 1 )
+
+            return
+
+        result = self.call( util, args )
+
+        if fcn == 'data_to_assets':
+            print( result )
+
+        elif fcn == 'fsck':
+            ( errors, _ ) = fsck.count_issues( result )
+            if errors:
+                sys.exit( 1 )
+
+        elif fcn == 'diff':
+            if result:
+                sys.exit( 1 )
+
+        elif fcn == 'gc':
+            if result[ 'failed' ]:
+                sys.exit( 1 )
+
+        elif ( fcn in self.modifying_functions ) and result:
+            for obj in result:
+                print( obj._id )
+
+
+    def call( self, util, args ):
+        """
+        Calls a single utility function, recording its metrics.
+
+        :param util: ThotUtilities to call the function on.
+        :param args: Parsed arguments, with the function name in `function`.
+        :returns: Result of the function.
+            For modifying functions a list of the modified objects.
+        :raises ValueError: If the function is invalid.
+        """
+        fcn = args.function
+        OPERATIONS.inc( function = fcn )
+        start = perf_counter()
+        try:
+            result = self._call( util, args )
+
+        except Exception:
+            OPERATIONS_FAILED.inc( function = fcn )
+            raise
+
+        finally:
+            OPERATION_DURATION.observe( perf_counter() - start, function = fcn )
+
+        if ( fcn in self.modifying_functions ) and result:
+            OBJECTS_MODIFIED.inc( len( result ), function = fcn )
+
+        return result
+
+
+    def _call( self, util, args ):
+        """
+        Calls a single utility function. See #call.
+        """
 
         def _arg_to_json( arg, default = None ):
             """
@@ -46,12 +187,10 @@ class Utils( Command ):
                 params = { key: val for key, val in params.items() if key in defaults }
 
             return params
-        
 
-        # TODO [0]: Fix parse errors for Windows machines
+
         modified = None
-        util = ThotUtilities( os.path.abspath( args.root ) )
-        fcn  = args.function
+        fcn = args.function
 
         if fcn == 'add_scripts':
             scripts = json.loads( args.scripts )
@@ -98,7 +237,7 @@ class Utils( Command ):
                 # attempt as function
                 properties = eval( args.assets )
 
-            defaults = [ '_id', 'rename' ]
+            defaults = { '_id': None, 'rename': None, 'container': None, 'strategy': 'auto' }
             kwargs = set_defaults( args.kwargs, defaults )
 
             # parse _id as function
@@ -121,16 +260,16 @@ class Utils( Command ):
             else:
                 rename = kwargs[ 'rename' ]
 
-            assets = util.data_to_asset(
+            modified = util.data_to_asset(
                 args.root,
                 search = args.search,
                 properties = properties,
                 _id = _id,
-                rename = rename
+                rename = rename,
+                container = kwargs[ 'container' ],
+                strategy = kwargs[ 'strategy' ]
             )
 
-            print( assets )
-
         elif fcn == 'add_containers':
             containers = json.loads( args.containers )
             search = json.loads( args.search )
@@ -150,15 +289,131 @@ class Utils( Command ):
 
             util.print_tree( properties = properties, assets = assets, scripts = scripts )
 
-        else:
-            raise ValueError( 'Invalid function {}. Use `python -m thot.utilities -h` for help.' )
+        elif fcn == 'du':
+            kwargs = set_defaults( args.kwargs, { 'sort': 'path', 'workers': None, 'refresh': False } )
 
+            stats = du.disk_usage( util.root, workers = kwargs[ 'workers' ], refresh = kwargs[ 'refresh' ] )
+            du.print_usage( stats, util.root, sort = kwargs[ 'sort' ], as_json = args.json )
 
-        if modified:
-            for obj in modified:
-                print( obj._id )
+        elif fcn == 'fsck':
+            kwargs = set_defaults( args.kwargs, [ 'workers', 'processes' ] )
 
+            modified = fsck.check( util.root, workers = kwargs[ 'workers' ], processes = kwargs[ 'processes' ] )
+            if args.fix or args.fix_missing:
+                fsck.fix( modified[ 'issues' ], missing_files = args.fix_missing )
 
+            fsck.print_report( modified, as_json = args.json )
+
+        elif fcn == 'checksum':
+            kwargs = set_defaults( args.kwargs, { 'algorithm': 'sha256', 'workers': None, 'refresh': False } )
+
+            ( files, stats ) = checksum.checksums( util.root, **kwargs )
+            checksum.print_checksums( files, stats, as_json = args.json )
+
+        elif fcn == 'dedupe':
+            defaults = { 'algorithm': 'sha256', 'workers': None, 'hardlink': False }
+            kwargs = set_defaults( args.kwargs, defaults )
+
+            ( files, _ ) = checksum.checksums(
+                util.root,
+                algorithm = kwargs[ 'algorithm' ],
+                workers = kwargs[ 'workers' ]
+            )
+
+            dups = checksum.duplicates( util.root, files )
+            reclaimed = (
+                checksum.link_duplicates( util.root, files, dups )
+                if kwargs[ 'hardlink' ] else
+                None
+            )
+
+            checksum.print_duplicates( dups, reclaimed = reclaimed, as_json = args.json )
+
+        elif fcn == 'snapshot':
+            kwargs = set_defaults( args.kwargs, { 'algorithm': 'sha256', 'workers': None } )
+
+            name = (
+                args.paths[ 0 ]
+                if args.paths else
+                datetime.now().strftime( '%Y%m%d-%H%M%S' )
+            )
+
+            snap = snapshot.snapshot( util.root, **kwargs )
+            path = snapshot.snapshot_path( util.root, name )
+            snapshot.save( snap, path )
+
+            print( '{}  {}'.format( snap[ 'nodes' ][ os.curdir ][ 'hash' ], path ) )
+
+        elif fcn == 'diff':
+            if not ( 1 <= len( args.paths ) <= 2 ):
+                raise ValueError( 'diff requires one or two snapshots or Containers.' )
+
+            kwargs = set_defaults( args.kwargs, { 'algorithm': 'sha256', 'workers': None } )
+            sources = args.paths if ( len( args.paths ) == 2 ) else [ args.paths[ 0 ], util.root ]
+            ( a, b ) = [ snapshot.resolve( source, util.root, **kwargs ) for source in sources ]
+
+            modified = snapshot.diff( a, b )
+            snapshot.print_diff( modified, as_json = args.json )
+
+        elif fcn == 'lineage':
+            if len( args.paths ) != 1:
+                raise ValueError( 'lineage requires one file or Asset.' )
+
+            graph = lineage.Lineage( util.root )
+            lineage.print_lineage( graph, graph.resolve( args.paths[ 0 ], util.root ), as_json = args.json )
+
+        elif fcn == 'gc':
+            kwargs = set_defaults( args.kwargs, { 'workers': None } )
+            older_than = None if ( args.older_than is None ) else gc.parse_age( args.older_than )
+
+            modified = gc.gc(
+                util.root,
+                older_than = older_than,
+                dry_run = args.dry_run,
+                workers = kwargs[ 'workers' ]
+            )
+
+            gc.print_report( modified, as_json = args.json )
+
+        elif fcn == 'compress':
+            defaults = { 'codec': compress.DEFAULT_CODEC, 'level': None, 'workers': None }
+            kwargs = set_defaults( args.kwargs, defaults )
+            older_than = None if ( args.older_than is None ) else gc.parse_age( args.older_than )
+
+            modified = compress.compress(
+                util.root,
+                older_than = older_than,
+                dry_run = args.dry_run,
+                **kwargs
+            )
+
+            compress.print_report( modified, as_json = args.json )
+
+        elif fcn == 'pack':
+            kwargs = set_defaults( args.kwargs, { 'workers': None } )
+            root = walk.project_root( util.root )
+
+            modified = pack.write( root, walk.read_tree( root, workers = kwargs[ 'workers' ], packed = False ) )
+            print( 'Packed {} files ({}) of {} folders into {} ({}).'.format(
+                modified[ 'files' ],
+                format_bytes( modified[ 'bytes' ] ),
+                modified[ 'folders' ],
+                modified[ 'path' ],
+                format_bytes( modified[ 'size' ] )
+            ) )
+
+        elif fcn == 'unpack':
+            kwargs = set_defaults( args.kwargs, { 'keep': False } )
+
+            modified = pack.unpack( walk.project_root( util.root ), keep = kwargs[ 'keep' ] )
+            print( 'Unpacked {} folders, wrote {} of {} files.'.format(
+                modified[ 'folders' ], modified[ 'written' ], modified[ 'files' ]
+            ) )
+
+        else:
+            raise ValueError( 'Invalid function {}. Use `python -m thot.utilities -h` for help.'.format( fcn ) )
+
+        return modified
 
 
     def init_parser( self, parser ):
@@ -174,6 +429,12 @@ class Utils( Command ):
             help = 'Function to run.'
         )
 
+        parser.add_argument(
+            'paths',
+            nargs = '*',
+            help = 'Additional paths. Use depends on function.'
+        )
+
         parser.add_argument(
             '-r', '--root',
             type = str,
@@ -211,12 +472,55 @@ class Utils( Command ):
             help = 'Allows overwriting objects if they already exist.'
         )
 
+        parser.add_argument(
+            '--fix',
+            action = 'store_true',
+            help = 'Fix issues that can be fixed automatically, if supported by the function.'
+        )
+
+        parser.add_argument(
+            '--fix-missing',
+            action = 'store_true',
+            help = 'For fsck, also fix Assets whose file is missing by removing them. Check the files are not only missing for a time, such as on an unmounted volume.'
+        )
+
+        parser.add_argument(
+            '--json',
+            action = 'store_true',
+            help = 'Output results as JSON, if supported by the function.'
+        )
+
+        parser.add_argument(
+            '--dry-run',
+            action = 'store_true',
+            help = 'Report what would be changed without changing it, if supported by the function.'
+        )
+
+        parser.add_argument(
+            '--older-than',
+            type = str,
+            help = 'Only include objects last changed longer ago than this age, in seconds or with a unit of s, m, h, d, or w, if supported by the function. e.g. 7d'
+        )
+
         parser.add_argument(
             '--kwargs',
             type = json.loads,
             help = 'Additional keyword arguments. Allowed values depends on the function being called.'
         )
 
+        parser.add_argument(
+            '--metrics-file',
+            type = str,
+            help = 'Write counters and histograms of the operations to this file in the Prometheus text format, for the node exporter\'s textfile collector. The file is rewritten atomically at an interval and once the operations complete.'
+        )
+
+        parser.add_argument(
+            '--metrics-interval',
+            type = float,
+            default = METRICS_INTERVAL,
+            help = 'Seconds between writes of the metrics file. [Default: {}]'.format( METRICS_INTERVAL )
+        )
+
 
         return super().init_parser( parser )
         # parser.set_defaults( _fn = self.run )
@@ -0,0 +1,610 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Compressed Assets
+"""
+Compressed storage of cold Asset files.
+
+Asset files not modified or read for some time are compressed with a stdlib codec,
+in a thread pool, as the codecs release the GIL.
+The compressed file replaces the original, while the Asset's `file` keeps its name,
+with the codec and compressed file recorded in its `compression` property.
+e.g.
+    { "type": "data", "file": "data.csv", "compression": { "codec": "gzip", "file": "data.csv.gz", "size": 1048576 } }
+
+Files are decompressed on demand into the project cache, `.thot/cache`,
+which evicts the least recently used copies once it exceeds its size.
+Before a Container's scripts run, the runner copies the decompressed copies of the
+compressed files of its descendant Assets to their Assets' `file`, with #Mounts,
+so scripts read them unchanged. The copies are removed once the run ends,
+or by the next run if it ended without removing them.
+Outside of runs #resolve_file gives the path of a decompressed copy of an Asset's file.
+e.g.
+    from thot_cli.commands.utils.compress import resolve_file
+    path = resolve_file( asset )
+
+Only files directly in their Asset's folder are compressed,
+as files elsewhere may be shared with other Assets.
+"""
+
+import os
+import bz2
+import gzip
+import json
+import lzma
+import time
+import shutil
+import socket
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ..common import format_bytes, parse_bytes, state_path, write_atomic, STATE_DIR
+from .walk import (
+    ASSET_FILE,
+    folder_kind,
+    load_assets,
+    parse_asset,
+    project_root,
+    read_folder,
+    stored_file
+)
+
+
+# codec: ( <suffix>, <open> )
+CODECS = {
+    'gzip': ( '.gz',  gzip.open ),
+    'bz2':  ( '.bz2', bz2.open ),
+    'lzma': ( '.xz',  lzma.open )
+}
+
+DEFAULT_CODEC = 'gzip'
+
+# files smaller than this are not compressed
+MIN_SIZE = 4096
+
+# compressed files larger than this fraction of the original are discarded
+MAX_RATIO = 0.9
+
+CACHE_DIR = 'cache'
+
+# state file marking that a project has compressed files, so runs look for them
+COMPRESSED_FILE = 'compressed'
+
+# state folder of the journals of files mounted by runs
+MOUNTS_DIR = 'mounts'
+
+# environment variable overriding the maximum size of the cache
+CACHE_SIZE_ENV = 'THOT_CACHE_SIZE'
+CACHE_SIZE = 4* 1024** 3
+
+# seconds a cached copy is protected from eviction after use,
+# so copies are not removed between being resolved and opened
+EVICT_GRACE = 60
+
+COPY_CHUNK = 1024** 2
+
+
+def last_used( path ):
+    """
+    :param path: Path of a file.
+    :returns: Time the file was last modified or read.
+    """
+    stats = os.stat( path )
+    return max( stats.st_mtime, stats.st_atime )
+
+
+def _candidate( asset, properties, cutoff ):
+    """
+    Checks if an Asset's file can be compressed.
+
+    :param asset: Path to the Asset.
+    :param properties: Asset properties, with the 'file' property resolved.
+    :param cutoff: Only files last used before this time are compressed, or None for all.
+    :returns: Size of the file, or None if it should not be compressed.
+    """
+    if 'compression' in properties:
+        return None
+
+    file = properties[ 'file' ]
+    if ( os.path.dirname( file ) != asset ) or not os.path.isfile( file ):
+        return None
+
+    if file.endswith( tuple( suffix for ( suffix, _ ) in CODECS.values() ) ):
+        return None
+
+    size = os.path.getsize( file )
+    if size < MIN_SIZE:
+        return None
+
+    if ( cutoff is not None ) and ( last_used( file ) >= cutoff ):
+        return None
+
+    return size
+
+
+def compress_asset( asset, file, codec = DEFAULT_CODEC, level = None ):
+    """
+    Compresses an Asset's file, and records the codec in the Asset file.
+    The compressed file is written and the Asset file updated before the original is removed.
+
+    :param asset: Path to the Asset.
+    :param file: Resolved path of the Asset's file.
+    :param codec: Codec, one of CODECS. [Default: DEFAULT_CODEC]
+    :param level: Compression level, or None for the codec's default. [Default: None]
+    :returns: Size of the compressed file, or None if the file did not compress well enough.
+    """
+    ( suffix, opener ) = CODECS[ codec ]
+    asset_file = os.path.join( asset, ASSET_FILE )
+    with open( asset_file ) as f:
+        properties = json.load( f )
+
+    kwargs = {} if level is None else ( { 'preset': level } if codec == 'lzma' else { 'compresslevel': level } )
+    stats = os.stat( file )
+    with tempfile.NamedTemporaryFile( dir = asset, prefix = '.', suffix = '.tmp', delete = False ) as tf:
+        pass
+
+    try:
+        with open( file, 'rb' ) as src, opener( tf.name, 'wb', **kwargs ) as dst:
+            shutil.copyfileobj( src, dst, COPY_CHUNK )
+
+        compressed = os.path.getsize( tf.name )
+        if compressed > stats.st_size* MAX_RATIO:
+            os.remove( tf.name )
+            return None
+
+        os.chmod( tf.name, stats.st_mode )
+        os.utime( tf.name, ns = ( stats.st_atime_ns, stats.st_mtime_ns ) )
+        os.replace( tf.name, file + suffix )
+
+    except BaseException:
+        if os.path.exists( tf.name ):
+            os.remove( tf.name )
+
+        raise
+
+    properties[ 'compression' ] = {
+        'codec': codec,
+        'file':  os.path.basename( file + suffix ),
+        'size':  stats.st_size
+    }
+
+    write_atomic( asset_file, json.dumps( properties, indent = 4 ) )
+    os.remove( file )
+
+    return compressed
+
+
+def compress( root, older_than = None, codec = DEFAULT_CODEC, level = None, dry_run = False, workers = None ):
+    """
+    Compresses the cold Asset files of a tree.
+
+    :param root: Path to the root Container.
+    :param older_than: Only compress files last used more than this many seconds ago,
+        or None for all. [Default: None]
+    :param codec: Codec, one of CODECS. [Default: DEFAULT_CODEC]
+    :param level: Compression level, or None for the codec's default. [Default: None]
+    :param dry_run: Only find files to compress, without compressing them. [Default: False]
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :returns: Report dictionary with keys
+        [ 'root', 'codec', 'files', 'bytes', 'compressed', 'skipped', 'dry_run' ],
+        where files is a list of { 'asset', 'file', 'bytes', 'compressed' },
+        with compressed None if not compressed.
+    :raises ValueError: If the codec is invalid.
+    """
+    if codec not in CODECS:
+        raise ValueError( 'Invalid codec {}, must be one of {}.'.format( codec, ', '.join( CODECS ) ) )
+
+    cutoff = None if ( older_than is None ) else time.time() - older_than
+    files = []
+    for ( asset, properties ) in load_assets( root, workers = workers ):
+        size = _candidate( asset, properties, cutoff )
+        if size is not None:
+            files.append( { 'asset': asset, 'file': properties[ 'file' ], 'bytes': size, 'compressed': None } )
+
+    if not dry_run:
+        with ThreadPoolExecutor( max_workers = workers ) as executor:
+            sizes = executor.map(
+                lambda item: compress_asset( item[ 'asset' ], item[ 'file' ], codec = codec, level = level ),
+                files
+            )
+
+            for ( item, size ) in zip( files, sizes ):
+                item[ 'compressed' ] = size
+
+    done = [ item for item in files if item[ 'compressed' ] is not None ]
+    if done:
+        write_atomic( state_path( project_root( root ), COMPRESSED_FILE ), '' )
+
+    return {
+        'root':       os.path.abspath( root ),
+        'codec':      codec,
+        'files':      files,
+        'bytes':      sum( item[ 'bytes' ] for item in done ),
+        'compressed': sum( item[ 'compressed' ] for item in done ),
+        'skipped':    0 if dry_run else len( files ) - len( done ),
+        'dry_run':    dry_run
+    }
+
+
+def print_report( report, as_json = False ):
+    """
+    Prints a compression report.
+
+    :param report: Report, as returned by #compress.
+    :param as_json: Print as JSON. [Default: False]
+    """
+    if as_json:
+        print( json.dumps( report, indent = 4 ) )
+        return
+
+    for item in report[ 'files' ]:
+        print( '{:>8} {:>8}  {}'.format(
+            format_bytes( item[ 'bytes' ] ),
+            '-' if item[ 'compressed' ] is None else format_bytes( item[ 'compressed' ] ),
+            item[ 'file' ]
+        ) )
+
+    if report[ 'dry_run' ]:
+        print( 'Found {} files to compress, {}.'.format(
+            len( report[ 'files' ] ), format_bytes( sum( item[ 'bytes' ] for item in report[ 'files' ] ) )
+        ) )
+
+        return
+
+    print( 'Compressed {} files with {}, {} to {}. {} files did not compress well and were kept.'.format(
+        len( report[ 'files' ] ) - report[ 'skipped' ],
+        report[ 'codec' ],
+        format_bytes( report[ 'bytes' ] ),
+        format_bytes( report[ 'compressed' ] ),
+        report[ 'skipped' ]
+    ) )
+
+
+# --- cache ---
+
+def cache_size():
+    """
+    :returns: Maximum size of the cache in bytes,
+        from the THOT_CACHE_SIZE environment variable if set.
+    """
+    size = os.environ.get( CACHE_SIZE_ENV )
+    return CACHE_SIZE if size is None else parse_bytes( size )
+
+
+def evict( folder, size, keep = None ):
+    """
+    Removes the least recently used files of the cache until it fits in a size.
+    Files used within EVICT_GRACE seconds are kept.
+
+    :param folder: Path to the cache.
+    :param size: Maximum size of the cache in bytes.
+    :param keep: Path of a file to keep, or None. [Default: None]
+    :returns: Number of bytes evicted.
+    """
+    entries = []
+    with os.scandir( folder ) as items:
+        for entry in items:
+            if entry.name.startswith( '.' ) or not entry.is_file( follow_symlinks = False ):
+                continue
+
+            stats = entry.stat( follow_symlinks = False )
+            entries.append( ( stats.st_mtime, stats.st_size, entry.path ) )
+
+    total = sum( entry[ 1 ] for entry in entries )
+    cutoff = time.time() - EVICT_GRACE
+    evicted = 0
+    for ( used, length, path ) in sorted( entries ):
+        if total <= size:
+            break
+
+        if ( used >= cutoff ) or ( path == keep ):
+            continue
+
+        try:
+            os.remove( path )
+
+        except FileNotFoundError:
+            pass
+
+        total -= length
+        evicted += length
+
+    return evicted
+
+
+def resolve_file( properties, root = None ):
+    """
+    Gets the path of an Asset's file, decompressing compressed files into the cache.
+    Cached copies are keyed by the compressed file's path, size, and modification time,
+    so they are refreshed if it changes.
+
+    :param properties: Asset properties with the 'file' property resolved,
+        as in manifests or as returned by #load_assets.
+    :param root: Project root, or None to find it from the file. [Default: None]
+    :returns: Path of the uncompressed file.
+    """
+    compression = properties.get( 'compression' )
+    if not compression:
+        return properties[ 'file' ]
+
+    file = stored_file( properties )
+
+    if root is None:
+        root = project_root( os.path.dirname( file ) )
+
+    stats = os.stat( file )
+    key = hashlib.sha1(
+        '{}:{}:{}'.format( os.path.normpath( file ), stats.st_size, stats.st_mtime_ns ).encode()
+    ).hexdigest()
+
+    folder = os.path.join( root, STATE_DIR, CACHE_DIR )
+    os.makedirs( folder, exist_ok = True )
+    path = os.path.join( folder, '{}-{}'.format( key[ :16 ], os.path.basename( properties[ 'file' ] ) ) )
+
+    try:
+        # mark as used
+        os.utime( path )
+        return path
+
+    except FileNotFoundError:
+        pass
+
+    ( _, opener ) = CODECS[ compression[ 'codec' ] ]
+    with tempfile.NamedTemporaryFile( dir = folder, prefix = '.', suffix = '.tmp', delete = False ) as tf:
+        try:
+            with opener( file, 'rb' ) as src:
+                shutil.copyfileobj( src, tf, COPY_CHUNK )
+
+        except BaseException:
+            tf.close()
+            os.remove( tf.name )
+            raise
+
+    os.chmod( tf.name, 0o644 )
+    os.replace( tf.name, path )
+    evict( folder, cache_size(), keep = path )
+
+    return path
+
+
+# --- runs ---
+
+def has_compressed( root ):
+    """
+    :param root: Path to a Container of the project.
+    :returns: If files of the project have been compressed.
+    """
+    return os.path.exists( os.path.join( project_root( root ), STATE_DIR, COMPRESSED_FILE ) )
+
+
+def _alive( pid ):
+    """
+    :param pid: Process id, on this host.
+    :returns: If the process is running.
+    """
+    try:
+        os.kill( pid, 0 )
+
+    except ProcessLookupError:
+        return False
+
+    except PermissionError:
+        # running as another user
+        return True
+
+    return True
+
+
+def _unmount( file, asset, mtime ):
+    """
+    Removes a mounted file.
+    Files modified since mounted are kept, and replace their compressed file.
+
+    :param file: Path of the mounted file.
+    :param asset: Path to its Asset.
+    :param mtime: Modification time of the file when mounted, in ns.
+    """
+    try:
+        modified = os.stat( file ).st_mtime_ns != mtime
+
+    except FileNotFoundError:
+        # removed by a script
+        return
+
+    if modified:
+        _uncompress( asset, file )
+
+    else:
+        os.remove( file )
+
+
+def clean_mounts( root ):
+    """
+    Removes the files mounted by runs that ended without closing their Mounts,
+    such as runs that crashed, as recorded in their journals.
+    Only journals of this host whose process is no longer running are cleaned,
+    so concurrent runs are not affected.
+
+    :param root: Path to a Container of the project.
+    :returns: Number of mounted files cleaned.
+    """
+    folder = os.path.join( project_root( root ), STATE_DIR, MOUNTS_DIR )
+    try:
+        names = os.listdir( folder )
+
+    except FileNotFoundError:
+        return 0
+
+    host = socket.gethostname()
+    cleaned = 0
+    for name in names:
+        try:
+            ( journal_host, pid ) = os.path.splitext( name )[ 0 ].rsplit( '-', 1 )
+            pid = int( pid )
+
+        except ValueError:
+            continue
+
+        if ( journal_host != host ) or _alive( pid ):
+            continue
+
+        path = os.path.join( folder, name )
+        with open( path ) as f:
+            for line in f:
+                try:
+                    entry = json.loads( line )
+
+                except ValueError:
+                    # partially written
+                    continue
+
+                _unmount( entry[ 'file' ], entry[ 'asset' ], entry[ 'mtime' ] )
+                cleaned += 1
+
+        os.remove( path )
+
+    return cleaned
+
+
+class Mounts():
+    """
+    Decompressed copies of the compressed Asset files of a run, placed at their Assets' `file`.
+
+    Each file is a copy of its cached copy,
+    so scripts modifying it in place do not modify the cache.
+    Mounted files are recorded in a journal in the project's state folder,
+    so those of runs that end without #close are removed by the next run, see #clean_mounts.
+    """
+
+    def __init__( self, root ):
+        """
+        Cleans the files left mounted by ended runs.
+
+        :param root: Path to a Container of the project.
+        """
+        self.root = project_root( root )
+        self.linked = {}  # ( <asset>, <modification time> ) of mounted files keyed by path
+        self._mounted = set()  # paths of Containers whose tree is mounted
+        self._lock = threading.Lock()
+        self._journal = None
+
+        clean_mounts( self.root )
+
+
+    def _record( self, file, asset, mtime ):
+        """
+        Records a mounted file in the journal.
+
+        :param file: Path of the mounted file.
+        :param asset: Path to its Asset.
+        :param mtime: Modification time of the file, in ns.
+        """
+        with self._lock:
+            self.linked[ file ] = ( asset, mtime )
+            if self._journal is None:
+                name = '{}-{}.jsonl'.format( socket.gethostname(), os.getpid() )
+                self._journal = open( state_path( self.root, MOUNTS_DIR, name ), 'a' )
+
+            self._journal.write( json.dumps( { 'file': file, 'asset': asset, 'mtime': mtime } ) + '\n' )
+            self._journal.flush()
+
+
+    def _mount_asset( self, path, properties ):
+        """
+        Copies the decompressed copy of an Asset's file to its `file`, if compressed and not present.
+
+        :param path: Path to the Asset.
+        :param properties: Asset properties with the 'file' property resolved.
+        """
+        file = properties[ 'file' ]
+        if not properties.get( 'compression' ) or os.path.lexists( file ):
+            return
+
+        source = resolve_file( properties, root = self.root )
+        folder = os.path.dirname( file )
+        with tempfile.NamedTemporaryFile( dir = folder, prefix = '.', suffix = '.tmp', delete = False ) as tf:
+            pass
+
+        try:
+            shutil.copyfile( source, tf.name )
+            try:
+                # fails if mounted by another thread
+                os.link( tf.name, file )
+
+            except FileExistsError:
+                return
+
+            except OSError:
+                # no hard links
+                os.replace( tf.name, file )
+
+            self._record( file, path, os.stat( file ).st_mtime_ns )
+
+        finally:
+            if os.path.exists( tf.name ):
+                os.remove( tf.name )
+
+
+    def mount( self, container_id ):
+        """
+        Mounts the compressed files of the descendant Assets of a Container.
+        Trees already mounted are skipped.
+
+        :param container_id: Path of the Container.
+        """
+        container_id = os.path.normpath( container_id )
+        with self._lock:
+            if container_id in self._mounted:
+                return
+
+        for folder in read_folder( container_id )[ 2 ]:
+            files = read_folder( folder )[ 0 ]
+            kind = folder_kind( files )
+            if kind == 'container':
+                self.mount( folder )
+
+            elif kind == 'asset':
+                properties = parse_asset( folder, files, self.root )
+                if properties is not None:
+                    self._mount_asset( folder, properties )
+
+        with self._lock:
+            self._mounted.add( container_id )
+
+
+    def close( self ):
+        """
+        Removes the mounted files, and the journal.
+        Files modified during the run are kept, and replace their compressed file.
+        """
+        for file, ( asset, mtime ) in self.linked.items():
+            _unmount( file, asset, mtime )
+
+        self.linked = {}
+        if self._journal is not None:
+            self._journal.close()
+            os.remove( self._journal.name )
+            self._journal = None
+
+
+def _uncompress( asset, file ):
+    """
+    Keeps a decompressed file in place of its compressed file.
+
+    :param asset: Path to the Asset.
+    :param file: Path of the Asset's decompressed file.
+    """
+    asset_file = os.path.join( asset, ASSET_FILE )
+    with open( asset_file ) as f:
+        properties = json.load( f )
+
+    compression = properties.pop( 'compression', None )
+    write_atomic( asset_file, json.dumps( properties, indent = 4 ) )
+    if compression:
+        try:
+            os.remove( os.path.join( os.path.dirname( file ), compression[ 'file' ] ) )
+
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Disk Usage
+"""
+Disk usage and statistics of the Containers of a local project.
+"""
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ..common import state_path, load_state, save_state, format_bytes
+from .walk import CONTAINER_FILE, ASSET_FILE, SCRIPTS_FILE, folder_kind, project_root
+
+
+CACHE_FILE = 'du.cache'
+
+sort_keys = {
+    'path':    None,
+    'bytes':   'subtree_bytes',
+    'assets':  'subtree_assets',
+    'scripts': 'subtree_scripts'
+}
+
+
+def object_kind( path ):
+    """
+    Gets the kind of object in a folder.
+    Only the object files are checked, rather than listing the folder,
+    as Asset folders may hold many files.
+
+    :param path: Path to the folder.
+    :returns: Kind of the object, as for walk#folder_kind.
+    """
+    return folder_kind( [
+        name for name in ( CONTAINER_FILE, ASSET_FILE )
+        if os.path.isfile( os.path.join( path, name ) )
+    ] )
+
+
+def folder_size( path ):
+    """
+    :param path: Path to a folder.
+    :returns: Total size in bytes of the files in the folder, recursively.
+        Symbolic links are not followed.
+    """
+    size = 0
+    with os.scandir( path ) as entries:
+        for entry in entries:
+            if entry.is_dir( follow_symlinks = False ):
+                size += folder_size( entry.path )
+
+            elif entry.is_file( follow_symlinks = False ):
+                size += entry.stat( follow_symlinks = False ).st_size
+
+    return size
+
+
+def _mtime( path ):
+    """
+    :param path: Path.
+    :returns: Modification time of the path in nanoseconds, or None if it does not exist.
+    """
+    try:
+        return os.stat( path ).st_mtime_ns
+
+    except FileNotFoundError:
+        return None
+
+
+def count_scripts( path ):
+    """
+    :param path: Path to a Container.
+    :returns: Number of script associations of the Container.
+    """
+    try:
+        with open( os.path.join( path, SCRIPTS_FILE ) ) as f:
+            scripts = json.load( f )
+
+    except ( FileNotFoundError, ValueError ):
+        # no or invalid scripts file
+        return 0
+
+    return len( scripts ) if isinstance( scripts, list ) else 0
+
+
+def scan_container( path, cached = None ):
+    """
+    Collects the statistics of a single Container.
+    Cached values are used for the Container's contents if its folder has not been modified,
+    and for each Asset if the Asset's folder has not been modified.
+
+    :param path: Path to the Container.
+    :param cached: Cache entry of a previous scan, or None. [Default: None]
+    :returns: Cache entry with keys
+        'mtime', 'scripts_mtime', 'scripts', 'children', and 'assets'.
+        'assets' is a dictionary keyed by Asset folder name with
+        values of ( <folder modification time>, <bytes> ).
+    """
+    mtime = _mtime( path )
+    scripts_mtime = _mtime( os.path.join( path, SCRIPTS_FILE ) )
+
+    if ( cached is not None ) and ( cached[ 'mtime' ] == mtime ):
+        # contents unchanged
+        children = cached[ 'children' ]
+        asset_names = cached[ 'assets' ].keys()
+
+    else:
+        cached = None
+        children = []
+        asset_names = []
+        with os.scandir( path ) as entries:
+            for entry in entries:
+                if (
+                    entry.name.startswith( '.' ) or
+                    not entry.is_dir( follow_symlinks = False )
+                ):
+                    continue
+
+                kind = object_kind( entry.path )
+                if kind == 'container':
+                    children.append( entry.name )
+
+                elif kind == 'asset':
+                    asset_names.append( entry.name )
+
+    assets = {}
+    for name in asset_names:
+        asset_path = os.path.join( path, name )
+        asset_mtime = _mtime( asset_path )
+        if asset_mtime is None:
+            # asset removed since cached
+            continue
+
+        if ( cached is not None ) and ( cached[ 'assets' ][ name ][ 0 ] == asset_mtime ):
+            assets[ name ] = cached[ 'assets' ][ name ]
+
+        else:
+            assets[ name ] = ( asset_mtime, folder_size( asset_path ) )
+
+    scripts = (
+        cached[ 'scripts' ]
+        if ( cached is not None ) and ( cached[ 'scripts_mtime' ] == scripts_mtime ) else
+        count_scripts( path )
+    )
+
+    return {
+        'mtime':         mtime,
+        'scripts_mtime': scripts_mtime,
+        'scripts':       scripts,
+        'children':      children,
+        'assets':        assets
+    }
+
+
+def disk_usage( root, workers = None, refresh = False ):
+    """
+    Computes the disk usage and statistics of every Container in a tree.
+    Containers are scanned in parallel.
+    Results are cached in the project by folder modification time
+    so repeated scans only revisit modified folders.
+    The cache is kept in the project root's state folder,
+    with the entries of each scanned subtree kept separately.
+
+    :param root: Path to the root Container.
+    :param workers: Number of threads to use, or None for the default. [Default: None]
+    :param refresh: Ignore cached values, rescanning every folder.
+        Needed if files were modified in place, which does not modify their folder.
+        [Default: False]
+    :returns: List of dictionaries, one per Container, in depth first order, with keys
+        '_id', 'assets', 'bytes', 'scripts', 'containers',
+        'subtree_assets', 'subtree_bytes', and 'subtree_scripts'.
+        Subtree values include the Container itself.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    proj_root = project_root( root )
+    subtree = os.path.relpath( root, proj_root )
+
+    # entries of each subtree keyed by path, keyed by subtree
+    cache_path = state_path( proj_root, CACHE_FILE )
+    subtrees = load_state( cache_path, {} )
+    cache = {} if refresh else subtrees.get( subtree, {} )
+
+    entries = {}
+    with ThreadPoolExecutor( max_workers = workers ) as executor:
+        def _submit( path ):
+            future = executor.submit( scan_container, path, cache.get( path ) )
+            future.path = path
+            return future
+
+        pending = { _submit( root ) }
+        while pending:
+            done, pending = wait( pending, return_when = FIRST_COMPLETED )
+            for future in done:
+                entry = future.result()
+                entries[ future.path ] = entry
+
+                for child in entry[ 'children' ]:
+                    pending.add( _submit( os.path.join( future.path, child ) ) )
+
+    subtrees[ subtree ] = entries
+    save_state( cache_path, subtrees )
+
+    # collect stats depth first
+    stats = []
+
+    def _collect( path ):
+        entry = entries[ path ]
+        stat = {
+            '_id':     path,
+            'assets':  len( entry[ 'assets' ] ),
+            'bytes':   sum( size for ( _, size ) in entry[ 'assets' ].values() ),
+            'scripts': entry[ 'scripts' ]
+        }
+
+        stat[ 'containers' ]      = 1
+        stat[ 'subtree_assets' ]  = stat[ 'assets' ]
+        stat[ 'subtree_bytes' ]   = stat[ 'bytes' ]
+        stat[ 'subtree_scripts' ] = stat[ 'scripts' ]
+        stats.append( stat )
+
+        for child in entry[ 'children' ]:
+            child_stat = _collect( os.path.join( path, child ) )
+            for key in [ 'containers', 'subtree_assets', 'subtree_bytes', 'subtree_scripts' ]:
+                stat[ key ] += child_stat[ key ]
+
+        return stat
+
+
+    _collect( root )
+    return stats
+
+
+def print_usage( stats, root, sort = 'path', as_json = False ):
+    """
+    Prints disk usage statistics.
+
+    :param stats: List of Container statistics, as returned by #disk_usage.
+    :param root: Path to the root Container. Paths are printed relative to it.
+    :param sort: Sort order. [Default: 'path']
+        Values: [ 'path', 'bytes', 'assets', 'scripts' ]
+    :param as_json: Print as JSON. [Default: False]
+    :raises ValueError: If sort is invalid.
+    """
+    if sort not in sort_keys:
+        raise ValueError( 'Invalid sort {}. Must be one of {}.'.format( sort, list( sort_keys ) ) )
+
+    key = sort_keys[ sort ]
+    if key is not None:
+        stats = sorted( stats, key = lambda stat: stat[ key ], reverse = True )
+
+    if as_json:
+        print( json.dumps( stats, indent = 4 ) )
+        return
+
+    root = os.path.abspath( root )
+    print( '{:>10} {:>10} {:>8} {:>8}  {}'.format( 'SUBTREE', 'OWN', 'ASSETS', 'SCRIPTS', 'CONTAINER' ) )
+    for stat in stats:
+        print( '{:>10} {:>10} {:>8} {:>8}  {}'.format(
+            format_bytes( stat[ 'subtree_bytes' ] ),
+            format_bytes( stat[ 'bytes' ] ),
+            stat[ 'subtree_assets' ],
+            stat[ 'subtree_scripts' ],
+            os.path.relpath( stat[ '_id' ], root )
+        ) )
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Project Integrity Check
+"""
+Validates the metadata of a local project.
+
+Folders are read in a thread pool,
+and the metadata files parsed and validated in a process pool.
+"""
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from ..common import write_atomic
+from .walk import (
+    CONTAINER_FILE,
+    ASSET_FILE,
+    SCRIPTS_FILE,
+    REMOVED_SUFFIX,
+    project_root,
+    resolve_path,
+    read_tree,
+    stored_file
+)
+
+# number of metadata files parsed per process task
+PARSE_CHUNK = 256
+
+# minimum number of metadata files before parsing in processes
+PARSE_PROCESS_THRESHOLD = 2000
+
+
+class Issue():
+    """
+    A problem found in a project.
+    """
+
+    def __init__( self, path, code, message, severity = 'error', fixable = False, data = None ):
+        """
+        :param path: Path of the file or folder with the issue.
+        :param code: Issue code.
+        :param message: Description of the issue.
+        :param severity: 'error' or 'warning'. [Default: 'error']
+        :param fixable: Whether the issue can be fixed automatically. [Default: False]
+        :param data: Additional data used to fix the issue. [Default: None]
+        """
+        self.path = path
+        self.code = code
+        self.message = message
+        self.severity = severity
+        self.fixable = fixable
+        self.fixed = False
+        self.data = data
+
+
+    def __json__( self ):
+        """
+        :returns: Dictionary to write to JSON.
+        """
+        return {
+            'path':     self.path,
+            'code':     self.code,
+            'severity': self.severity,
+            'message':  self.message,
+            'fixable':  self.fixable,
+            'fixed':    self.fixed
+        }
+
+
+def validate( path, name, data, root ):
+    """
+    Parses and validates a metadata file.
+    Runs in worker processes.
+
+    :param path: Path of the object folder.
+    :param name: Name of the metadata file.
+    :param data: Bytes of the metadata file.
+    :param root: Project root.
+    :returns: Tuple of ( <issues>, <references> ),
+        where references is a list of paths which must exist
+        as ( <file path>, <issue code>, <path>, <issue data> ).
+    """
+    file_path = os.path.join( path, name )
+    issues = []
+    refs = []
+
+    try:
+        content = json.loads( data )
+
+    except ValueError as err:
+        issues.append( Issue( file_path, 'json.invalid', 'Invalid JSON: {}.'.format( err ) ) )
+        return ( issues, refs )
+
+    if name == SCRIPTS_FILE:
+        if not isinstance( content, list ):
+            issues.append( Issue( file_path, 'scripts.invalid', 'Scripts must be a list.' ) )
+            return ( issues, refs )
+
+        for index, assoc in enumerate( content ):
+            if (
+                not isinstance( assoc, dict ) or
+                not isinstance( assoc.get( 'script' ), str )
+            ):
+                issues.append( Issue(
+                    file_path,
+                    'scripts.invalid_entry',
+                    'Script association {} must be an object with a `script` path.'.format( index ),
+                    fixable = True,
+                    data = assoc
+                ) )
+
+                continue
+
+            script = resolve_path( assoc[ 'script' ], path, root )
+            refs.append( ( file_path, 'scripts.missing', script, assoc ) )
+
+        return ( issues, refs )
+
+    # object file
+    if not isinstance( content, dict ):
+        issues.append( Issue( file_path, 'object.invalid', 'Object file must contain an object.' ) )
+        return ( issues, refs )
+
+    if ( 'metadata' in content ) and not isinstance( content[ 'metadata' ], dict ):
+        issues.append( Issue( file_path, 'object.invalid_metadata', 'Metadata must be an object.' ) )
+
+    if name == ASSET_FILE:
+        asset_file = content.get( 'file' )
+        if not isinstance( asset_file, str ) or not asset_file:
+            issues.append( Issue(
+                file_path,
+                'asset.no_file',
+                'Asset does not define a `file`.'
+            ) )
+
+        else:
+            asset_file = stored_file( { **content, 'file': resolve_path( asset_file, path, root ) } )
+            refs.append( ( file_path, 'asset.missing_file', asset_file, None ) )
+
+    return ( issues, refs )
+
+
+def validate_chunk( chunk, root ):
+    """
+    Validates a list of metadata files.
+
+    :param chunk: List of ( <path>, <name>, <data> ).
+    :param root: Project root.
+    :returns: List of results of #validate.
+    """
+    return [ validate( path, name, data, root ) for ( path, name, data ) in chunk ]
+
+
+def missing_paths( paths ):
+    """
+    :param paths: List of paths.
+    :returns: List of the paths that do not exist.
+    """
+    return [ path for path in paths if not os.path.exists( path ) ]
+
+
+def check( root, workers = None, processes = None ):
+    """
+    Checks the integrity of a project tree.
+
+    :param root: Path to the root Container.
+    :param workers: Number of threads for reading files, or None for the default.
+        [Default: None]
+    :param processes: Number of processes for parsing files, 0 to parse in threads,
+        or None to use processes for large projects.
+        [Default: None]
+    :returns: Report dictionary with keys 'root', 'checked', and 'issues'.
+        'issues' is a list of Issues.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    proj_root = project_root( root )
+
+    issues = []
+    files = []  # ( path, name, data )
+    checked = { 'containers': 0, 'assets': 0, 'scripts': 0 }
+
+    if not os.path.isfile( os.path.join( root, CONTAINER_FILE ) ):
+        issues.append( Issue( root, 'root.not_container', 'Root is not a Container.' ) )
+
+    # read tree
+    for ( path, folder_files, removed ) in read_tree( root, workers = workers ):
+        for removed_path in removed:
+            issues.append( Issue(
+                removed_path,
+                'object.removed',
+                'Removed object file remains.',
+                severity = 'warning'
+            ) )
+
+        is_container = CONTAINER_FILE in folder_files
+        is_asset = ASSET_FILE in folder_files
+        if is_container and is_asset:
+            issues.append( Issue(
+                path,
+                'object.ambiguous',
+                'Folder has both a Container and an Asset file.'
+            ) )
+
+        elif is_asset:
+            checked[ 'assets' ] += 1
+            files.append( ( path, ASSET_FILE, folder_files[ ASSET_FILE ] ) )
+
+        elif is_container or ( path == root ):
+            checked[ 'containers' ] += 1
+            for name in ( CONTAINER_FILE, SCRIPTS_FILE ):
+                if name in folder_files:
+                    files.append( ( path, name, folder_files[ name ] ) )
+
+    # parse and validate
+    use_processes = (
+        ( len( files ) >= PARSE_PROCESS_THRESHOLD )
+        if processes is None else
+        ( processes > 0 )
+    )
+
+    if use_processes:
+        chunks = [ files[ i : i + PARSE_CHUNK ] for i in range( 0, len( files ), PARSE_CHUNK ) ]
+        with ProcessPoolExecutor( max_workers = processes ) as executor:
+            results = executor.map( validate_chunk, chunks, [ proj_root ]* len( chunks ) )
+            results = [ result for chunk in results for result in chunk ]
+
+    else:
+        results = validate_chunk( files, proj_root )
+
+    refs = []
+    for ( result_issues, result_refs ) in results:
+        issues += result_issues
+        refs += result_refs
+
+    # check references exist
+    # scripts are often shared, so only check each path once
+    paths = list( { path for ( _, _, path, _ ) in refs } )
+    chunks = [ paths[ i : i + PARSE_CHUNK ] for i in range( 0, len( paths ), PARSE_CHUNK ) ]
+    missing = set()
+    with ThreadPoolExecutor( max_workers = workers ) as executor:
+        for chunk_missing in executor.map( missing_paths, chunks ):
+            missing.update( chunk_missing )
+
+    messages = {
+        'scripts.missing':    'Script {} does not exist.',
+        'asset.missing_file': 'Asset file {} does not exist.'
+    }
+
+    for ( file_path, code, path, data ) in refs:
+        if code == 'scripts.missing':
+            checked[ 'scripts' ] += 1
+
+        if path in missing:
+            issues.append( Issue(
+                file_path,
+                code,
+                messages[ code ].format( path ),
+                fixable = True,
+                data = data
+            ) )
+
+    issues.sort( key = lambda issue: ( issue.path, issue.code ) )
+
+    return {
+        'root':    root,
+        'checked': checked,
+        'issues':  issues
+    }
+
+
+def fix( issues, missing_files = False ):
+    """
+    Fixes fixable issues.
+    + Invalid or missing script associations are removed from the scripts file.
+    + If missing_files, Assets with missing files are removed by renaming their Asset file,
+        as ThotUtilities#remove_assets does.
+        Otherwise they are only reported, as files may be missing only for a time,
+        such as while the volume holding them is unmounted.
+
+    :param issues: List of Issues.
+    :param missing_files: Remove Assets whose file is missing. [Default: False]
+    :returns: List of fixed Issues.
+    """
+    fixed = []
+
+    # group script issues by file
+    scripts = {}
+    for issue in issues:
+        if not issue.fixable:
+            continue
+
+        if issue.code in ( 'scripts.missing', 'scripts.invalid_entry' ):
+            scripts.setdefault( issue.path, [] ).append( issue )
+
+        elif ( issue.code == 'asset.missing_file' ) and missing_files:
+            ( head, tail ) = os.path.split( issue.path )
+            ( name, _ ) = os.path.splitext( tail )
+            os.rename( issue.path, os.path.join( head, '{}{}'.format( name, REMOVED_SUFFIX ) ) )
+
+            issue.fixed = True
+            fixed.append( issue )
+
+    for path, file_issues in scripts.items():
+        with open( path ) as f:
+            assocs = json.load( f )
+
+        remove = [ issue.data for issue in file_issues ]
+        assocs = [ assoc for assoc in assocs if assoc not in remove ]
+        write_atomic( path, json.dumps( assocs, indent = 4 ) )
+
+        for issue in file_issues:
+            issue.fixed = True
+            fixed.append( issue )
+
+    return fixed
+
+
+def count_issues( report ):
+    """
+    :param report: Report, as returned by #check.
+    :returns: Tuple of ( <errors>, <warnings> ) that have not been fixed.
+    """
+    issues = [ issue for issue in report[ 'issues' ] if not issue.fixed ]
+    errors = sum( 1 for issue in issues if issue.severity == 'error' )
+
+    return ( errors, len( issues ) - errors )
+
+
+def print_report( report, as_json = False ):
+    """
+    Prints a check report.
+
+    :param report: Report, as returned by #check.
+    :param as_json: Print as JSON. [Default: False]
+    """
+    issues = report[ 'issues' ]
+    ( errors, warnings ) = count_issues( report )
+
+    if as_json:
+        out = {
+            **report,
+            'issues':   [ issue.__json__() for issue in issues ],
+            'errors':   errors,
+            'warnings': warnings
+        }
+
+        print( json.dumps( out, indent = 4 ) )
+        return
+
+    for issue in issues:
+        status = 'FIXED' if issue.fixed else issue.severity.upper()
+        print( '{:<8} {:<24} {}\n{:<33} {}'.format(
+            status,
+            issue.code,
+            issue.path,
+            '',
+            issue.message
+        ) )
+
+    checked = report[ 'checked' ]
+    print( 'Checked {} containers, {} assets, {} script associations: {} errors, {} warnings.'.format(
+        checked[ 'containers' ],
+        checked[ 'assets' ],
+        checked[ 'scripts' ],
+        errors,
+        warnings
+    ) )
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Garbage Collection
+"""
+Reclaims the space of removed and orphaned objects of a local project.
+
+Removing objects only renames their object files,
+so their folders and data remain on disk, and are scanned by every walk of the tree.
+Garbage is
+    + removed.container: Folder of a removed Container, with all its contents.
+    + removed.asset: Folder of a removed Asset, with its data.
+    + removed.file: Removed object file of a folder whose object was added again.
+    + asset.unreferenced: File or folder in an Asset folder other than its file,
+        object file, and notes.
+    + folder.empty: Folder in a Container which is not an object and contains no files.
+
+Files referenced by any Asset of the project, such as by a `root:` path
+into another Asset's folder, and the folders containing them, are never garbage.
+
+Folders are read, sized, and deleted in a thread pool.
+"""
+
+import os
+import json
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from ..common import format_bytes
+from .du import folder_size
+from .walk import (
+    CONTAINER_FILE,
+    ASSET_FILE,
+    REMOVED_SUFFIX,
+    NOTES_FOLDER,
+    folder_kind,
+    load_assets,
+    parse_asset,
+    project_root,
+    read_tree,
+    stored_file
+)
+
+
+KINDS = (
+    'removed.container',
+    'removed.asset',
+    'removed.file',
+    'asset.unreferenced',
+    'folder.empty'
+)
+
+# units of ages in seconds
+AGE_UNITS = { 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7* 86400 }
+
+
+def parse_age( age ):
+    """
+    Parses an age.
+
+    :param age: Number of seconds, optionally suffixed by one of [ s, m, h, d, w ].
+    :returns: Age in seconds.
+    :raises ValueError: If the age is invalid.
+    """
+    age = str( age ).strip().lower()
+    if age and ( age[ -1 ] in AGE_UNITS ):
+        return float( age[ :-1 ] )* AGE_UNITS[ age[ -1 ] ]
+
+    return float( age )
+
+
+def is_empty( path ):
+    """
+    :param path: Path to a folder.
+    :returns: If the folder contains no files, recursively.
+    """
+    with os.scandir( path ) as entries:
+        for entry in entries:
+            if not entry.is_dir( follow_symlinks = False ) or not is_empty( entry.path ):
+                return False
+
+    return True
+
+
+def changed( path ):
+    """
+    :param path: Path of a file or folder.
+    :returns: Time the path was last modified or renamed.
+    """
+    stats = os.stat( path, follow_symlinks = False )
+    return max( stats.st_mtime, stats.st_ctime )
+
+
+def size( path ):
+    """
+    :param path: Path of a file or folder.
+    :returns: Size in bytes. Symbolic links are not followed.
+    """
+    if os.path.isdir( path ) and not os.path.islink( path ):
+        return folder_size( path )
+
+    return os.stat( path, follow_symlinks = False ).st_size
+
+
+def references( assets ):
+    """
+    :param assets: Iterable of ( <path>, <properties> ) of Assets,
+        as returned by #load_assets.
+    :returns: Set of the files referenced by the Assets, as stored,
+        and the folders containing them.
+    """
+    referenced = set()
+    for ( _, properties ) in assets:
+        for path in { properties[ 'file' ], stored_file( properties ) }:
+            while path not in referenced:
+                referenced.add( path )
+                parent = os.path.dirname( path )
+                if parent == path:
+                    break
+
+                path = parent
+
+    return referenced
+
+
+def unreferenced( path, files, root, referenced ):
+    """
+    Gets the contents of an Asset folder not referenced by any Asset.
+
+    :param path: Path to the Asset.
+    :param files: Metadata files of the Asset, as returned by #read_folder.
+    :param root: Project root.
+    :param referenced: Paths referenced by the project's Assets, as returned by #references.
+    :returns: List of paths of unreferenced files and folders,
+        or an empty list if the Asset file is invalid.
+    """
+    if parse_asset( path, files, root ) is None:
+        # do not guess at the contents of invalid assets
+        return []
+
+    paths = []
+    with os.scandir( path ) as entries:
+        for entry in entries:
+            if (
+                entry.name.startswith( '.' ) or
+                ( entry.name in ( ASSET_FILE, NOTES_FOLDER ) ) or
+                entry.name.endswith( REMOVED_SUFFIX )
+            ):
+                continue
+
+            # referenced file, or a folder containing one
+            if entry.path in referenced:
+                continue
+
+            paths.append( entry.path )
+
+    return paths
+
+
+def _candidates( path, files, removed, root, referenced ):
+    """
+    Finds the garbage of a folder.
+
+    :param path: Path to the folder.
+    :param files: Metadata files of the folder.
+    :param removed: Paths of removed object files of the folder.
+    :param root: Project root.
+    :param referenced: Paths referenced by the project's Assets, as returned by #references.
+    :returns: List of ( <kind>, <path> ).
+    """
+    kind = folder_kind( files )
+    if ( kind is None ) and not files:
+        if path in referenced:
+            return []
+
+        names = [ os.path.basename( removed_path ) for removed_path in removed ]
+        if '{}{}'.format( os.path.splitext( CONTAINER_FILE )[ 0 ], REMOVED_SUFFIX ) in names:
+            return [ ( 'removed.container', path ) ]
+
+        if '{}{}'.format( os.path.splitext( ASSET_FILE )[ 0 ], REMOVED_SUFFIX ) in names:
+            return [ ( 'removed.asset', path ) ]
+
+        if not removed and is_empty( path ):
+            return [ ( 'folder.empty', path ) ]
+
+        return []
+
+    candidates = [ ( 'removed.file', removed_path ) for removed_path in removed ]
+    if kind == 'asset':
+        candidates += [
+            ( 'asset.unreferenced', asset_path )
+            for asset_path in unreferenced( path, files, root, referenced )
+        ]
+
+    return candidates
+
+
+def _describe( candidate ):
+    """
+    :param candidate: ( <kind>, <path> ).
+    :returns: Garbage dictionary, or None if the path no longer exists.
+    """
+    ( kind, path ) = candidate
+    try:
+        return { 'kind': kind, 'path': path, 'bytes': size( path ), 'changed': changed( path ) }
+
+    except FileNotFoundError:
+        return None
+
+
+def find( root, older_than = None, workers = None ):
+    """
+    Finds the garbage of a project tree.
+
+    :param root: Path to the root Container.
+    :param older_than: Only include garbage last changed more than this many seconds ago,
+        or None for all. [Default: None]
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :returns: List of garbage dictionaries with keys
+        [ 'kind', 'path', 'bytes', 'changed' ], sorted by path.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    proj_root = project_root( root )
+
+    records = list( read_tree( root, workers = workers ) )
+    if root == proj_root:
+        assets = [
+            ( path, parse_asset( path, files, proj_root ) )
+            for ( path, files, _ ) in records
+            if folder_kind( files ) == 'asset'
+        ]
+
+        referenced = references( asset for asset in assets if asset[ 1 ] is not None )
+
+    else:
+        # assets outside the tree may reference files in it
+        referenced = references( load_assets( proj_root, workers = workers ) )
+
+    with ThreadPoolExecutor( max_workers = workers ) as executor:
+        folders = [
+            executor.submit( _candidates, path, files, removed, proj_root, referenced )
+            for ( path, files, removed ) in records
+            if path != root or folder_kind( files ) is not None
+        ]
+
+        candidates = [ candidate for future in folders for candidate in future.result() ]
+        garbage = [ item for item in executor.map( _describe, candidates ) if item is not None ]
+
+    if older_than is not None:
+        cutoff = time.time() - older_than
+        garbage = [ item for item in garbage if item[ 'changed' ] < cutoff ]
+
+    garbage.sort( key = lambda item: item[ 'path' ] )
+    return garbage
+
+
+def _delete( path ):
+    """
+    Deletes a file or folder.
+
+    :param path: Path to delete.
+    :returns: None, or error message if the path could not be deleted.
+    """
+    try:
+        if os.path.isdir( path ) and not os.path.islink( path ):
+            shutil.rmtree( path )
+
+        else:
+            os.remove( path )
+
+    except FileNotFoundError:
+        return None
+
+    except OSError as err:
+        return str( err )
+
+    return None
+
+
+def collect( garbage, workers = None ):
+    """
+    Deletes garbage.
+
+    :param garbage: List of garbage, as returned by #find.
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :returns: List of garbage that could not be deleted, with the error in 'error'.
+    """
+    with ThreadPoolExecutor( max_workers = workers ) as executor:
+        errors = executor.map( _delete, [ item[ 'path' ] for item in garbage ] )
+
+    failed = []
+    for item, error in zip( garbage, errors ):
+        if error is not None:
+            failed.append( { **item, 'error': error } )
+
+    return failed
+
+
+def gc( root, older_than = None, dry_run = False, workers = None ):
+    """
+    Finds and deletes the garbage of a project tree.
+
+    :param root: Path to the root Container.
+    :param older_than: Only delete garbage last changed more than this many seconds ago,
+        or None for all. [Default: None]
+    :param dry_run: Only find garbage, without deleting it. [Default: False]
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :returns: Report dictionary with keys
+        [ 'root', 'garbage', 'bytes', 'deleted', 'failed', 'dry_run' ].
+    """
+    garbage = find( root, older_than = older_than, workers = workers )
+    failed = [] if dry_run else collect( garbage, workers = workers )
+
+    return {
+        'root':    os.path.abspath( root ),
+        'garbage': garbage,
+        'bytes':   sum( item[ 'bytes' ] for item in garbage ),
+        'deleted': 0 if dry_run else len( garbage ) - len( failed ),
+        'failed':  failed,
+        'dry_run': dry_run
+    }
+
+
+def print_report( report, as_json = False ):
+    """
+    Prints a garbage collection report.
+
+    :param report: Report, as returned by #gc.
+    :param as_json: Print as JSON. [Default: False]
+    """
+    if as_json:
+        print( json.dumps( report, indent = 4 ) )
+        return
+
+    for item in report[ 'garbage' ]:
+        print( '{:<20} {:>8}  {}'.format( item[ 'kind' ], format_bytes( item[ 'bytes' ] ), item[ 'path' ] ) )
+
+    for item in report[ 'failed' ]:
+        print( 'FAILED {}: {}'.format( item[ 'path' ], item[ 'error' ] ) )
+
+    totals = {}
+    for item in report[ 'garbage' ]:
+        totals[ item[ 'kind' ] ] = totals.get( item[ 'kind' ], 0 ) + 1
+
+    counts = ', '.join( '{} {}'.format( totals[ kind ], kind ) for kind in KINDS if kind in totals )
+    print( '{} {} items{}, {}.'.format(
+        'Found' if report[ 'dry_run' ] else 'Deleted {} of'.format( report[ 'deleted' ] ),
+        len( report[ 'garbage' ] ),
+        ' ({})'.format( counts ) if counts else '',
+        '{} reclaimable'.format( format_bytes( report[ 'bytes' ] ) )
+        if report[ 'dry_run' ] else
+        '{} reclaimed'.format( format_bytes( report[ 'bytes' ] - sum( item[ 'bytes' ] for item in report[ 'failed' ] ) ) )
+    ) )
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Packed Metadata
+"""
+Metadata of a project packed into a single indexed file, `.thot/metadata.pack`.
+
+Loading a large project reads hundreds of thousands of small metadata files,
+which is slow on any file system, and slower to copy between machines.
+A pack holds the metadata files of every folder read by a walk of the tree,
+so walks read one memory mapped file instead.
+
+The pack is used while it is fresh, that is while each packed folder,
+and each of its metadata files, has the modification time and size it had when packed.
+Adding, removing, or replacing a file changes its folder's modification time,
+and editing a file in place changes its own.
+Freshness is checked each time a pack is loaded, with one stat per packed folder
+and metadata file, so loading is O(files) as a walk is,
+but much cheaper than opening and parsing each file.
+A pack copied to another machine is not fresh there,
+but its metadata can be written to the tree with #unpack.
+
+Walks of the tree, streaming runs, and the databases of runs and utilities,
+including their searches, read from the pack while it is fresh, see #PackedDB.
+
+Format, little endian:
+    + Header: b'THOTPACK', <version: u32>, <index offset: u64>, <index length: u64>.
+    + Records, one per folder:
+        <files: u32>, <removed: u32>, <folders: u32>,
+        then for each file <name length: u16>, <name>, <data length: u32>, <data>,
+        and for each removed file and sub-folder <name length: u16>, <name>.
+    + Index: JSON of { <folder>: [ <record offset>, <modification time in ns>, <files> ] },
+        with folders relative to the project root,
+        and files { <name>: [ <size>, <modification time in ns> ] } of the folder's metadata files.
+"""
+
+import os
+import json
+import mmap
+import struct
+
+from ..common import write_atomic, STATE_DIR
+
+
+PACK_FILE = 'metadata.pack'
+MAGIC = b'THOTPACK'
+VERSION = 2
+
+HEADER = struct.Struct( '<8sIQQ' )
+COUNTS = struct.Struct( '<III' )
+NAME   = struct.Struct( '<H' )
+DATA   = struct.Struct( '<I' )
+
+
+def pack_path( root ):
+    """
+    :param root: Path to the project root.
+    :returns: Path of the project's pack.
+    """
+    return os.path.join( root, STATE_DIR, PACK_FILE )
+
+
+class Pack():
+    """
+    Reader of a pack, memory mapped.
+    """
+
+    def __init__( self, path ):
+        """
+        :param path: Path of the pack.
+        :raises ValueError: If the file is not a pack.
+        """
+        self.path = path
+        self.root = os.path.dirname( os.path.dirname( os.path.abspath( path ) ) )
+        with open( path, 'rb' ) as f:
+            self._map = mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ )
+
+        ( magic, version, offset, length ) = HEADER.unpack_from( self._map, 0 )
+        if ( magic != MAGIC ) or ( version != VERSION ):
+            self._map.close()
+            raise ValueError( '{} is not a metadata pack.'.format( path ) )
+
+        self.index = json.loads( self._map[ offset:offset + length ] )
+
+
+    def __contains__( self, path ):
+        """
+        :param path: Path of a folder.
+        :returns: If the folder is packed.
+        """
+        return self.relpath( path ) in self.index
+
+
+    def relpath( self, path ):
+        """
+        :param path: Path of a folder.
+        :returns: Path relative to the project root, as used by the index.
+        """
+        return os.path.relpath( os.path.abspath( path ), self.root )
+
+
+    def fresh( self ):
+        """
+        :returns: If no packed folder or metadata file was modified since it was packed.
+        """
+        for ( relpath, ( _, mtime, files ) ) in self.index.items():
+            folder = os.path.join( self.root, relpath )
+            try:
+                if os.stat( folder ).st_mtime_ns != mtime:
+                    return False
+
+                for ( name, ( size, file_mtime ) ) in files.items():
+                    stats = os.stat( os.path.join( folder, name ) )
+                    if ( stats.st_size != size ) or ( stats.st_mtime_ns != file_mtime ):
+                        return False
+
+            except OSError:
+                return False
+
+        return True
+
+
+    def _name( self, pos ):
+        """
+        :param pos: Offset of a name.
+        :returns: Tuple of ( <name>, <next offset> ).
+        """
+        ( length, ) = NAME.unpack_from( self._map, pos )
+        pos += NAME.size
+        return ( self._map[ pos:pos + length ].decode(), pos + length )
+
+
+    def folder( self, path ):
+        """
+        Reads the metadata files of a packed folder.
+        Mirrors walk#read_folder.
+
+        :param path: Path to the folder.
+        :returns: Tuple of ( <files>, <removed>, <folders> ), as for walk#read_folder.
+        :raises KeyError: If the folder is not packed.
+        """
+        path = os.path.normpath( os.path.abspath( path ) )
+        pos = self.index[ self.relpath( path ) ][ 0 ]
+        ( n_files, n_removed, n_folders ) = COUNTS.unpack_from( self._map, pos )
+        pos += COUNTS.size
+
+        files = {}
+        for _ in range( n_files ):
+            ( name, pos ) = self._name( pos )
+            ( length, ) = DATA.unpack_from( self._map, pos )
+            pos += DATA.size
+            files[ name ] = self._map[ pos:pos + length ]
+            pos += length
+
+        names = []
+        for _ in range( n_removed + n_folders ):
+            ( name, pos ) = self._name( pos )
+            names.append( os.path.join( path, name ) )
+
+        return ( files, names[ :n_removed ], names[ n_removed: ] )
+
+
+    def close( self ):
+        """
+        Unmaps the pack.
+        """
+        self._map.close()
+
+
+def load( root ):
+    """
+    Loads a project's pack if it is fresh.
+
+    :param root: Path to the project root.
+    :returns: Pack, or None if the project has no fresh pack.
+    """
+    try:
+        packed = Pack( pack_path( os.path.normpath( os.path.abspath( root ) ) ) )
+
+    except ( OSError, ValueError ):
+        return None
+
+    if not packed.fresh():
+        packed.close()
+        return None
+
+    return packed
+
+
+def _name( name ):
+    """
+    :param name: Name.
+    :returns: Length prefixed bytes of the name.
+    """
+    name = name.encode()
+    return NAME.pack( len( name ) ) + name
+
+
+def write( root, records ):
+    """
+    Packs the metadata of a project.
+    The tree must not be modified while packing.
+
+    :param root: Path to the project root.
+    :param records: Iterable of ( <path>, <files>, <removed> ) of the folders to pack,
+        as returned by walk#read_tree.
+    :returns: Dictionary of { 'path', 'folders', 'files', 'bytes', 'size' } of the pack.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    path = pack_path( root )
+    os.makedirs( os.path.dirname( path ), exist_ok = True )
+
+    folders = {}  # ( <files>, <removed>, <mtime>, <file stats> ) keyed by relative path
+    children = {}  # sub-folder names keyed by relative path
+    for ( folder, files, removed ) in records:
+        relpath = os.path.relpath( folder, root )
+        file_stats = {}
+        for name in files:
+            st = os.stat( os.path.join( folder, name ) )
+            file_stats[ name ] = [ st.st_size, st.st_mtime_ns ]
+
+        folders[ relpath ] = ( files, removed, os.stat( folder ).st_mtime_ns, file_stats )
+        if relpath != os.curdir:
+            children.setdefault( os.path.dirname( relpath ) or os.curdir, [] ).append( os.path.basename( relpath ) )
+
+    stats = { 'path': path, 'folders': len( folders ), 'files': 0, 'bytes': 0 }
+    index = {}
+    tmp = path + '.tmp'
+    with open( tmp, 'wb' ) as f:
+        f.write( HEADER.pack( MAGIC, VERSION, 0, 0 ) )
+        for relpath, ( files, removed, mtime, file_stats ) in folders.items():
+            subfolders = sorted( children.get( relpath, [] ) )
+            index[ relpath ] = [ f.tell(), mtime, file_stats ]
+
+            record = [ COUNTS.pack( len( files ), len( removed ), len( subfolders ) ) ]
+            for name, data in files.items():
+                record += [ _name( name ), DATA.pack( len( data ) ), bytes( data ) ]
+                stats[ 'files' ] += 1
+                stats[ 'bytes' ] += len( data )
+
+            record += [ _name( os.path.basename( removed_path ) ) for removed_path in removed ]
+            record += [ _name( name ) for name in subfolders ]
+            f.write( b''.join( record ) )
+
+        offset = f.tell()
+        data = json.dumps( index, separators = ( ',', ':' ) ).encode()
+        f.write( data )
+        f.seek( 0 )
+        f.write( HEADER.pack( MAGIC, VERSION, offset, len( data ) ) )
+
+    os.replace( tmp, path )
+    stats[ 'size' ] = os.path.getsize( path )
+    return stats
+
+
+def unpack( root, keep = False ):
+    """
+    Writes the metadata files of a project's pack to the tree,
+    where missing or different, and removes the pack.
+
+    :param root: Path to the project root.
+    :param keep: Keep the pack. [Default: False]
+    :returns: Dictionary of { 'folders', 'files', 'written' }.
+    :raises RuntimeError: If the project has no pack.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    path = pack_path( root )
+    try:
+        packed = Pack( path )
+
+    except ( OSError, ValueError ):
+        raise RuntimeError( 'No metadata pack at {}.'.format( path ) )
+
+    stats = { 'folders': len( packed.index ), 'files': 0, 'written': 0 }
+    try:
+        for relpath in packed.index:
+            folder = os.path.normpath( os.path.join( root, relpath ) )
+            ( files, _, _ ) = packed.folder( folder )
+            os.makedirs( folder, exist_ok = True )
+            for name, data in files.items():
+                stats[ 'files' ] += 1
+                file = os.path.join( folder, name )
+                try:
+                    with open( file, 'rb' ) as f:
+                        if f.read() == data:
+                            continue
+
+                except FileNotFoundError:
+                    pass
+
+                write_atomic( file, bytes( data ) )
+                stats[ 'written' ] += 1
+
+    finally:
+        packed.close()
+
+    if not keep:
+        os.remove( path )
+
+    return stats
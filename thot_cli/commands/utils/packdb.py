@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Packed Database
+"""
+Local database read from a project's metadata pack, see #pack.
+
+Objects are LocalContainers and LocalAssets, as in a LocalDB,
+built from the packed metadata files instead of the tree,
+so searches, and functions modifying the objects they find, work unchanged.
+Only notes are read from the tree, for objects that have them.
+
+Objects are built without reading the tree by setting the private state
+their constructors set, as written against thot-data 0.5.
+#supported checks the constructors of the installed version set the same state,
+and if not the tree is loaded with a LocalDB instead.
+"""
+
+import os
+import json
+from datetime import datetime
+from pathlib import Path
+
+from thot.db.local import LocalObject, LocalAsset, LocalContainer, LocalCollection, LocalDB
+
+from ..metrics import REGISTRY, metadata_read
+from .walk import (
+    CONTAINER_FILE,
+    ASSET_FILE,
+    SCRIPTS_FILE,
+    NOTES_FOLDER,
+    folder_kind,
+    project_root,
+    read_packed,
+    resolve_path
+)
+from . import pack
+
+
+# private state set by the constructors of each class, see #supported
+STATE = {
+    LocalObject: {
+        '_LocalObject__path',
+        '_LocalObject__parent',
+        '_LocalObject__object_file',
+        '_LocalObject__own_metadata_keys',
+        '_LocalObject__notes',
+        'meta'
+    },
+    LocalAsset:     { 'meta' },
+    LocalContainer: {
+        '_LocalContainer__children',
+        '_LocalContainer__assets',
+        '_LocalContainer__scripts'
+    },
+    LocalDB: {
+        '_LocalDB__root',
+        '_LocalDB__containers',
+        '_LocalDB__assets'
+    }
+}
+
+_supported = None
+
+
+def supported():
+    """
+    Checks the constructors of the installed LocalDB classes
+    set the state packed objects set, and only that state.
+    Checked once per process.
+
+    :returns: If packed objects can be built.
+    """
+    global _supported
+    if _supported is None:
+        _supported = True
+        for ( klass, state ) in STATE.items():
+            private = '_{}__'.format( klass.__name__ )
+            names = {
+                name for name in klass.__init__.__code__.co_names
+                if name.startswith( private ) or ( name == 'meta' )
+            }
+
+            if names != state:
+                _supported = False
+                break
+
+    return _supported
+
+
+def _notes( path ):
+    """
+    Reads the notes of an object.
+    Mirrors LocalObject#__init__.
+
+    :param path: Path to the notes folder.
+    :returns: List of notes.
+    """
+    notes = []
+    for note in os.listdir( path ):
+        note_path = os.path.join( path, note )
+        created = datetime.fromtimestamp( os.stat( note_path ).st_mtime ).isoformat( ' ' )
+        with open( note_path, 'r' ) as f:
+            try:
+                content = f.read()
+
+            except UnicodeDecodeError:
+                # not a utf-8 file
+                content = None
+
+        notes.append( {
+            'title':   os.path.splitext( note )[ 0 ],
+            'created': created,
+            'content': content
+        } )
+
+    return notes
+
+
+def _ancestors( path, packed ):
+    """
+    :param path: Path to an object.
+    :param packed: pack.Pack of the project.
+    :returns: List of paths of the Containers above the object, youngest to oldest.
+    """
+    ancestors = []
+    parent = os.path.dirname( path )
+    while ( parent != path ) and ( parent in packed ) and ( CONTAINER_FILE in packed.folder( parent )[ 0 ] ):
+        ancestors.append( parent )
+        ( path, parent ) = ( parent, os.path.dirname( parent ) )
+
+    return ancestors
+
+
+class PackedObject():
+    """
+    Initializes a LocalObject from a pack.
+    """
+
+    def _load( self, path, parent, packed, kind ):
+        """
+        Sets the state LocalObject#__init__ reads from the tree.
+
+        :param path: Path to the object.
+        :param parent: Parent object, or None if root.
+        :param packed: pack.Pack of the project.
+        :param kind: 'container' or 'asset'.
+        :returns: Tuple of ( <files>, <folders> ) of the object, as for Pack#folder.
+        """
+        path = os.path.normpath( path )
+        ( files, _, folders ) = packed.folder( path )
+        object_file = CONTAINER_FILE if kind == 'container' else ASSET_FILE
+
+        self._LocalObject__path = path
+        self._LocalObject__parent = parent
+        self._LocalObject__object_file = object_file
+        self._packed = packed
+
+        self.meta = json.loads( files[ object_file ] )
+        if 'metadata' not in self.meta:
+            self.meta[ 'metadata' ] = {}
+
+        self._LocalObject__own_metadata_keys = self.meta[ 'metadata' ].keys()
+        if ( 'name' not in self.meta ) or ( not self.meta[ 'name' ] ):
+            self.meta[ 'name' ] = os.path.basename( path )
+
+        # parent metadata already includes that of its ancestors
+        if parent is not None:
+            inherited = parent.meta[ 'metadata' ]
+
+        else:
+            inherited = {}
+            for ancestor in _ancestors( path, packed ):
+                metadata = json.loads( packed.folder( ancestor )[ 0 ][ CONTAINER_FILE ] ).get( 'metadata', {} )
+                inherited = { **metadata, **inherited }
+
+        self.meta[ 'metadata' ] = { **inherited, **self.meta[ 'metadata' ] }
+
+        notes = os.path.join( path, NOTES_FOLDER )
+        self._LocalObject__notes = _notes( notes ) if notes in folders else []
+
+        return ( files, folders )
+
+
+    def get_ancestors( self ):
+        """
+        :returns: List of paths of the object and its ancestors, youngest to oldest.
+        """
+        ancestors = []
+        obj = self
+        while obj is not None:
+            ancestors.append( Path( obj.path ) )
+            top = obj
+            obj = obj._LocalObject__parent
+
+        return ancestors + [ Path( path ) for path in _ancestors( top.path, self._packed ) ]
+
+
+class PackedAsset( PackedObject, LocalAsset ):
+    """
+    LocalAsset read from a pack.
+    """
+
+    def __init__( self, path, parent, packed ):
+        """
+        :param path: Path to the Asset.
+        :param parent: Parent PackedContainer.
+        :param packed: pack.Pack of the project.
+        """
+        self._load( path, parent, packed, 'asset' )
+        self.meta[ 'file' ] = resolve_path( self.meta[ 'file' ], self.path, packed.root )
+
+
+class PackedContainer( PackedObject, LocalContainer ):
+    """
+    LocalContainer read from a pack, with its descendants.
+    """
+
+    def __init__( self, path, packed, parent = None ):
+        """
+        :param path: Path to the Container.
+        :param packed: pack.Pack of the project.
+        :param parent: Parent PackedContainer, or None if root. [Default: None]
+        """
+        ( files, folders ) = self._load( path, parent, packed, 'container' )
+
+        children = []
+        assets = []
+        for folder in folders:
+            kind = folder_kind( packed.folder( folder )[ 0 ] )
+            if kind == 'container':
+                children.append( PackedContainer( folder, packed, self ) )
+
+            elif kind == 'asset':
+                assets.append( PackedAsset( folder, self, packed ) )
+
+        scripts = json.loads( files.get( SCRIPTS_FILE, b'[]' ) )
+        for script in scripts:
+            script[ 'script' ] = resolve_path( script[ 'script' ], self.path, packed.root )
+
+        self._LocalContainer__children = children
+        self._LocalContainer__assets = assets
+        self._LocalContainer__scripts = scripts
+
+
+class PackedDB( LocalDB ):
+    """
+    LocalDB read from a pack.
+    Collections reload from the tree once objects are inserted or replaced,
+    as the pack is then stale.
+    """
+
+    def __init__( self, root, packed ):
+        """
+        :param root: Path to the root Container.
+        :param packed: pack.Pack of the project.
+        """
+        self._LocalDB__root = root
+        tree = PackedContainer( os.path.abspath( root ), packed )
+
+        self._LocalDB__containers = LocalCollection( tree, 'container' )
+        self._LocalDB__assets = LocalCollection( tree, 'asset' )
+
+
+def count_reads( db, packed = None ):
+    """
+    Counts the metadata files read to load a database, see metrics#metadata_read.
+
+    :param db: Loaded LocalDB.
+    :param packed: pack.Pack the database was read from,
+        or None if read from the tree. [Default: None]
+    """
+    if packed is not None:
+        for ( _, files, _ ) in read_packed( os.path.abspath( db.root ), packed ):
+            for data in files.values():
+                metadata_read( len( data ) )
+
+        return
+
+    paths = [ os.path.join( asset._id, ASSET_FILE ) for asset in db.assets.find() ]
+    for container in db.containers.find():
+        paths += [ os.path.join( container._id, CONTAINER_FILE ), os.path.join( container._id, SCRIPTS_FILE ) ]
+
+    for path in paths:
+        try:
+            metadata_read( os.stat( path ).st_size )
+
+        except FileNotFoundError:
+            # no scripts file
+            continue
+
+
+def load_db( root ):
+    """
+    Loads the database of a tree,
+    from the project's pack if it is fresh and includes the tree,
+    and packed objects are #supported.
+
+    :param root: Path to the root Container.
+    :returns: PackedDB, or LocalDB if the pack is not used.
+        Metadata files read are counted if metrics are being written.
+    """
+    packed = pack.load( project_root( root ) ) if supported() else None
+    if ( packed is None ) or ( root not in packed ):
+        packed = None
+        db = LocalDB( root )
+
+    else:
+        db = PackedDB( root, packed )
+
+    if REGISTRY.writing:
+        count_reads( db, packed )
+
+    return db
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Tree Snapshots
+"""
+Merkle hash snapshots of a project tree, and differences between them.
+
+Each Container's hash covers its own metadata and scripts,
+the metadata and file contents of its Assets,
+and the hashes of its children.
+Two trees can then be compared by only descending into
+Containers whose hashes differ.
+"""
+
+import os
+import json
+import gzip
+import hashlib
+from datetime import datetime
+
+from ..common import state_path, write_atomic
+from .walk import (
+    CONTAINER_FILE,
+    ASSET_FILE,
+    SCRIPTS_FILE,
+    folder_kind,
+    project_root,
+    resolve_path,
+    read_tree,
+    stored_file
+)
+from . import checksum
+
+
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_EXT = '.json.gz'
+
+
+def _canonical( data ):
+    """
+    :param data: Bytes of a JSON file, or None.
+    :returns: Canonical bytes of the parsed JSON, or the raw bytes if invalid.
+    """
+    if data is None:
+        return b''
+
+    try:
+        obj = json.loads( data )
+
+    except ValueError:
+        return data
+
+    return json.dumps( obj, sort_keys = True, separators = ( ',', ':' ) ).encode()
+
+
+def _hash( *parts, algorithm = 'sha256' ):
+    """
+    :param *parts: Bytes or strings to hash.
+    :param algorithm: hashlib algorithm. [Default: 'sha256']
+    :returns: Hex digest of the length prefixed parts.
+    """
+    h = hashlib.new( algorithm )
+    for part in parts:
+        if isinstance( part, str ):
+            part = part.encode()
+
+        h.update( len( part ).to_bytes( 8, 'little' ) )
+        h.update( part )
+
+    return h.hexdigest()
+
+
+def snapshot( root, algorithm = 'sha256', workers = None ):
+    """
+    Creates a snapshot of a tree.
+    Asset file contents are hashed using the project's checksum manifest,
+    so only new or modified files are rehashed.
+
+    :param root: Path to the root Container.
+    :param algorithm: hashlib algorithm. [Default: 'sha256']
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :returns: Snapshot dictionary with keys 'root', 'created', 'algorithm', and 'nodes'.
+        nodes is keyed by Container path relative to the root,
+        with values of dictionaries with keys
+        'hash', 'meta', 'assets', and 'children'.
+        meta is the hash of the Container's own metadata and scripts,
+        assets a dictionary of Asset hashes keyed by Asset folder name,
+        and children a list of child Container folder names.
+    :raises RuntimeError: If the root is not a Container.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    if not os.path.isfile( os.path.join( root, CONTAINER_FILE ) ):
+        raise RuntimeError( 'Root {} is not a Container.'.format( root ) )
+
+    proj_root = project_root( root )
+    ( contents, _ ) = checksum.checksums( root, algorithm = algorithm, workers = workers )
+
+    nodes = {}
+    asset_files = {}
+    for ( path, files, _ ) in read_tree( root, workers = workers ):
+        kind = 'container' if ( path == root ) else folder_kind( files )
+        key = os.path.relpath( path, root )
+        ( parent, name ) = os.path.split( key )
+
+        if kind == 'container':
+            nodes[ key ] = {
+                'meta': _hash(
+                    _canonical( files.get( CONTAINER_FILE ) ),
+                    _canonical( files.get( SCRIPTS_FILE ) ),
+                    algorithm = algorithm
+                ),
+                'assets':   {},
+                'children': []
+            }
+
+        elif kind == 'asset':
+            asset_files.setdefault( parent or os.curdir, {} )[ name ] = ( path, files[ ASSET_FILE ] )
+
+    # link children and hash assets
+    for key, node in nodes.items():
+        if key == os.curdir:
+            continue
+
+        ( parent, name ) = os.path.split( key )
+        nodes[ parent or os.curdir ][ 'children' ].append( name )
+
+    for key, assets in asset_files.items():
+        if key not in nodes:
+            continue
+
+        for name, ( path, data ) in assets.items():
+            try:
+                properties = json.loads( data )
+                file = stored_file( { **properties, 'file': resolve_path( properties[ 'file' ], path, proj_root ) } )
+                content = contents.get( os.path.relpath( file, root ) )
+                content = content[ 'hash' ] if content else 'missing'
+
+            except ( ValueError, TypeError, KeyError ):
+                content = 'invalid'
+
+            nodes[ key ][ 'assets' ][ name ] = _hash( _canonical( data ), content, algorithm = algorithm )
+
+    # hash bottom up
+    def _depth( key ):
+        return 0 if ( key == os.curdir ) else ( key.count( os.sep ) + 1 )
+
+
+    for key in sorted( nodes, key = _depth, reverse = True ):
+        node = nodes[ key ]
+        node[ 'children' ].sort()
+        parts = [ node[ 'meta' ] ]
+        for name in sorted( node[ 'assets' ] ):
+            parts += [ name, node[ 'assets' ][ name ] ]
+
+        for name in node[ 'children' ]:
+            child = os.path.normpath( os.path.join( key, name ) )
+            parts += [ name, nodes[ child ][ 'hash' ] ]
+
+        node[ 'hash' ] = _hash( *parts, algorithm = algorithm )
+
+    return {
+        'root':      root,
+        'created':   datetime.now().isoformat( timespec = 'seconds' ),
+        'algorithm': algorithm,
+        'nodes':     nodes
+    }
+
+
+def snapshot_path( root, name ):
+    """
+    :param root: Path to the root Container.
+    :param name: Name of the snapshot.
+    :returns: Path of the snapshot file.
+    """
+    return state_path( root, SNAPSHOT_DIR, name + SNAPSHOT_EXT )
+
+
+def save( snap, path ):
+    """
+    Saves a snapshot as compressed JSON.
+
+    :param snap: Snapshot.
+    :param path: Path of the snapshot file.
+    """
+    data = json.dumps( snap, separators = ( ',', ':' ) ).encode()
+    write_atomic( path, gzip.compress( data ) )
+
+
+def load( path ):
+    """
+    Loads a saved snapshot.
+
+    :param path: Path of the snapshot file.
+    :returns: Snapshot.
+    """
+    with gzip.open( path, 'rt' ) as f:
+        return json.load( f )
+
+
+def resolve( source, root, algorithm = 'sha256', workers = None ):
+    """
+    Gets a snapshot from a source.
+
+    :param source: Path to a Container to snapshot,
+        path to a snapshot file, or name of a snapshot of the root.
+    :param root: Path to the root Container.
+    :param algorithm: hashlib algorithm for live trees. [Default: 'sha256']
+    :param workers: Number of threads for live trees, or None for the default. [Default: None]
+    :returns: Snapshot.
+    :raises ValueError: If the snapshot can not be found.
+    """
+    if os.path.isfile( os.path.join( source, CONTAINER_FILE ) ):
+        return snapshot( source, algorithm = algorithm, workers = workers )
+
+    if os.path.isfile( source ):
+        return load( source )
+
+    path = snapshot_path( root, source )
+    if os.path.isfile( path ):
+        return load( path )
+
+    raise ValueError( 'Could not find snapshot {}.'.format( source ) )
+
+
+def diff( a, b ):
+    """
+    Compares two snapshots.
+    Only Containers whose hashes differ are descended.
+
+    :param a: Original snapshot.
+    :param b: New snapshot.
+    :returns: List of ( <change>, <kind>, <path> ) sorted by path,
+        where change is one of '+' (added), '-' (removed), or 'M' (modified),
+        and kind is 'container' or 'asset'.
+        A modified Container has modified metadata or scripts.
+    :raises ValueError: If the snapshots use different hash algorithms.
+    """
+    if a[ 'algorithm' ] != b[ 'algorithm' ]:
+        raise ValueError( 'Snapshots use different hash algorithms.' )
+
+    def _subtree( nodes, key ):
+        """
+        :returns: List of all Container paths of a subtree.
+        """
+        keys = [ key ]
+        for child in nodes[ key ][ 'children' ]:
+            keys += _subtree( nodes, os.path.normpath( os.path.join( key, child ) ) )
+
+        return keys
+
+
+    changes = []
+    stack = [ os.curdir ]
+    while stack:
+        key = stack.pop()
+        na = a[ 'nodes' ][ key ]
+        nb = b[ 'nodes' ][ key ]
+        if na[ 'hash' ] == nb[ 'hash' ]:
+            continue
+
+        if na[ 'meta' ] != nb[ 'meta' ]:
+            changes.append( ( 'M', 'container', key ) )
+
+        for name in set( na[ 'assets' ] ) | set( nb[ 'assets' ] ):
+            ha = na[ 'assets' ].get( name )
+            hb = nb[ 'assets' ].get( name )
+            if ha == hb:
+                continue
+
+            change = '+' if ( ha is None ) else '-' if ( hb is None ) else 'M'
+            changes.append( ( change, 'asset', os.path.normpath( os.path.join( key, name ) ) ) )
+
+        ca = set( na[ 'children' ] )
+        cb = set( nb[ 'children' ] )
+        for name in ca | cb:
+            child = os.path.normpath( os.path.join( key, name ) )
+            if name not in cb:
+                changes += [ ( '-', 'container', path ) for path in _subtree( a[ 'nodes' ], child ) ]
+
+            elif name not in ca:
+                changes += [ ( '+', 'container', path ) for path in _subtree( b[ 'nodes' ], child ) ]
+
+            else:
+                stack.append( child )
+
+    changes.sort( key = lambda change: change[ 2 ] )
+    return changes
+
+
+def print_diff( changes, as_json = False ):
+    """
+    Prints differences between snapshots.
+
+    :param changes: Changes, as returned by #diff.
+    :param as_json: Print as JSON. [Default: False]
+    """
+    if as_json:
+        print( json.dumps( [
+            { 'change': change, 'kind': kind, 'path': path }
+            for ( change, kind, path ) in changes
+        ], indent = 4 ) )
+
+        return
+
+    for ( change, kind, path ) in changes:
+        if kind == 'container':
+            path = os.path.join( path, '' )
+
+        print( '{} {}'.format( change, path ) )
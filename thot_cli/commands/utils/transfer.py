@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# File Transfer
+"""
+Moves of data files into a project, by the cheapest strategy that works.
+
+Strategies are
+    + rename: Renames the file. Only works on the same file system.
+    + hardlink: Links the file at its destination, then unlinks the source.
+        Only works on the same file system.
+    + reflink: Clones the file's extents at its destination, then removes the source.
+        Only works on file systems supporting copy on write clones, such as Btrfs and XFS.
+    + copy: Copies the file in the kernel, with `copy_file_range` or `sendfile` where available.
+    + auto: Tries rename, then reflink, then copy.
+
+Reflinks and copies are written to a temporary file,
+which is synced to disk and verified against the source before it is renamed into place.
+The source is only removed once its destination is durable.
+
+Folders are renamed, or, unless the strategy is rename,
+moved with `shutil.move` if on another file system, which copies their files.
+"""
+
+import os
+import sys
+import errno
+import shutil
+import tempfile
+
+try:
+    import fcntl
+
+except ImportError:
+    # not available on Windows
+    fcntl = None
+
+from .checksum import hash_file
+
+
+STRATEGIES = ( 'auto', 'rename', 'hardlink', 'reflink', 'copy' )
+
+# strategies tried, in order, by auto
+AUTO_ORDER = ( 'rename', 'reflink', 'copy' )
+
+# bytes copied at a time
+COPY_CHUNK = 1 << 26
+
+# ioctl to clone a file on Linux
+FICLONE = 0x40049409
+
+# errors meaning a strategy is not supported for a file
+# permission errors are not, as other strategies would also fail to remove the source
+UNSUPPORTED = ( errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS )
+
+
+def _sync_dir( path ):
+    """
+    Syncs a folder, so renames within it are durable.
+    Ignored where folders can not be opened.
+
+    :param path: Path to the folder.
+    """
+    try:
+        fd = os.open( path, os.O_RDONLY )
+
+    except OSError:
+        return
+
+    try:
+        os.fsync( fd )
+
+    except OSError:
+        pass
+
+    finally:
+        os.close( fd )
+
+
+def _copy_range( src, dst, size ):
+    """
+    Copies a file's contents in the kernel.
+    Uses `copy_file_range` if available, then `sendfile`,
+    falling back to reading and writing in chunks.
+
+    :param src: Source file descriptor.
+    :param dst: Destination file descriptor.
+    :param size: Number of bytes to copy.
+    """
+    copied = 0
+    for name in ( 'copy_file_range', 'sendfile' ):
+        fcn = getattr( os, name, None )
+        if ( fcn is None ) or ( ( name == 'sendfile' ) and not sys.platform.startswith( 'linux' ) ):
+            continue
+
+        try:
+            while copied < size:
+                if name == 'copy_file_range':
+                    sent = fcn( src, dst, min( COPY_CHUNK, size - copied ) )
+
+                else:
+                    sent = fcn( dst, src, copied, min( COPY_CHUNK, size - copied ) )
+
+                if not sent:
+                    break
+
+                copied += sent
+
+            return
+
+        except OSError as err:
+            if ( err.errno not in UNSUPPORTED ) or copied:
+                raise
+
+    with os.fdopen( os.dup( src ), 'rb' ) as fsrc, os.fdopen( os.dup( dst ), 'wb' ) as fdst:
+        shutil.copyfileobj( fsrc, fdst, COPY_CHUNK )
+
+
+def _clone( src, dst ):
+    """
+    Clones a file's extents.
+
+    :param src: Source file descriptor.
+    :param dst: Destination file descriptor.
+    :raises OSError: If cloning is not supported.
+    """
+    if ( fcntl is None ) or not sys.platform.startswith( 'linux' ):
+        raise OSError( errno.EOPNOTSUPP, 'Reflinks are not supported on this platform.' )
+
+    fcntl.ioctl( dst, FICLONE, src )
+
+
+def _write( source, destination, strategy, verify = True ):
+    """
+    Writes a copy of a file to a temporary file beside its destination,
+    then syncs, verifies, and renames it into place.
+
+    :param source: Path of the source file.
+    :param destination: Path of the destination file.
+    :param strategy: 'reflink' or 'copy'.
+    :param verify: Compare the contents of the copy to the source. [Default: True]
+    :raises OSError: If the strategy is not supported, or the copy does not match.
+    """
+    folder = os.path.dirname( os.path.abspath( destination ) )
+    with tempfile.NamedTemporaryFile( dir = folder, prefix = '.', suffix = '.tmp', delete = False ) as tf:
+        pass
+
+    try:
+        with open( source, 'rb' ) as src, open( tf.name, 'wb' ) as dst:
+            if strategy == 'reflink':
+                _clone( src.fileno(), dst.fileno() )
+
+            else:
+                _copy_range( src.fileno(), dst.fileno(), os.fstat( src.fileno() ).st_size )
+
+            dst.flush()
+            os.fsync( dst.fileno() )
+
+        if verify and (
+            ( os.path.getsize( tf.name ) != os.path.getsize( source ) ) or
+            ( hash_file( tf.name ) != hash_file( source ) )
+        ):
+            raise OSError( errno.EIO, 'Copy of {} does not match the source.'.format( source ) )
+
+        shutil.copystat( source, tf.name )
+        os.rename( tf.name, destination )
+
+    except BaseException:
+        if os.path.exists( tf.name ):
+            os.remove( tf.name )
+
+        raise
+
+    _sync_dir( folder )
+
+
+def _move_folder( source, destination, strategy ):
+    """
+    Moves a folder.
+    The folder is renamed, or moved with `shutil.move` if on another file system,
+    unless the strategy is rename.
+
+    :param source: Path of the folder.
+    :param destination: Path to move the folder to.
+    :param strategy: Strategy, one of STRATEGIES.
+    :returns: 'rename' if renamed, 'copy' if copied.
+    """
+    try:
+        os.rename( source, destination )
+
+    except OSError as err:
+        if ( strategy == 'rename' ) or ( err.errno != errno.EXDEV ):
+            raise
+
+        shutil.move( source, destination )
+        return 'copy'
+
+    _sync_dir( os.path.dirname( os.path.abspath( destination ) ) )
+    return 'rename'
+
+
+def move( source, destination, strategy = 'auto', verify = True ):
+    """
+    Moves a file or folder.
+
+    :param source: Path of the file or folder.
+    :param destination: Path to move the file to. Must not exist.
+    :param strategy: Strategy, one of STRATEGIES. [Default: 'auto']
+    :param verify: Compare copies to the source before removing it. [Default: True]
+    :returns: Strategy used.
+    :raises ValueError: If the strategy is invalid.
+    :raises FileExistsError: If the destination exists.
+    :raises OSError: If the strategy is not supported for the file.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError( 'Invalid transfer strategy {}, must be one of {}.'.format( strategy, ', '.join( STRATEGIES ) ) )
+
+    if os.path.lexists( destination ):
+        raise FileExistsError( errno.EEXIST, 'Destination exists.', destination )
+
+    if os.path.isdir( source ) and not os.path.islink( source ):
+        return _move_folder( source, destination, strategy )
+
+    order = AUTO_ORDER if strategy == 'auto' else ( strategy, )
+    for attempt in order:
+        try:
+            if attempt == 'rename':
+                os.rename( source, destination )
+                _sync_dir( os.path.dirname( os.path.abspath( destination ) ) )
+                return attempt
+
+            if attempt == 'hardlink':
+                os.link( source, destination )
+                _sync_dir( os.path.dirname( os.path.abspath( destination ) ) )
+
+            else:
+                _write( source, destination, attempt, verify = verify )
+
+        except OSError as err:
+            if ( strategy == 'auto' ) and ( err.errno in UNSUPPORTED ) and ( attempt != order[ -1 ] ):
+                continue
+
+            raise
+
+        # destination is durable, remove the source
+        os.remove( source )
+        _sync_dir( os.path.dirname( os.path.abspath( source ) ) )
+        return attempt
@@ -9,8 +9,8 @@ Provides utilities for building a local Thot Project.
 import os
 import re
 import json
-import shutil
 from glob import glob
+from contextlib import contextmanager
 
 from thot_core.classes.base_object import BaseObjectJSONEncoder
 from thot_core.classes.container import Container
@@ -18,6 +18,28 @@ from thot_core.classes.asset import Asset
 
 from thot.db.local import LocalDB
 
+from ..common import write_atomic
+from ..metrics import metadata_read
+from .packdb import load_db
+from . import transfer
+
+
+class PendingObject():
+    """
+    An object whose object file is buffered, but not yet written.
+    """
+
+    def __init__( self, _id, kind, properties ):
+        """
+        :param _id: Id of the object.
+        :param kind: Kind of the object.
+            Values: [ Container, Asset ]
+        :param properties: Properties of the object.
+        """
+        self._id = _id
+        self.kind = kind
+        self.properties = properties
+
 
 class ThotUtilities():
     """
@@ -28,7 +50,82 @@ class ThotUtilities():
         """
         :param root: Either a LocalDB or root path to create one.
         """
-        self._db = LocalDB( root )
+        if isinstance( root, LocalDB ):
+            self.__root = root.root
+            self.__db = root
+
+        else:
+            # tree is loaded on first use
+            self.__root = root
+            self.__db = None
+
+        self._pending = None  # buffered writes keyed by path, None if not buffering
+        self._stale = False   # tree must be reloaded before it is used again
+
+
+    @property
+    def root( self ):
+        """
+        :returns: Path to the root Container.
+        """
+        return self.__root
+
+
+    @property
+    def _db( self ):
+        """
+        :returns: LocalDB of the project, loading it if needed.
+            Read from the project's metadata pack if it is fresh.
+        """
+        if self.__db is None:
+            self.__db = load_db( self.root )
+
+        return self.__db
+
+
+    @contextmanager
+    def buffered( self ):
+        """
+        Context in which metadata file writes are buffered in memory.
+        Multiple writes to the same file are coalesced,
+        and all files are written when the context exits.
+
+        Operations adding or removing objects mark the tree as stale.
+        Call #refresh between operations to reload it.
+        """
+        self._pending = {}
+        try:
+            yield self
+
+        finally:
+            self.flush()
+            self._pending = None
+
+
+    def flush( self ):
+        """
+        Writes all buffered metadata files.
+        """
+        if not self._pending:
+            return
+
+        pending = self._pending
+        self._pending = {}
+        for path, data in pending.items():
+            self._dump_json( path, data )
+
+
+    def refresh( self ):
+        """
+        Reloads the tree if objects were added or removed since it was loaded.
+        Buffered writes are flushed first.
+        """
+        if not self._stale:
+            return
+
+        self.flush()
+        self.__db = None
+        self._stale = False
 
 
     def add_scripts( self, scripts, search, overwrite = False ):
@@ -57,9 +154,7 @@ class ThotUtilities():
                 path = err.filename
 
             # must load scripts file directly because container has already parsed path
-            with open( path ) as scripts_file:
-                container_scripts = json.load( scripts_file )
-
+            container_scripts = self._load_json( path )
             container_script_ids = [ script[ 'script' ] for script in container_scripts ]
 
             for script in scripts:
@@ -80,8 +175,8 @@ class ThotUtilities():
                 modified.append( container )
 
                 # save changes
-                with open( path, 'w' ) as f:
-                    json.dump( container_scripts, f, cls = BaseObjectJSONEncoder, indent = 4 )
+                self._write_json( path, container_scripts )
+                self._set_container_scripts( container, container_scripts )
 
         return modified
 
@@ -123,8 +218,7 @@ class ThotUtilities():
                 modified.append( container )
 
                 # save changes
-                with open( path, 'w' ) as f:
-                    json.dump( container.scripts, f, cls = BaseObjectJSONEncoder, indent = 4 )
+                self._write_json( path, container.scripts )
 
         return modified
 
@@ -152,9 +246,8 @@ class ThotUtilities():
                 path = err.filename
 
 
-            with open( path, 'w' ) as f:
-                # set scripts
-                json.dump( scripts, f, cls = BaseObjectJSONEncoder, indent = 4 )
+            self._write_json( path, scripts )
+            self._set_container_scripts( container, scripts )
 
         return containers
 
@@ -270,7 +363,15 @@ class ThotUtilities():
             )
 
 
-    def datum_to_asset( self, path, properties = None, _id = None, rename = None ):
+    def datum_to_asset(
+        self,
+        path,
+        properties = None,
+        _id = None,
+        rename = None,
+        container = None,
+        strategy = 'auto'
+    ):
         """
         Converts a file to a Thot Asset.
 
@@ -285,10 +386,16 @@ class ThotUtilities():
         :param rename: String to rename the data file to, or None to leave the same.
             Should include the extension.
             [Default: None]
+        :param container: Path of the Container to create the Asset in,
+            or None to create it beside the data file. [Default: None]
+        :param strategy: How the data file is moved into the Asset,
+            one of transfer#STRATEGIES. [Default: 'auto']
         :returns: Id of new Asset.
         """
         # split path into components
         ( parent_dir, data_name ) = os.path.split( path )
+        if container is not None:
+            parent_dir = container
 
         # create asset folder
         if _id is None:
@@ -304,7 +411,15 @@ class ThotUtilities():
             rename = data_name
 
         data_path = os.path.join( asset_path, rename )
-        shutil.move( path, data_path )
+        try:
+            transfer.move( path, data_path, strategy = strategy )
+
+        except BaseException:
+            if not os.listdir( asset_path ):
+                # leave no empty asset folder behind
+                os.rmdir( asset_path )
+
+            raise
 
         # add _asset.json file
         if properties is None:
@@ -317,13 +432,23 @@ class ThotUtilities():
             properties[ 'file' ] = rename
 
         asset_file = os.path.join( asset_path, '_asset.json' )
-        with open( asset_file, 'w' ) as f:
-            json.dump( properties, f, indent = 4 )
+        self._write_json( asset_file, properties )
+        if self._pending is not None:
+            self._stale = True
 
         return os.path.abspath( asset_path )
 
 
-    def data_to_asset( self, path, search = None, properties = None, _id = None, rename = None ):
+    def data_to_asset(
+        self,
+        path,
+        search = None,
+        properties = None,
+        _id = None,
+        rename = None,
+        container = None,
+        strategy = 'auto'
+    ):
         """
         Converts multiple data fiels to assets.
 
@@ -346,6 +471,10 @@ class ThotUtilities():
             returning the new name.
             Extension must be included.
             [Default: None]
+        :param container: Path of the Container to create the Assets in,
+            or None to create them beside their data files. [Default: None]
+        :param strategy: How data files are moved into their Assets,
+            one of transfer#STRATEGIES. [Default: 'auto']
         """
         # get files to convert
         if ( search is None ):
@@ -408,7 +537,9 @@ class ThotUtilities():
                 file,
                 properties = asset_properties,
                 _id = asset_id,
-                rename = asset_rename
+                rename = asset_rename,
+                container = container,
+                strategy = strategy
             )
 
             assets.append( asset )
@@ -451,7 +582,17 @@ class ThotUtilities():
                 for object_id in object_ids:
                     # iterate over ids, adding object for each
 
-                    if object_id in container_objects:
+                    if self._pending is not None:
+                        # buffering writes, do not reload tree for each object
+                        new_obj = self._insert_pending_object(
+                            object_id,
+                            obj,
+                            obj_kind,
+                            exists = ( object_id in container_objects ),
+                            overwrite = overwrite
+                        )
+
+                    elif object_id in container_objects:
                         # object already in container
                         if ( overwrite ):
                             # replace with new object
@@ -521,11 +662,104 @@ class ThotUtilities():
                 of_name, _ = removed_name
 
             removed_path = os.path.join( head, of_name )
-            os.rename( object_path, removed_path )
+            if ( self._pending is not None ) and ( object_path in self._pending ):
+                # object file not written yet
+                self._pending[ removed_path ] = self._pending.pop( object_path )
+
+            else:
+                os.rename( object_path, removed_path )
+
+        if ( self._pending is not None ) and objects:
+            self._stale = True
 
         return objects
 
 
+    def _insert_pending_object( self, object_id, obj, kind, exists = False, overwrite = False ):
+        """
+        Buffers the object file of a new or replaced object.
+
+        :param object_id: Id of the object.
+        :param obj: Object to write.
+        :param kind: Kind of the object.
+            Values: [ Container, Asset ]
+        :param exists: Whether the object already exists in the loaded tree. [Default: False]
+        :param overwrite: Whether to overwrite an already existing object. [Default: False]
+        :returns: PendingObject, or None if the object exists and overwrite is False.
+        """
+        of_name = '_{}.json'.format( 'container' if kind is Container else 'asset' )
+        of_path = os.path.join( object_id, of_name )
+
+        if ( exists or ( of_path in self._pending ) ) and ( not overwrite ):
+            return None
+
+        if not os.path.exists( object_id ):
+            os.mkdir( object_id )
+
+        self._pending[ of_path ] = obj
+        self._stale = True
+
+        return PendingObject( object_id, kind, obj )
+
+
+    def _set_container_scripts( self, container, scripts ):
+        """
+        Sets the loaded scripts of a Container to match its scripts file.
+
+        :param container: Container.
+        :param scripts: List of script associations, as stored in the scripts file.
+        """
+        resolved = []
+        for script in scripts:
+            script = dict( script )
+            script[ 'script' ] = container._parse_path( script[ 'script' ] )
+            resolved.append( script )
+
+        container.scripts[:] = resolved
+
+
+    def _load_json( self, path ):
+        """
+        Loads a JSON file, accounting for buffered writes.
+
+        :param path: Path of the JSON file.
+        :returns: Parsed contents.
+        """
+        if ( self._pending is not None ) and ( path in self._pending ):
+            return json.loads( json.dumps( self._pending[ path ], cls = BaseObjectJSONEncoder ) )
+
+        with open( path, 'rb' ) as f:
+            data = f.read()
+
+        metadata_read( len( data ) )
+        return json.loads( data )
+
+
+    def _write_json( self, path, data ):
+        """
+        Writes data to a JSON file, or buffers it if writes are being buffered.
+
+        :param path: Path of the JSON file.
+        :param data: Data to write.
+        """
+        if self._pending is not None:
+            self._pending[ path ] = data
+            return
+
+        self._dump_json( path, data )
+
+
+    @staticmethod
+    def _dump_json( path, data ):
+        """
+        Atomically writes data to a JSON file.
+
+        :param path: Path of the JSON file.
+        :param data: Data to write.
+        """
+        write_atomic( path, json.dumps( data, cls = BaseObjectJSONEncoder, indent = 4 ) )
+
+
     def get_object_class( self, obj ):
         """
         Returns the class of the object passed in.
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Tree Walking
+"""
+Fast reading of a local project tree without loading the database.
+Folders are read in a thread pool,
+or from the project's metadata pack if it is fresh, see #pack.
+"""
+
+import os
+import re
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ..metrics import metadata_read
+from . import pack
+
+
+CONTAINER_FILE = '_container.json'
+ASSET_FILE     = '_asset.json'
+SCRIPTS_FILE   = '_scripts.json'
+REMOVED_SUFFIX = '_removed.json'
+NOTES_FOLDER   = '_notes'
+
+
+def project_root( path ):
+    """
+    Gets the ultimate root of a project.
+    Mirrors LocalObject#get_project_root.
+
+    :param path: Path to a Container.
+    :returns: Path of the highest Container ancestor.
+    """
+    path = os.path.normpath( os.path.abspath( path ) )
+    while True:
+        parent = os.path.dirname( path )
+        if (
+            ( parent == path ) or
+            not os.path.isfile( os.path.join( parent, CONTAINER_FILE ) )
+        ):
+            return path
+
+        path = parent
+
+
+def resolve_path( path, base, root ):
+    """
+    Resolves a path as a local project does, accounting for the `root:` directive.
+    Mirrors LocalObject#_parse_path.
+
+    :param path: Path to resolve.
+    :param base: Folder relative paths are relative to.
+    :param root: Project root.
+    :returns: Normalized absolute path.
+    """
+    parts = Path( path ).parts
+    if parts and re.search( '^(root|ROOT):', parts[ 0 ] ):
+        path = os.path.join( root, *parts[ 1: ] )
+
+    else:
+        path = os.path.join( base, path )
+
+    return os.path.normpath( path )
+
+
+def read_associations( container, root ):
+    """
+    Reads the Script associations of a Container as stored,
+    including properties not used by the database.
+
+    :param container: Path to the Container.
+    :param root: Project root, used to resolve script paths.
+    :returns: Dictionary of associations keyed by resolved Script path.
+        Empty if the scripts file is missing or invalid.
+    """
+    try:
+        with open( os.path.join( container, SCRIPTS_FILE ) ) as f:
+            assocs = json.load( f )
+
+    except ( FileNotFoundError, ValueError ):
+        # invalid files are reported when the Container is loaded
+        return {}
+
+    return {
+        resolve_path( assoc[ 'script' ], container, root ): assoc
+        for assoc in assocs
+    }
+
+
+def folder_kind( files ):
+    """
+    :param files: Names of the metadata files of a folder.
+    :returns: 'container', 'asset', or None if the folder is not an object
+        or has both object files.
+    """
+    is_container = CONTAINER_FILE in files
+    is_asset = ASSET_FILE in files
+
+    if is_container and not is_asset:
+        return 'container'
+
+    if is_asset and not is_container:
+        return 'asset'
+
+    return None
+
+
+def read_folder( path ):
+    """
+    Reads the metadata files of a folder.
+
+    :param path: Path to the folder.
+    :returns: Tuple of ( <files>, <removed>, <folders> ),
+        where files is a dictionary of metadata file names and contents,
+        removed a list of removed object file paths,
+        and folders a list of sub-folder paths.
+    """
+    files = {}
+    removed = []
+    folders = []
+    with os.scandir( path ) as entries:
+        for entry in entries:
+            if entry.name.startswith( '.' ):
+                continue
+
+            if entry.is_dir():
+                folders.append( entry.path )
+
+            elif entry.name in ( CONTAINER_FILE, ASSET_FILE, SCRIPTS_FILE ):
+                with open( entry.path, 'rb' ) as f:
+                    files[ entry.name ] = f.read()
+
+                metadata_read( len( files[ entry.name ] ) )
+
+            elif entry.name.endswith( REMOVED_SUFFIX ):
+                removed.append( entry.path )
+
+    return ( files, removed, folders )
+
+
+def read_children( path ):
+    """
+    Reads the metadata files of the sub-folders of a folder.
+
+    :param path: Path to the folder.
+    :returns: List of ( <path>, <files>, <removed> ) for each sub-folder.
+    """
+    records = []
+    for folder in read_folder( path )[ 2 ]:
+        ( files, removed, _ ) = read_folder( folder )
+        records.append( ( folder, files, removed ) )
+
+    return records
+
+
+def read_tree( root, workers = None, packed = True ):
+    """
+    Reads the metadata files of a tree.
+    Every sub-folder of a Container is read, but only Containers are descended.
+
+    :param root: Path to the root Container.
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :param packed: Read from the project's pack if it is fresh. [Default: True]
+    :returns: Generator of ( <path>, <files>, <removed> ) for the root
+        and each folder read, with values as in #read_folder.
+    """
+    root = os.path.normpath( os.path.abspath( root ) )
+    packed = pack.load( project_root( root ) ) if packed else None
+    if ( packed is not None ) and ( root in packed ):
+        yield from read_packed( root, packed )
+        return
+
+    ( files, removed, _ ) = read_folder( root )
+    yield ( root, files, removed )
+
+    with ThreadPoolExecutor( max_workers = workers ) as executor:
+        # each task reads all sub-folders of a Container
+        pending = { executor.submit( read_children, root ) }
+        while pending:
+            done, pending = wait( pending, return_when = FIRST_COMPLETED )
+            for future in done:
+                for record in future.result():
+                    yield record
+
+                    ( path, files, _ ) = record
+                    if folder_kind( files ) == 'container':
+                        pending.add( executor.submit( read_children, path ) )
+
+
+def read_packed( root, packed ):
+    """
+    Reads the metadata files of a tree from a pack.
+    Mirrors #read_tree.
+
+    :param root: Path to the root Container.
+    :param packed: pack.Pack of the project.
+    :returns: Generator of ( <path>, <files>, <removed> ) for the root
+        and each folder read, as for #read_tree.
+    """
+    ( files, removed, folders ) = packed.folder( root )
+    yield ( root, files, removed )
+
+    stack = [ folders ]
+    while stack:
+        for folder in stack.pop():
+            ( files, removed, children ) = packed.folder( folder )
+            yield ( folder, files, removed )
+
+            if folder_kind( files ) == 'container':
+                stack.append( children )
+
+
+def parse_asset( path, files, root ):
+    """
+    Parses an Asset's file.
+
+    :param path: Path to the Asset.
+    :param files: Metadata files of the Asset, as returned by #read_folder.
+    :param root: Project root, used to resolve the Asset's file path.
+    :returns: Asset properties with the 'file' property resolved to an absolute path,
+        or None if the Asset file is invalid.
+    """
+    try:
+        properties = json.loads( files[ ASSET_FILE ] )
+        properties[ 'file' ] = resolve_path( properties[ 'file' ], path, root )
+
+    except ( ValueError, TypeError, KeyError ):
+        return None
+
+    return properties
+
+
+def stored_file( properties ):
+    """
+    :param properties: Asset properties with the 'file' property resolved,
+        as returned by #parse_asset.
+    :returns: Path of the Asset's file as stored on disk,
+        which is its compressed file if compressed.
+    """
+    compression = properties.get( 'compression' )
+    if isinstance( compression, dict ) and isinstance( compression.get( 'file' ), str ):
+        return os.path.join( os.path.dirname( properties[ 'file' ] ), compression[ 'file' ] )
+
+    return properties[ 'file' ]
+
+
+def child_assets( path, root ):
+    """
+    Loads the child Assets of a Container.
+    Assets with invalid Asset files are ignored.
+
+    :param path: Path to the Container.
+    :param root: Project root.
+    :returns: List of ( <path>, <properties> ) for each child Asset,
+        as for #load_assets.
+    """
+    assets = []
+    for ( folder, files, _ ) in read_children( path ):
+        if folder_kind( files ) != 'asset':
+            continue
+
+        properties = parse_asset( folder, files, root )
+        if properties is not None:
+            assets.append( ( folder, properties ) )
+
+    return assets
+
+
+def load_assets( root, workers = None ):
+    """
+    Loads the Assets of a tree.
+    Assets with invalid Asset files are ignored.
+
+    :param root: Path to the root Container.
+    :param workers: Number of threads, or None for the default. [Default: None]
+    :returns: List of ( <path>, <properties> ) for each Asset,
+        with the 'file' property resolved to an absolute path.
+    """
+    proj_root = project_root( root )
+
+    assets = []
+    for ( path, files, _ ) in read_tree( root, workers = workers ):
+        if folder_kind( files ) != 'asset':
+            continue
+
+        properties = parse_asset( path, files, proj_root )
+        if properties is None:
+            # invalid asset
+            continue
+
+        assets.append( ( path, properties ) )
+
+    return assets